@@ -0,0 +1,69 @@
+"""Times incremental runs of PTT_fetch over a local PTT Stock Board, each run asking for only a few articles, and checks
+that the runs together store every post exactly once. The first case is a board whose oldest post is already stored, so
+the first run stops part way down the page it stops paging on, and the posts it left unfetched must be fetched by the
+next run instead of being skipped by the checkpoint. A first run that stops before reaching a stored post only covers the
+pages it read, so later runs fetch the rest of those pages and nothing older. Pages are served by the local fixture
+server and MongoDB is replaced with mongomock.
+Run from the repository root: python -m benchmarks.bench_PTT_fetch
+"""
+
+import random
+import time
+import mongomock
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.html_fixtures import build_fixture, build_PTT_index, article_title
+from parsing import html_scraper, http_client, keyword_matcher
+
+newest_post_time : int = 1_760_320_800 # post time of the newest post on each board
+
+# builds a board of pages of posts at a new local server, the newest page at PTT_url, returning the server and the links
+def build_board(pages : int, posts_per_page : int) -> tuple[FixtureServer, list[str]]:
+    server = FixtureServer(latency = 0.01)
+    rng = random.Random("PTT")
+    links = []
+    for page in range(1, pages + 1):
+        posts = []
+        for i in range(posts_per_page):
+            number = (page - 1) * posts_per_page + i
+            path = f"/bbs/Stock/M.{newest_post_time - (pages * posts_per_page - number) * 60}.A.{number:03X}.html"
+            posts.append((path, "[新聞] " + article_title(rng)))
+            links.append("https://www.ptt.cc" + path)
+            server.add("https://www.ptt.cc" + path, build_fixture("PTT Stock Board", number))
+        previous_page = f"/bbs/Stock/index{page - 1}.html" if page > 1 else None
+        page_url = html_scraper.PTT_url if page == pages else f"https://www.ptt.cc/bbs/Stock/index{page}.html"
+        server.add(page_url, build_PTT_index(posts, previous_page))
+    return server.start(), links
+
+# runs PTT_fetch once for each number of articles, checking that the stored posts and the given number of newest posts
+# are stored exactly once, and nothing else
+def check_runs(name : str, pages : int, posts_per_page : int, stored : int, numbers : list[int], expected : int, matcher) -> None:
+    server, links = build_board(pages, posts_per_page)
+    get = http_client.get
+    http_client.get = lambda url, **kwargs: get(server.local_url(url), **kwargs)
+    database = mongomock.MongoClient()["news_info_benchmark"]
+    collection = database["article_info"]
+    # the oldest posts were stored by an earlier run before the checkpoint existed
+    if stored != 0:
+        collection.insert_many([{"id" : i, "url" : link} for i, link in enumerate(links[:stored])])
+
+    try:
+        print(f"{name}: {pages} pages of {posts_per_page} posts, {stored} already stored")
+        for number in numbers:
+            start = time.perf_counter()
+            html_scraper.PTT_fetch(collection, number, collection.count_documents({}), matcher, state_collection = database["feed_state"])
+            print(f"  run asking for {number:>3} articles: {collection.count_documents({}):>4} stored, {time.perf_counter() - start:.2f} seconds")
+    finally:
+        http_client.get = get
+        server.stop()
+
+    stored_links = [doc["url"] for doc in collection.find({}, {"url" : 1, "_id" : 0})]
+    assert len(stored_links) == len(set(stored_links)), f"{name}: a post was stored twice"
+    expected_links = set(links[:stored] + links[len(links) - expected:])
+    assert set(stored_links) == expected_links, f"{name}: posts never stored: {sorted(expected_links - set(stored_links))}, posts stored by mistake: {sorted(set(stored_links) - expected_links)}"
+
+if __name__ == "__main__":
+    matcher = keyword_matcher.load_matcher()
+    check_runs("oldest post stored", 1, 6, 1, [2, 10], 5, matcher)
+    check_runs("oldest post stored, several pages", 3, 20, 1, [50, 5, 5], 59, matcher)
+    check_runs("first run stops part way", 2, 20, 0, [5] * 5, 20, matcher)
+    print("every post was stored exactly once")
@@ -0,0 +1,48 @@
+"""Compares a fixed limit of 10 concurrent OpenAI requests against the adaptive limit, using the local mock OpenAI server
+set up as a rate limited endpoint, and checks that every article is still analyzed when random requests get 429 responses
+or are slow.
+Run from the repository root: python -m benchmarks.bench_adaptive_concurrency
+"""
+
+import os
+import time
+from benchmarks.mock_openai import MockOpenAIServer
+from benchmarks.bench_streaming_analysis import CountingCollection, article_collection
+
+num_articles : int = 200
+
+# analyzes num_articles articles against the server with the given limits and prints the results
+def run(sentiment_analysis, server : MockOpenAIServer, name : str, initial_limit : int, max_limit : int) -> None:
+    sentiment_analysis.initial_concurrent_requests = initial_limit
+    sentiment_analysis.max_concurrent_requests = max_limit
+    collection = article_collection(num_articles)
+    results = [CountingCollection() for _ in range(3)]
+    server.reset()
+
+    start = time.perf_counter()
+    sentiment_analysis.start_async(collection, *results, 0)
+    total_time = time.perf_counter() - start
+
+    print(f"{name:<34}{total_time:>9.2f}{server.requests:>10}{server.rate_limited:>6}{server.peak_in_flight:>10}{results[0].count:>10}")
+
+if __name__ == "__main__":
+    server = MockOpenAIServer(latency = 0.1, capacity = 24, retry_after = 0.5).start()
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    from parsing import sentiment_analysis
+
+    print(f"{num_articles} articles, 3 prompts each, 0.1 second responses")
+    print(f"{'':<34}{'seconds':>9}{'requests':>10}{'429s':>6}{'peak busy':>10}{'articles':>10}")
+    print("endpoint allowing 24 concurrent requests")
+    run(sentiment_analysis, server, "  fixed limit of 10", 10, 10)
+    run(sentiment_analysis, server, "  adaptive limit from 10", 10, 64)
+
+    server.capacity = None
+    server.rate_limit_rate = 0.05
+    server.slow_rate = 0.02
+    server.slow_latency = 2.0
+    print("endpoint with 5% random 429s and 2% slow (2 second) responses")
+    run(sentiment_analysis, server, "  fixed limit of 10", 10, 10)
+    run(sentiment_analysis, server, "  adaptive limit from 10", 10, 64)
+
+    server.stop()
@@ -0,0 +1,61 @@
+"""Benchmarks the IVF approximate nearest-neighbor index in parsing/ann_index.py against exact brute-force search. The
+vectors are clustered 384-dimension embeddings (the size of all-MiniLM-L6-v2): 500 topics, each article a topic vector
+plus gaussian noise of 1.5 times its size. recall@k is the share of the exact top k neighbors the index also returns.
+Deduplication only needs the nearest stored article of a near duplicate, so near-duplicate recall@1 is also reported: the
+share of stored articles found, with k = 1, from a copy with a little noise added (cosine similarity about 0.96). Both are
+reported with the average query latency for each share of the clusters searched, and for the index's default.
+Run from the repository root: python -m benchmarks.bench_ann_index [number of vectors]
+"""
+
+import sys
+import time
+import numpy as np
+from parsing.ann_index import IVFIndex, normalize_rows, default_probe_fraction
+
+default_size : int = 50_000
+dimension : int = 384
+num_topics : int = 500 # clusters of similar articles in the generated data
+noise : float = 1.5 # spread of the articles around their topic
+num_queries : int = 500
+k : int = 10
+near_duplicate_noise : float = 0.015 # noise added to a stored article to make a near duplicate of it
+probe_fractions : list[float] = [0.02, 0.05, 0.1, 0.2, 0.4]
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else default_size
+    rng = np.random.default_rng(0)
+    topics = rng.standard_normal((num_topics, dimension)).astype(np.float32)
+    vectors = normalize_rows(topics[rng.integers(num_topics, size = size)] + noise * rng.standard_normal((size, dimension)).astype(np.float32))
+    queries = normalize_rows(topics[rng.integers(num_topics, size = num_queries)] + noise * rng.standard_normal((num_queries, dimension)).astype(np.float32))
+    originals = rng.integers(size, size = num_queries)
+    near_duplicates = normalize_rows(vectors[originals] + near_duplicate_noise * rng.standard_normal((num_queries, dimension)).astype(np.float32))
+
+    # builds the index one batch at a time, as articles would be added
+    start = time.perf_counter()
+    index = IVFIndex(dimension)
+    for batch_start in range(0, size, 1000):
+        batch = vectors[batch_start:batch_start + 1000]
+        index.add([str(i) for i in range(batch_start, batch_start + len(batch))], batch)
+    build_time = time.perf_counter() - start
+
+    # exact top k neighbors
+    start = time.perf_counter()
+    exact = []
+    for query in queries:
+        scores = vectors @ query
+        exact.append({str(i) for i in np.argpartition(-scores, k - 1)[:k]})
+    exact_latency = (time.perf_counter() - start) / num_queries
+
+    print(f"{size} vectors, {len(index.centroids)} clusters, build time {build_time:.2f} s")
+    print(f"brute force: recall@{k} 1.000, {exact_latency * 1000:.3f} ms per query")
+    for probe_fraction in sorted(set(probe_fractions + [default_probe_fraction])):
+        index.probe_fraction = probe_fraction
+        start = time.perf_counter()
+        found = [{id for id, _ in index.search(query, k = k)} for query in queries]
+        latency = (time.perf_counter() - start) / num_queries
+        recall = np.mean([len(f & e) / k for f, e in zip(found, exact)])
+        nearest = [index.search(query, k = 1) for query in near_duplicates]
+        near_recall = np.mean([len(matches) != 0 and matches[0][0] == str(original) for matches, original in zip(nearest, originals)])
+        label = " (default)" if probe_fraction == default_probe_fraction else ""
+        print(f"{probe_fraction:.0%} of clusters (nprobe {index.nprobe}){label}: recall@{k} {recall:.3f}, near-duplicate recall@1 {near_recall:.3f}, "
+              f"{latency * 1000:.3f} ms per query")
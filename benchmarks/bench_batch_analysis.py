@@ -0,0 +1,51 @@
+"""Compares live sentiment analysis against the batch job mode on the same articles, using the local mock OpenAI server
+and mongomock, and checks that both store the same results. The batch price is taken as half the live price, which is
+the discount OpenAI gives batch requests.
+Run from the repository root: python -m benchmarks.bench_batch_analysis
+"""
+
+import os
+import time
+import mongomock
+from benchmarks.mock_openai import MockOpenAIServer
+from benchmarks.bench_consolidated_analysis import sample_articles
+
+batch_price_ratio : float = 0.5
+
+# gets the stored results of every collection without their MongoDB _id, sorted by id
+def stored_results(database) -> list[list[dict]]:
+    names = ["sentiment_info", "entity_match_results", "confidence_score_details"]
+    return [sorted(database[name].find({}, {"_id" : 0}), key = lambda result: result["id"]) for name in names]
+
+if __name__ == "__main__":
+    server = MockOpenAIServer(latency = 0.2, capacity = 20, retry_after = 1.0, batch_delay = 2.0).start()
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    from parsing import sentiment_analysis
+
+    runs = {}
+    for mode in ("live", "batch"):
+        database = mongomock.MongoClient()["news_info_benchmark"]
+        database["article_info"].insert_many(sample_articles())
+        collections = [database["article_info"], database["sentiment_info"], database["entity_match_results"], database["confidence_score_details"]]
+        server.reset()
+
+        start = time.perf_counter()
+        if mode == "live":
+            sentiment_analysis.start_async(*collections, 0)
+        else:
+            sentiment_analysis.start_batch(*collections, 0, poll_seconds = 0.5)
+        total_time = time.perf_counter() - start
+        runs[mode] = (total_time, server.requests, server.rate_limited, server.prompt_tokens + server.completion_tokens, stored_results(database))
+
+    assert runs["live"][4] == runs["batch"][4], "live and batch runs stored different results"
+    live_tokens = runs["live"][3]
+
+    print(f"{len(sample_articles())} articles, 3 prompts each")
+    print(f"{'mode':<8}{'seconds':>9}{'requests':>10}{'429s':>6}{'tokens':>10}{'relative cost':>15}")
+    for mode, (total_time, requests, rate_limited, tokens, _) in runs.items():
+        cost = tokens / live_tokens * (batch_price_ratio if mode == "batch" else 1)
+        print(f"{mode:<8}{total_time:>9.2f}{requests:>10}{rate_limited:>6}{tokens:>10}{cost:>15.2f}")
+    print("both modes stored the same results")
+
+    server.stop()
@@ -0,0 +1,42 @@
+"""Compares the token use and latency of sentiment analysis with 3 prompts per article against the consolidated mode with
+1 prompt per article, on a fixed sample of articles, using the local mock OpenAI server and mongomock.
+Run from the repository root: python -m benchmarks.bench_consolidated_analysis
+"""
+
+import os
+import random
+import time
+import mongomock
+from benchmarks.mock_openai import MockOpenAIServer
+
+num_articles : int = 30
+body_length : int = 1500
+
+# creates the fixed sample of articles
+def sample_articles() -> list[dict]:
+    rng = random.Random(0)
+    articles = []
+    for i in range(num_articles):
+        body = "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(body_length))
+        articles.append({"id" : i, "title" : f"台積電第{i}季營收", "body" : body})
+    return articles
+
+if __name__ == "__main__":
+    server = MockOpenAIServer(latency = 0.2, latency_per_token = 0.00005).start()
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    from parsing import sentiment_analysis
+
+    for consolidated in (False, True):
+        database = mongomock.MongoClient()["news_info_benchmark"]
+        database["article_info"].insert_many(sample_articles())
+        server.reset()
+
+        start = time.perf_counter()
+        sentiment_analysis.start_async(database["article_info"], database["sentiment_info"], database["entity_match_results"], database["confidence_score_details"], 0, consolidated = consolidated)
+        total_time = time.perf_counter() - start
+        assert database["sentiment_info"].count_documents({}) == num_articles
+
+        mode = "consolidated (1 prompt per article)" if consolidated else "separate (3 prompts per article)"
+        print(f"{mode}: {server.requests} requests, {server.prompt_tokens} prompt tokens, {server.completion_tokens} completion tokens, {total_time:.2f} s")
+    server.stop()
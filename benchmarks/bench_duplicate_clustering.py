@@ -0,0 +1,78 @@
+"""Benchmarks deduplication.find_duplicate_rows, the blocked all-pairs duplicate search used by tfidf_comparison and
+sbert_comparison, on 10k and 100k documents. Sparse rows stand in for tf-idf vectors and dense float32 rows for SBERT
+embeddings, with 1% of the documents planted as near copies of earlier ones. At sizes up to old_loop_limit, the result
+is also checked against the row-by-row loop the dedup functions used before.
+Run from the repository root: python -m benchmarks.bench_duplicate_clustering [number of documents ...]
+"""
+
+import sys
+import time
+import numpy as np
+from scipy import sparse
+from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from parsing.deduplication import find_duplicate_rows
+
+default_sizes : list[int] = [10_000, 100_000]
+threshold : float = 0.9
+vocabulary_size : int = 2 ** 20 # tf-idf features
+terms_per_document : int = 150
+embedding_size : int = 384 # size of all-MiniLM-L6-v2 embeddings
+duplicate_fraction : float = 0.01
+old_loop_limit : int = 2_000 # the old loop takes about 30 s for 2,000 sparse documents and grows quadratically
+
+# makes normalized rows where some rows are noisy copies of earlier rows
+def plant_duplicates(matrix, rng : np.random.Generator):
+    num_rows = matrix.shape[0]
+    copies = rng.choice(np.arange(1, num_rows), size = int(num_rows * duplicate_fraction), replace = False)
+    originals = (rng.random(len(copies)) * copies).astype(int)
+    matrix = matrix.tolil() if sparse.issparse(matrix) else matrix
+    matrix[copies] = matrix[originals] * 1.0
+    matrix = matrix.tocsr() if sparse.issparse(matrix) else matrix
+    return normalize(matrix)
+
+def sparse_documents(num_rows : int, rng : np.random.Generator):
+    matrix = sparse.random(num_rows, vocabulary_size, density = terms_per_document / vocabulary_size, format = "csr", dtype = np.float32, random_state = rng)
+    return plant_duplicates(matrix, rng)
+
+def dense_documents(num_rows : int, rng : np.random.Generator):
+    matrix = rng.standard_normal((num_rows, embedding_size), dtype = np.float32)
+    return plant_duplicates(matrix, rng)
+
+# the duplicate search the dedup functions used before, one row at a time
+def old_loop(matrix, threshold : float) -> list[int]:
+    ids = list(range(matrix.shape[0]))
+    duplicate_article_ids = []
+    for index, current_id in enumerate(ids):
+        if current_id in duplicate_article_ids:
+            continue
+        similarities = cosine_similarity(matrix[index].reshape(1, -1) if not sparse.issparse(matrix) else matrix[index], matrix)
+        counter = 0
+        for similarity_score, article_id in zip(similarities[0], ids):
+            if similarity_score >= threshold:
+                duplicate_article_ids.append(article_id)
+                counter += 1
+        if counter > 0:
+            duplicate_article_ids.pop(len(duplicate_article_ids) - counter)
+    return sorted(duplicate_article_ids)
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1:]] or default_sizes
+    rng = np.random.default_rng(0)
+
+    for size in sizes:
+        for kind, make in (("sparse tf-idf", sparse_documents), ("dense embeddings", dense_documents)):
+            matrix = make(size, rng)
+
+            start = time.perf_counter()
+            duplicates = find_duplicate_rows(matrix, threshold)
+            blocked_time = time.perf_counter() - start
+            line = f"{size} documents, {kind}: blocked search {blocked_time:.2f} s, {len(duplicates)} duplicates"
+
+            if size <= old_loop_limit:
+                start = time.perf_counter()
+                expected = old_loop(matrix, threshold)
+                loop_time = time.perf_counter() - start
+                assert expected == duplicates
+                line += f", row-by-row loop {loop_time:.2f} s"
+            print(line)
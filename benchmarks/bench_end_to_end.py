@@ -0,0 +1,248 @@
+"""Runs one full daily_fetch offline and reports the throughput and latency of each stage. The RSS feeds, article pages,
+and PTT Stock Board pages are built by html_fixtures and served by a local fixture server, every request of the shared
+HTTP client is sent to it instead of the real website, MongoDB is replaced with mongomock, and OpenAI with the local mock
+server. The functions of each stage are wrapped to time every call. Results are written as JSON, and a JSON file from an
+earlier run can be given to compare against.
+Run from the repository root: python -m benchmarks.bench_end_to_end [output file] [baseline file]
+"""
+
+import contextlib
+import functools
+import io
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from urllib.parse import urlsplit
+import mongomock
+from benchmarks.mock_openai import MockOpenAIServer
+from benchmarks.fixture_server import FixtureServer
+from benchmarks.html_fixtures import build_fixture, build_feed, build_PTT_index, article_title
+
+entries_per_feed : int = 30 # entries in each RSS feed
+keyword_every : int = 5 # every 5th title has no keyword, so its article is skipped
+repeated_entries : int = 10 # entries of a feed repeated in the next feed of the same website
+PTT_pages : int = 8 # index pages of the PTT Stock Board
+posts_per_page : int = 20
+page_latency : float = 0.05 # seconds taken by the fixture server to answer each request
+openai_latency : float = 0.3 # seconds taken by the mock OpenAI server to answer each request
+newest_time : datetime = datetime(2025, 10, 13, 10, 0, tzinfo = timezone(timedelta(hours = 8))) # time of the newest entry
+results_directory : str = os.path.join("benchmarks", "results")
+
+class StageTimer:
+    """Start and end times of the calls made in each stage, recorded by wrapped functions."""
+
+    def __init__(self):
+        self.calls = defaultdict(list) # stage -> [(start, end)]
+
+    # wraps a function so the time of each call is recorded under a stage
+    def wrap(self, stage : str, function):
+        @functools.wraps(function)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.calls[stage].append((start, time.perf_counter()))
+        return timed
+
+    # wraps a coroutine function so the time of each call is recorded under a stage
+    def wrap_async(self, stage : str, function):
+        @functools.wraps(function)
+        async def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await function(*args, **kwargs)
+            finally:
+                self.calls[stage].append((start, time.perf_counter()))
+        return timed
+
+    # gets the number of calls, throughput, and latency of each stage
+    # throughput is calls per second between the start of the first call and the end of the last
+    def summary(self) -> dict:
+        stages = {}
+        for stage, calls in self.calls.items():
+            durations = [end - start for start, end in calls]
+            span = max(end for _, end in calls) - min(start for start, _ in calls)
+            stages[stage] = {
+                "calls" : len(calls),
+                "busy_seconds" : sum(durations),
+                "span_seconds" : span,
+                "throughput_per_second" : len(calls) / span if span > 0 else None,
+                "latency_ms" : latency_summary(durations)
+            }
+        return stages
+
+# gets the mean, median, 95th percentile, and max of a list of seconds, in milliseconds
+def latency_summary(seconds : list[float]) -> dict:
+    if len(seconds) == 0:
+        return None
+    p95 = statistics.quantiles(seconds, n = 20, method = "inclusive")[18] if len(seconds) > 1 else seconds[0]
+    return {
+        "mean" : statistics.fmean(seconds) * 1000,
+        "p50" : statistics.median(seconds) * 1000,
+        "p95" : p95 * 1000,
+        "max" : max(seconds) * 1000
+    }
+
+# gets a time as a source's feed would write it
+def feed_time(source, published : datetime) -> str:
+    if source.timestamp_parser is sources.parse_iso8601:
+        return published.isoformat(timespec = "seconds")
+    return format_datetime(published)
+
+# registers the RSS feed and article pages of every feed, where each feed repeats some entries of the website's last feed
+def build_feeds(server : FixtureServer, feed_sources : list) -> None:
+    last_entries = {} # source name -> entries of its last feed
+    for feed_index, source in enumerate(feed_sources):
+        rng = random.Random(f"feed-{feed_index}")
+        host = urlsplit(source.feed_url).netloc
+        entries = list(last_entries.get(source.name, []))[:repeated_entries]
+        for i in range(len(entries), entries_per_feed):
+            link = f"https://{host}/news/{feed_index}-{i}"
+            published = newest_time - timedelta(minutes = feed_index * entries_per_feed + i)
+            entries.append((article_title(rng, i % keyword_every != keyword_every - 1), link, feed_time(source, published)))
+            server.add(link, build_fixture(source.name, feed_index * entries_per_feed + i))
+        last_entries[source.name] = entries
+        server.add(source.feed_url, build_feed(source.name, entries), "application/rss+xml; charset=utf-8")
+
+# registers the index pages and posts of the PTT Stock Board, the newest page at PTT_url
+def build_PTT_board(server : FixtureServer, PTT_url : str) -> None:
+    rng = random.Random("PTT")
+    newest_post_time = int(newest_time.timestamp())
+    for page in range(1, PTT_pages + 1):
+        posts = []
+        for i in range(posts_per_page):
+            number = (page - 1) * posts_per_page + i
+            post_time = newest_post_time - (PTT_pages * posts_per_page - number) * 60
+            path = f"/bbs/Stock/M.{post_time}.A.{number:03X}.html"
+            posts.append((path, "[新聞] " + article_title(rng, number % keyword_every != keyword_every - 1)))
+            server.add("https://www.ptt.cc" + path, build_fixture("PTT Stock Board", number))
+        previous_page = f"/bbs/Stock/index{page - 1}.html" if page > 1 else None
+        page_url = PTT_url if page == PTT_pages else f"https://www.ptt.cc/bbs/Stock/index{page}.html"
+        server.add(page_url, build_PTT_index(posts, previous_page))
+
+# prints a table of the stages, with the change from the baseline run if one is given
+def report(results : dict, baseline : dict = None) -> None:
+    run = results["run"]
+    print(f"{run['articles_stored']} articles stored ({run['duplicates']} duplicates skipped) in {run['total_seconds']:.2f} seconds, "
+          f"{run['articles_per_second']:.1f} articles/s")
+    if run["scrape_to_stored_ms"] is not None:
+        print(f"seconds from scraping to stored sentiment: median {run['scrape_to_stored_ms']['p50'] / 1000:.2f}, max {run['scrape_to_stored_ms']['max'] / 1000:.2f}")
+    print(f"{'stage':<18}{'calls':>7}{'per s':>9}{'p50 ms':>9}{'p95 ms':>9}{'max ms':>9}" + (f"{'p50 change':>12}{'per s change':>14}" if baseline else ""))
+    for stage, summary in results["stages"].items():
+        line = (f"{stage:<18}{summary['calls']:>7}{summary['throughput_per_second'] or 0:>9.1f}{summary['latency_ms']['p50']:>9.2f}"
+                f"{summary['latency_ms']['p95']:>9.2f}{summary['latency_ms']['max']:>9.2f}")
+        before = baseline["stages"].get(stage) if baseline else None
+        if before is not None:
+            line += f"{summary['latency_ms']['p50'] / before['latency_ms']['p50'] - 1:>+12.1%}"
+            line += f"{(summary['throughput_per_second'] or 0) / (before['throughput_per_second'] or 1) - 1:>+14.1%}"
+        print(line)
+
+if __name__ == "__main__":
+    output_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(results_directory, f"end_to_end-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    baseline = None
+    if len(sys.argv) > 2:
+        with open(sys.argv[2], encoding = "utf-8") as file:
+            baseline = json.load(file)
+
+    openai_server = MockOpenAIServer(latency = openai_latency).start()
+    os.environ["OPENAI_BASE_URL"] = openai_server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    import main
+    from parsing import http_client, feed_state, extraction, keyword_matcher, minhash_index, sentiment_analysis, pipeline, html_scraper, sources
+
+    feed_sources = main.high_priority_sources + main.lower_priority_sources
+    fixtures = FixtureServer(latency = page_latency)
+    build_feeds(fixtures, feed_sources)
+    build_PTT_board(fixtures, html_scraper.PTT_url)
+    fixtures.start()
+
+    # sends every request to the fixture server, timing feed downloads and page downloads separately
+    timer = StageTimer()
+    feed_urls = {source.feed_url for source in feed_sources}
+    get = http_client.get
+    def fixture_get(url : str, **kwargs):
+        start = time.perf_counter()
+        try:
+            return get(fixtures.local_url(url), **kwargs)
+        finally:
+            timer.calls["feed_fetch" if url in feed_urls else "body_fetch"].append((start, time.perf_counter()))
+    http_client.get = fixture_get
+
+    # times the functions of each stage
+    feed_state.feedparser.parse = timer.wrap("feed_parse", feed_state.feedparser.parse)
+    extraction.parse_html = timer.wrap("html_parse", extraction.parse_html)
+    extraction.Extractor.extract = timer.wrap("extraction", extraction.Extractor.extract)
+    extraction.extract_PTT_post = timer.wrap("extraction", extraction.extract_PTT_post)
+    keyword_matcher.KeywordMatcher.match = timer.wrap("keyword_match", keyword_matcher.KeywordMatcher.match)
+    minhash_index.signature = timer.wrap("dedup_signature", minhash_index.signature)
+    minhash_index.MinHashIndex.query = timer.wrap("dedup_query", minhash_index.MinHashIndex.query)
+    sentiment_analysis.analyze_article = timer.wrap_async("analysis", sentiment_analysis.analyze_article)
+
+    # keeps the pipeline of the run for its totals and latencies
+    pipelines = []
+    close = pipeline.ArticlePipeline.close
+    def keep_pipeline(self) -> None:
+        pipelines.append(self)
+        close(self)
+    pipeline.ArticlePipeline.close = keep_pipeline
+
+    # every MongoClient created by the run is the same mongomock client, so its collections can be read afterwards
+    database_client = mongomock.MongoClient()
+    main.MongoClient = lambda *args, **kwargs: database_client
+    # the run's metrics summary is written next to the benchmark results
+    main.metrics_directory = os.path.dirname(output_path) or "."
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        main.daily_fetch()
+    total_time = time.perf_counter() - start
+
+    database = database_client[main.database_name]
+    articles_stored = database["article_info"].count_documents({})
+    run_pipeline = pipelines[0] if len(pipelines) != 0 else None
+    results = {
+        "benchmark" : "end_to_end",
+        "created_at" : datetime.now(timezone.utc).isoformat(timespec = "seconds"),
+        "config" : {
+            "feeds" : len(feed_sources),
+            "entries_per_feed" : entries_per_feed,
+            "keyword_every" : keyword_every,
+            "repeated_entries" : repeated_entries,
+            "PTT_pages" : PTT_pages,
+            "posts_per_page" : posts_per_page,
+            "page_latency" : page_latency,
+            "openai_latency" : openai_latency,
+            "pipelined" : main.pipelined
+        },
+        "run" : {
+            "total_seconds" : total_time,
+            "articles_stored" : articles_stored,
+            "articles_analyzed" : database["sentiment_info"].count_documents({}),
+            "articles_per_second" : articles_stored / total_time,
+            "duplicates" : run_pipeline.duplicates if run_pipeline is not None else None,
+            "scrape_to_stored_ms" : latency_summary(run_pipeline.latencies) if run_pipeline is not None else None,
+            "page_requests" : fixtures.requests,
+            "page_bytes" : fixtures.bytes_served,
+            "pages_not_found" : fixtures.not_found,
+            "openai_requests" : openai_server.requests,
+            "prompt_tokens" : openai_server.prompt_tokens,
+            "completion_tokens" : openai_server.completion_tokens
+        },
+        "stages" : timer.summary()
+    }
+
+    os.makedirs(os.path.dirname(output_path) or ".", exist_ok = True)
+    with open(output_path, "w", encoding = "utf-8") as file:
+        json.dump(results, file, indent = 2)
+    report(results, baseline)
+    print(f"results written to {output_path}")
+
+    fixtures.stop()
+    openai_server.stop()
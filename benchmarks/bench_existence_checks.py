@@ -0,0 +1,83 @@
+"""Benchmarks the existence checks done for each RSS feed in main.fetch: the previous find_one per entry for the url and
+title, against one $in query per field on indexed fields. Uses the MongoDB server in MONGODB_BENCHMARK_CONNECTION_STRING
+if it is set, and mongomock otherwise. mongomock does not use indexes, so with it only the drop in round trips is shown.
+Run from the repository root: python -m benchmarks.bench_existence_checks [number of stored articles ...]
+"""
+
+import os
+import sys
+import time
+import random
+from main import find_existing
+
+feed_size : int = 100 # entries in one RSS feed
+default_sizes : list[int] = [10_000, 100_000] # 1,000,000 can be passed as well, but takes very long with mongomock
+
+# gets a collection from the benchmark MongoDB server, or from mongomock if there is none
+def get_collection():
+    connection_string = os.getenv("MONGODB_BENCHMARK_CONNECTION_STRING")
+    if connection_string is not None:
+        from pymongo import MongoClient
+        client = MongoClient(connection_string)
+    else:
+        import mongomock
+        client = mongomock.MongoClient()
+    collection = client["news_info_benchmark"]["article_info"]
+    collection.drop()
+    return collection
+
+# stores the given number of articles, in batches
+def fill(collection, size : int) -> None:
+    batch = []
+    for i in range(size):
+        batch.append({"id" : i, "title" : f"標題 {i}", "url" : f"https://news.example.com/{i}", "body" : "內容"})
+        if len(batch) == 10_000:
+            collection.insert_many(batch)
+            batch = []
+    if len(batch) != 0:
+        collection.insert_many(batch)
+
+# the existence checks done in main.fetch before batching, without indexes
+def per_entry_checks(collection, entries : list[dict]) -> int:
+    new_entries = 0
+    for entry in entries:
+        if collection.find_one({"url" : entry["link"]}) is not None:
+            continue
+        if collection.find_one({"title" : entry["title"]}) is not None:
+            continue
+        new_entries += 1
+    return new_entries
+
+# the batched existence checks done in main.fetch, on indexed fields
+def batched_checks(collection, entries : list[dict]) -> int:
+    existing_links = find_existing(collection, "url", [entry["link"] for entry in entries])
+    existing_titles = find_existing(collection, "title", [entry["title"] for entry in entries])
+    return sum(1 for entry in entries if entry["link"] not in existing_links and entry["title"] not in existing_titles)
+
+if __name__ == "__main__":
+    sizes = [int(size) for size in sys.argv[1:]] or default_sizes
+    rng = random.Random(0)
+
+    for size in sizes:
+        collection = get_collection()
+        fill(collection, size)
+
+        # half of the feed is already stored, half is new
+        entries = []
+        for i in range(feed_size):
+            number = rng.randrange(size) if i % 2 == 0 else size + i
+            entries.append({"link" : f"https://news.example.com/{number}", "title" : f"標題 {number}"})
+
+        start = time.perf_counter()
+        expected = per_entry_checks(collection, entries)
+        per_entry_time = time.perf_counter() - start
+
+        collection.create_index("url")
+        collection.create_index("title")
+        start = time.perf_counter()
+        found = batched_checks(collection, entries)
+        batched_time = time.perf_counter() - start
+        assert expected == found
+
+        print(f"{size} stored articles: per-entry find_one {per_entry_time * 1000:.1f} ms ({2 * feed_size} round trips), "
+              f"batched $in {batched_time * 1000:.1f} ms (2 round trips)")
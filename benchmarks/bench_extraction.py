@@ -0,0 +1,181 @@
+"""Compares the parse time of the lxml extraction engine against the BeautifulSoup helpers html_scraper used before it,
+kept here as they were, on a page from each of the ten sources, and checks that both get the same body text. Pages are
+served from memory in place of the network, so only parsing and extraction are timed.
+Run from the repository root: python -m benchmarks.bench_extraction
+"""
+
+import time
+import logging
+import bs4
+from bs4 import BeautifulSoup
+from benchmarks.html_fixtures import sources, build_fixture
+from parsing import http_client, html_scraper, extraction
+from parsing import sources as source_registry
+
+repeats : int = 20
+
+class FixtureResponse:
+    """Response holding the HTML of a fixture page."""
+
+    def __init__(self, text : str):
+        self.text = text
+        self.status_code = 200
+
+# the BeautifulSoup helpers of html_scraper before the extraction engine, each fetching and parsing the page itself
+# finds text in <p> tags under the tag with a certain name
+def find_text_by_name(article_link : str, name : str) -> str:
+    text = ""
+    soup = html_scraper.get_article(article_link)
+    if soup is None:
+        return None
+    article = soup.find(name)
+
+    # checks if the correct tag was found
+    if article != None:
+        paragraphs = article.find_all("p")
+
+        # adds the text in each p tag to the saved text
+        for i in paragraphs:
+            text += i.get_text()
+    
+    if text == "":
+        logging.error(f"No text found for this article. Link: {article_link}")
+        text = None
+    
+    return text
+
+# finds the text in <p> tags under a tag with a certain id
+def find_text_by_id(article_link : str, id_name : str) -> str:
+    text = ""
+    soup = html_scraper.get_article(article_link)
+    if soup is None:
+        return None
+    article = soup.find(id = id_name)
+
+    # checks if the correct tag was found
+    if article != None:
+        paragraphs = article.find_all("p")
+
+        # adds the text in each p tag to the saved text
+        for i in paragraphs:
+            text += i.get_text()
+    
+    if text == "":
+        logging.error(f"No text found for this article. Link: {article_link}")
+        text = None
+
+    return text
+
+# finds the text in <p> tags under a tag with a certain class
+def find_text_by_class(article_link : str, class_name : str) -> str:
+    text = ""
+    soup = html_scraper.get_article(article_link)
+    if soup is None:
+        return None
+    article = soup.find(class_ = class_name)
+
+    # checks if the correct tag was found
+    if article != None:
+        paragraphs = article.find_all("p")
+
+        # adds the text in each p tag to the saved text
+        for i in paragraphs:
+            text += i.get_text()
+    
+    if text == "":
+        logging.error(f"No text found for this article. Link: {article_link}")
+        text = None
+
+    return text
+
+# gets the body text of a PTT Stock Board Post
+# WARNING: Specifically customized to PTT Stock Board's html, so if the html structure changes this will stop working
+def get_PTT_body_text(soup : BeautifulSoup) -> str:
+
+    article = soup.find_all(class_ = "article-metaline") # uses article-metaline tags as starting point for body text
+    if article is None or len(article) == 0:
+        logging.error(f"Class 'article-metaline' could not be found in current article. Check if PTT html has been updated.")
+        return None
+    else:
+        tag = article[len(article) - 1] # finds the last article-metaline tag
+
+    text = ""
+    while True:
+        # breaks from the loop if the end of the page is reached
+        if tag is None or tag.next_sibling is None:
+            break
+
+        # checks if the next sibling is a tag
+        if isinstance(tag, bs4.Tag):
+
+            # checks if the next tag has a class
+            if tag.get("class") is not None:
+
+                # ends the loop if the article has ended and the next tag is for comments
+                if tag.get("class")[0] == "push":
+                    break
+        
+        # adds the current element to text if it is not a tag object
+        else:
+            text = text + str(tag)
+        
+        # sets tag to the next item in the webpage
+        tag = tag.next_sibling
+
+    # removing substrings used for formatting on the website for better legibility in the BSON document
+    text = text.replace("\n", "")
+    text = text.replace("  ", "")
+    text = text.replace("===", "")
+    text = text.replace("---", "")
+
+    # checks if any text was actually scraped
+    if text == "":
+        logging.error(f"No text found in current article. Check if PTT html has been updated.")
+        text = None
+
+    return(text)
+
+# gets the body text of a page with the BeautifulSoup helpers, the way main.py and PTT_fetch used them
+def current_helpers(source : str, url : str) -> str:
+    match source:
+        case "鉅亨網 (Anue)":
+            return find_text_by_id(url, "article-container")
+        case "Inside (科技媒體)":
+            return find_text_by_id(url, "article_content")
+        case "中央社財經 (CNA)":
+            return find_text_by_class(url, "centralContent")
+        case "PTT Stock Board":
+            return get_PTT_body_text(html_scraper.get_article(url))
+        case _:
+            return find_text_by_name(url, "article")
+
+# gets the body text of a page with the extraction engine
+def extraction_engine(source : str, url : str) -> str:
+    if source == "PTT Stock Board":
+        return extraction.extract_PTT_post(extraction.get_document(url))[1]
+    return extraction.fetch_body_text(url, source_registry.get_source(source).extractor)
+
+# gets the average seconds taken to get the body text of a page
+def time_extraction(function, source : str, url : str) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(source, url)
+    return (time.perf_counter() - start) / repeats
+
+if __name__ == "__main__":
+    pages = {f"https://fixtures.local/{index}" : build_fixture(source) for index, source in enumerate(sources)}
+    http_client.get = lambda url, **kwargs: FixtureResponse(pages[url])
+
+    print(f"{'source':<24}{'KiB':>6}{'helpers ms':>12}{'engine ms':>11}{'speedup':>9}")
+    total_current = 0
+    total_engine = 0
+    for index, source in enumerate(sources):
+        url = f"https://fixtures.local/{index}"
+        assert current_helpers(source, url) == extraction_engine(source, url), f"different body text for {source}"
+        current_time = time_extraction(current_helpers, source, url)
+        engine_time = time_extraction(extraction_engine, source, url)
+        total_current += current_time
+        total_engine += engine_time
+        print(f"{source:<24}{len(pages[url].encode('utf-8')) / 1024:>6.0f}{current_time * 1000:>12.2f}{engine_time * 1000:>11.2f}{current_time / engine_time:>8.1f}x")
+    print(f"{'total':<24}{'':>6}{total_current * 1000:>12.2f}{total_engine * 1000:>11.2f}{total_current / total_engine:>8.1f}x")
+    print("both get the same body text from every page")
@@ -0,0 +1,66 @@
+"""Benchmarks the pooled HTTP session in parsing/http_client.py against bare requests.get calls, using a local HTTP
+server that counts how many TCP connections are opened. The server adds a small delay to each new connection to stand in
+for the TCP/TLS handshake with a remote website.
+Run from the repository root: python -m benchmarks.bench_http_pool
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from parsing import http_client
+
+num_requests : int = 200
+num_threads : int = 8
+handshake_delay : float = 0.02 # seconds added to every new connection
+page : bytes = ("<html><body><article>" + "<p>台積電營收創新高，外資持續買超。</p>" * 200 + "</article></body></html>").encode("utf-8")
+
+connection_count = 0
+connection_lock = threading.Lock()
+
+# serves the same page for every path, counting each new connection
+class PageHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1" # allows keep-alive
+    disable_nagle_algorithm = True # sends the headers and body without waiting, like production web servers
+
+    def setup(self):
+        global connection_count
+        with connection_lock:
+            connection_count += 1
+        time.sleep(handshake_delay)
+        super().setup()
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(page)))
+        self.end_headers()
+        self.wfile.write(page)
+
+    def log_message(self, format, *args):
+        pass
+
+# requests every url with the given function and returns (seconds taken, connections opened)
+def run(get, urls : list[str]) -> tuple[float, int]:
+    global connection_count
+    connection_count = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = num_threads) as executor:
+        for response in executor.map(get, urls):
+            assert response.status_code == 200
+    return time.perf_counter() - start, connection_count
+
+if __name__ == "__main__":
+    server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+    threading.Thread(target = server.serve_forever, daemon = True).start()
+    urls = [f"http://127.0.0.1:{server.server_port}/article/{i}" for i in range(num_requests)]
+
+    bare_time, bare_connections = run(lambda url: requests.get(url, timeout = 15), urls)
+    pooled_time, pooled_connections = run(http_client.get, urls)
+    http_client.close()
+    server.shutdown()
+
+    print(f"requests: {num_requests}, threads: {num_threads}, handshake delay: {handshake_delay * 1000:.0f} ms")
+    print(f"bare requests.get: {bare_time:.2f} s, {bare_connections} connections opened")
+    print(f"pooled session: {pooled_time:.2f} s, {pooled_connections} connections opened")
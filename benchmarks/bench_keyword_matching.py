@@ -0,0 +1,56 @@
+"""Benchmarks the Aho-Corasick keyword matcher against the previous loop over the keyword set. Bodies are generated to
+match the size of the Chinese articles scraped (about 2,000 characters) and contain a few keywords each.
+Run from the repository root: python -m benchmarks.bench_keyword_matching
+"""
+
+import random
+import time
+from parsing.keyword_matcher import load_keywords, KeywordMatcher
+
+num_articles : int = 350
+body_length : int = 2000
+
+# the keyword tagging done in main.fetch before the keyword matcher was added
+def loop_match(keywords : set, title : str, text : str) -> list[str]:
+    article_keywords = []
+    for keyword in keywords:
+        if keyword in title or keyword in text:
+            article_keywords.append(keyword)
+    return article_keywords
+
+# creates a random chinese article that includes some of the keywords
+def make_article(rng : random.Random, keywords : list[str]) -> tuple[str, str]:
+    filler = [chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(body_length)]
+    for _ in range(rng.randint(0, 8)):
+        position = rng.randrange(body_length)
+        filler[position] = rng.choice(keywords)
+    title = "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(20)) + rng.choice(keywords)
+    return title, "".join(filler) + "。"
+
+if __name__ == "__main__":
+    rng = random.Random(0)
+    keyword_categories = load_keywords()
+    keywords = set(keyword_categories)
+    articles = [make_article(rng, list(keywords)) for _ in range(num_articles)]
+
+    start = time.perf_counter()
+    matcher = KeywordMatcher(keyword_categories)
+    build_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    loop_results = [loop_match(keywords, title, text) for title, text in articles]
+    loop_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    matcher_results = [list(matcher.match(title, text)) for title, text in articles]
+    matcher_time = time.perf_counter() - start
+
+    # checks that both approaches find the same keywords
+    for expected, found in zip(loop_results, matcher_results):
+        assert set(expected) == set(found), (expected, found)
+
+    print(f"keywords: {len(matcher)}, articles: {num_articles}, body length: {body_length}")
+    print(f"automaton build time: {build_time * 1000:.1f} ms")
+    print(f"keyword loop: {loop_time * 1000:.1f} ms ({loop_time / num_articles * 1000:.3f} ms per article)")
+    print(f"keyword matcher: {matcher_time * 1000:.1f} ms ({matcher_time / num_articles * 1000:.3f} ms per article)")
+    print(f"speedup: {loop_time / matcher_time:.1f}x")
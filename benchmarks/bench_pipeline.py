@@ -0,0 +1,72 @@
+"""Compares running scraping, deduplication, and sentiment analysis one after another against the overlapped pipeline,
+using simulated scraping (a fixed delay per article, with some exact duplicates), the local mock OpenAI server, and
+mongomock. Reports the total time and the seconds from each article being scraped to its sentiment being stored.
+Run from the repository root: python -m benchmarks.bench_pipeline
+"""
+
+import os
+import random
+import statistics
+import time
+import mongomock
+from benchmarks.mock_openai import MockOpenAIServer
+
+num_articles : int = 120
+scrape_seconds : float = 0.05 # time taken to scrape each article
+duplicate_every : int = 10 # every 10th article is a copy of the one before it
+
+# simulates scraping, calling save with each article after scrape_seconds
+def scrape(save) -> None:
+    for i in range(num_articles):
+        time.sleep(scrape_seconds)
+        source = i - 1 if i % duplicate_every == duplicate_every - 1 else i
+        rng = random.Random(source)
+        body = "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(1500))
+        save({"title" : f"台積電新聞 {i}", "body" : body, "source" : "benchmark"})
+
+# creates the collections used by a run
+def collections():
+    database = mongomock.MongoClient()["news_info_benchmark"]
+    return database, [database["article_info"], database["sentiment_info"], database["entity_match_results"], database["confidence_score_details"]]
+
+# prints the results of a run
+def report(name : str, total_time : float, latencies : list[float], stored : int) -> None:
+    print(f"{name:<12}{total_time:>9.2f}{stored:>8}{min(latencies):>12.2f}{statistics.median(latencies):>12.2f}{max(latencies):>12.2f}")
+
+if __name__ == "__main__":
+    server = MockOpenAIServer(latency = 0.3).start()
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    from parsing import sentiment_analysis, deduplication, pipeline
+
+    print(f"{num_articles} articles scraped at {scrape_seconds} seconds each, 0.3 second OpenAI responses")
+    print(f"{'':<12}{'seconds':>9}{'stored':>8}{'min latency':>12}{'median':>12}{'max':>12}")
+
+    # scrapes everything, then deduplicates, then analyzes
+    database, (article_collection, *analysis_collections) = collections()
+    scraped_at = {}
+    latencies = []
+    def insert(article : dict) -> None:
+        article["id"] = article_collection.count_documents({})
+        scraped_at[article["title"]] = time.monotonic()
+        article_collection.insert_one(article)
+    def record_stored(ids : list[int]) -> None:
+        now = time.monotonic()
+        for doc in article_collection.find({"id" : {"$in" : ids}}, {"title" : 1}):
+            latencies.append(now - scraped_at[doc["title"]])
+
+    start = time.perf_counter()
+    scrape(insert)
+    deduplication.minhash_comparison(article_collection, database["minhash_index"], pipeline.dedup_threshold, analysis_collections)
+    sentiment_analysis.start_async(article_collection, *analysis_collections, 0, on_insert = record_stored)
+    report("sequential", time.perf_counter() - start, latencies, analysis_collections[0].count_documents({}))
+
+    # runs deduplication and analysis while scraping
+    database, (article_collection, *analysis_collections) = collections()
+    start = time.perf_counter()
+    article_pipeline = pipeline.ArticlePipeline(article_collection, *analysis_collections, database["minhash_index"], 0).start()
+    scrape(article_pipeline.submit)
+    article_pipeline.close()
+    report("pipelined", time.perf_counter() - start, article_pipeline.latencies, analysis_collections[0].count_documents({}))
+
+    server.stop()
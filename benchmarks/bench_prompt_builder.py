@@ -0,0 +1,62 @@
+"""Compares the old prompt layout, where the confidence and entity prompts start with the article, against the prompt
+builder's layout on a fixed sample of articles of mixed length. For each kind of prompt it reports the tokens every
+request shares with the others from its start (the prefix OpenAI can cache), and the total tokens sent before and after
+trimming bodies to the token budget.
+Run from the repository root: python -m benchmarks.bench_prompt_builder
+"""
+
+import os
+import random
+from parsing.prompt_builder import PromptBuilder, count_tokens, min_cached_prefix_tokens
+
+num_articles : int = 200
+
+# creates articles with bodies of 300 to 8000 characters, made of sentences of chinese characters
+def sample_articles() -> list[tuple[str, str]]:
+    rng = random.Random(0)
+    articles = []
+    for i in range(num_articles):
+        length = rng.randint(300, 8000)
+        sentences = []
+        while sum(len(sentence) for sentence in sentences) < length:
+            sentences.append("".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(rng.randint(10, 60))) + "。")
+        articles.append((f"台積電第{i}則新聞", "".join(sentences)))
+    return articles
+
+# gets the number of tokens at the start of a text shared by every text
+def shared_prefix_tokens(texts : list[str]) -> int:
+    return count_tokens(os.path.commonprefix(texts))
+
+if __name__ == "__main__":
+    os.environ.setdefault("OPENAI_API_KEY", "benchmark")
+    from parsing import sentiment_analysis as analysis
+
+    articles = sample_articles()
+    kinds = analysis.prompt_kinds(False)
+
+    # layout before the prompt builder: the article was in the system prompt of the confidence and entity prompts
+    old_requests = {kind : [] for kind in kinds}
+    for headline, content in articles:
+        old_article_prompt = f"You are a financial news analyst analyzing an article. The headline is {headline}, and the content is: {content}"
+        old_requests["sentiment"].append(analysis.system_prompt + analysis.content_prompt_template.format(headline = headline, content = content))
+        old_requests["confidence"].append(old_article_prompt + analysis.confidence_prompt)
+        old_requests["entities"].append(old_article_prompt + analysis.entities_prompt)
+
+    builder = PromptBuilder(analysis.prompt_layouts)
+    new_requests = {kind : [] for kind in kinds}
+    for headline, content in articles:
+        for kind, prompt in zip(kinds, analysis.build_prompts(builder, headline, content, False)):
+            new_requests[kind].append(prompt[0] + prompt[1])
+
+    print(f"{num_articles} articles, bodies trimmed to {builder.body_budget} tokens, OpenAI caches prefixes of {min_cached_prefix_tokens}+ tokens")
+    print(f"{'prompt':<12}{'old prefix':>12}{'new prefix':>12}{'old tokens':>12}{'new tokens':>12}")
+    old_total = 0
+    new_total = 0
+    for kind in kinds:
+        old_tokens = sum(count_tokens(request) for request in old_requests[kind])
+        new_tokens = sum(count_tokens(request) for request in new_requests[kind])
+        old_total += old_tokens
+        new_total += new_tokens
+        print(f"{kind:<12}{shared_prefix_tokens(old_requests[kind]):>12}{shared_prefix_tokens(new_requests[kind]):>12}{old_tokens:>12}{new_tokens:>12}")
+    print(f"{'total':<12}{'':>24}{old_total:>12}{new_total:>12}")
+    print(f"{builder.trimmed_articles} of {builder.articles} bodies trimmed, {builder.trimmed_tokens} tokens saved ({builder.trimmed_tokens / old_total:.1%})")
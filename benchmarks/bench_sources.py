@@ -0,0 +1,77 @@
+"""Compares converting RSS timestamps with the match block main.py used before the source registry (a strptime format
+chosen by source name and a time zone object built for every call) against the parsers of the source registry, and
+checks that both give the same times.
+Run from the repository root: python -m benchmarks.bench_sources
+"""
+
+import time
+import pytz
+from datetime import datetime
+from parsing import sources
+
+repeats : int = 20000
+
+# a timestamp in the format of each source's feed
+sample_timestamps : dict[str, str] = {
+    "鉅亨網 (Anue)" : "Mon, 13 Oct 2025 10:00:00 +0800",
+    "MoneyDJ 理財網" : "Mon, 13 Oct 2025 10:00:00 +0800",
+    "經濟新聞網" : "Mon, 13 Oct 2025 10:00:00 +0800",
+    "商業週刊" : "Mon, 13 Oct 2025 02:00:00 +0000",
+    "中央社財經 (CNA)" : "Mon, 13 Oct 2025 10:00:00 +0800",
+    "Yahoo 奇摩股市" : "Mon, 13 Oct 2025 02:00:00 GMT",
+    "TechOrange 科技報橘" : "Mon, 13 Oct 2025 02:00:00 GMT",
+    "Inside (科技媒體)" : "2025-10-13T10:00:00+08:00",
+    "工商時報" : "2025-10-13T10:00:00",
+    "PTT Stock Board" : "Mon Oct 13 10:00:00 2025"
+}
+
+# the conversion main.get_datetime and parse_PTT_post did before the source registry
+def match_block(title : str, timestamp : str) -> datetime:
+    format = ""
+    match title:
+        case "鉅亨網 (Anue)" | "MoneyDJ 理財網" | "商業週刊" | "中央社財經 (CNA)" | "經濟新聞網":
+            format = f"%a, %d %b %Y %H:%M:%S %z"
+        case "Yahoo 奇摩股市" | "TechOrange 科技報橘":
+            format = f"%a, %d %b %Y %H:%M:%S %Z"
+        case "Inside (科技媒體)":
+            format = f"%Y-%m-%dT%H:%M:%S%z"
+        case "工商時報":
+            format = f"%Y-%m-%dT%H:%M:%S"
+        case "PTT Stock Board":
+            format = f"%a %b %d %H:%M:%S %Y"
+    datetime_object = datetime.strptime(timestamp, format)
+    tw_timezone = pytz.timezone("Etc/GMT-8")
+    if datetime_object.tzinfo is None:
+        return tw_timezone.localize(datetime_object)
+    if datetime_object.tzinfo == tw_timezone:
+        return datetime_object
+    return datetime_object.astimezone(tw_timezone)
+
+# the conversion with the source registry
+def registry(title : str, timestamp : str) -> datetime:
+    return sources.get_source(title).parse_timestamp(timestamp)
+
+# gets the average microseconds taken to convert a timestamp
+def time_conversion(function, title : str, timestamp : str) -> float:
+    start = time.perf_counter()
+    for _ in range(repeats):
+        function(title, timestamp)
+    return (time.perf_counter() - start) / repeats * 1_000_000
+
+if __name__ == "__main__":
+    print(f"{'source':<24}{'match us':>10}{'registry us':>13}{'speedup':>9}")
+    total_match = 0
+    total_registry = 0
+    for title, timestamp in sample_timestamps.items():
+        before = match_block(title, timestamp)
+        after = registry(title, timestamp)
+        note = ""
+        if before != after:
+            # the %Z format read "GMT" times as if they were already UTC+8
+            note = f"  (was {before.isoformat()}, now {after.isoformat()})"
+        match_time = time_conversion(match_block, title, timestamp)
+        registry_time = time_conversion(registry, title, timestamp)
+        total_match += match_time
+        total_registry += registry_time
+        print(f"{title:<24}{match_time:>10.2f}{registry_time:>13.2f}{match_time / registry_time:>8.1f}x{note}")
+    print(f"{'total':<24}{total_match:>10.2f}{total_registry:>13.2f}{total_match / total_registry:>8.1f}x")
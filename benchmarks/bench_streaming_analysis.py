@@ -0,0 +1,56 @@
+"""Measures the peak memory used by sentiment analysis for growing numbers of waiting articles, using the local mock
+OpenAI server and mongomock. With the streaming pipeline the peak should stay about the same as the backlog grows.
+Run from the repository root: python -m benchmarks.bench_streaming_analysis
+"""
+
+import os
+import time
+import tracemalloc
+import mongomock
+from benchmarks.mock_openai import MockOpenAIServer
+from benchmarks.bench_consolidated_analysis import sample_articles
+
+backlog_sizes : list[int] = [100, 300, 900]
+
+class CountingCollection:
+    """Result collection that only counts inserted documents, so stored results are not counted as pipeline memory."""
+
+    def __init__(self):
+        self.count = 0
+
+    def insert_many(self, documents : list[dict]) -> None:
+        self.count += len(documents)
+
+# creates a collection holding num_articles articles
+def article_collection(num_articles : int):
+    sample = sample_articles()
+    collection = mongomock.MongoClient()["news_info_benchmark"]["article_info"]
+    collection.insert_many([{**sample[i % len(sample)], "id" : i} for i in range(num_articles)])
+    return collection
+
+if __name__ == "__main__":
+    server = MockOpenAIServer(latency = 0.005).start()
+    os.environ["OPENAI_BASE_URL"] = server.url
+    os.environ["OPENAI_API_KEY"] = "benchmark"
+    from parsing import sentiment_analysis
+
+    # warms up the OpenAI client so its one-time setup is not counted in the first measurement
+    sentiment_analysis.start_async(article_collection(10), *[CountingCollection() for _ in range(3)], 0)
+
+    print(f"{'articles':>10}{'requests':>10}{'seconds':>10}{'peak MiB':>10}")
+    for num_articles in backlog_sizes:
+        collection = article_collection(num_articles)
+        results = [CountingCollection() for _ in range(3)]
+        server.reset()
+
+        tracemalloc.start()
+        start = time.perf_counter()
+        sentiment_analysis.start_async(collection, *results, 0)
+        total_time = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        assert all(result.count == num_articles for result in results)
+
+        print(f"{num_articles:>10}{server.requests:>10}{total_time:>10.2f}{peak / 2 ** 20:>10.2f}")
+
+    server.stop()
@@ -0,0 +1,73 @@
+"""A local stand-in for the news websites used by the end-to-end benchmark. Pages are registered by the url they would
+have on the real website, and served from memory at http://127.0.0.1:<port>/<host>/<path> after a configurable delay,
+so the scrapers can send their requests through the shared HTTP client with only the host of each url changed.
+"""
+
+import threading
+import time
+from urllib.parse import urlsplit
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+class FixtureServer:
+    """Local HTTP server answering GET requests for registered pages, run in a background thread."""
+
+    def __init__(self, latency : float = 0.05):
+        self.latency = latency # seconds added to every response
+        self.pages = {} # local path -> (content type, body)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.bytes_served = 0
+        self.not_found = 0
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                time.sleep(server.latency)
+                page = server.pages.get(self.path)
+                if page is None:
+                    with server.lock:
+                        server.not_found += 1
+                    content_type, body, status = "text/plain", b"not found", 404
+                else:
+                    (content_type, body), status = page, 200
+                with server.lock:
+                    server.requests += 1
+                    server.bytes_served += len(body)
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}"
+
+    # gets the local path of a url: /<host>/<path>?<query>
+    def local_path(self, url : str) -> str:
+        parts = urlsplit(url)
+        return f"/{parts.netloc}{parts.path or '/'}" + (f"?{parts.query}" if parts.query != "" else "")
+
+    # gets the url a request for a page of a real website is sent to instead
+    def local_url(self, url : str) -> str:
+        return self.url + self.local_path(url)
+
+    # registers the content of a page by its url on the real website
+    def add(self, url : str, content : str, content_type : str = "text/html; charset=utf-8") -> None:
+        self.pages[self.local_path(url)] = (content_type, content.encode("utf-8"))
+
+    def start(self) -> "FixtureServer":
+        threading.Thread(target = self.httpd.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,105 @@
+"""Builds saved-page stand-ins for the ten article sources, used by the benchmarks so they run without the network.
+Each page has the parts of a real news page that make parsing slow (a long head with scripts and styles, navigation,
+sidebars of related links, and a footer) around the body container the scraper looks for, holding about 20 paragraphs
+of chinese text with inline links and emphasis. Pages are built from a fixed seed, so every run parses the same HTML.
+RSS feeds and PTT Stock Board index pages are also built here for the end-to-end benchmark.
+"""
+
+import random
+
+# source name -> opening and closing tags of its body container
+body_containers : dict[str, tuple[str, str]] = {
+    "鉅亨網 (Anue)" : ('<div id="article-container" class="news-content">', "</div>"),
+    "MoneyDJ 理財網" : ('<article class="article-body">', "</article>"),
+    "Yahoo 奇摩股市" : ('<article data-test-locator="story">', "</article>"),
+    "經濟新聞網" : ('<article class="article-content">', "</article>"),
+    "商業週刊" : ('<article class="Single-article">', "</article>"),
+    "TechOrange 科技報橘" : ('<article class="post type-post">', "</article>"),
+    "Inside (科技媒體)" : ('<div id="article_content" class="post_content">', "</div>"),
+    "中央社財經 (CNA)" : ('<div class="paragraph centralContent">', "</div>"),
+    "工商時報" : ('<article class="news-article">', "</article>")
+}
+sources : list[str] = list(body_containers) + ["PTT Stock Board"]
+
+# gets a run of random chinese characters
+def chinese_text(rng : random.Random, length : int) -> str:
+    return "".join(chr(rng.randint(0x4E00, 0x9FA5)) for _ in range(length))
+
+# gets the head, navigation, and sidebar shared by every news page
+def page_chrome(rng : random.Random) -> tuple[str, str]:
+    head = ["<head><meta charset=\"utf-8\"><title>新聞</title>"]
+    for i in range(40):
+        head.append(f'<meta name="meta-{i}" content="{chinese_text(rng, 20)}">')
+    for i in range(15):
+        head.append(f"<script>window.config{i} = {{\"id\": {i}, \"items\": [{', '.join(str(rng.randint(0, 9999)) for _ in range(200))}]}};</script>")
+    head.append("<style>" + " ".join(f".c{i} {{ margin: {i}px; color: #{rng.randint(0, 0xFFFFFF):06x}; }}" for i in range(400)) + "</style></head>")
+
+    navigation = ['<header><nav class="menu"><ul>']
+    for i in range(150):
+        navigation.append(f'<li class="menu-item"><a href="/category/{i}">{chinese_text(rng, 4)}</a></li>')
+    navigation.append("</ul></nav></header>")
+
+    sidebar = ['<aside class="sidebar">']
+    for block in range(6):
+        sidebar.append(f'<section class="related"><h3>{chinese_text(rng, 6)}</h3><ul>')
+        for i in range(25):
+            sidebar.append(f'<li><a href="/news/{block}/{i}"><img src="/img/{i}.jpg" alt=""><span>{chinese_text(rng, 18)}</span></a><p class="summary">{chinese_text(rng, 40)}</p></li>')
+        sidebar.append("</ul></section>")
+    sidebar.append('</aside><footer class="footer">' + "".join(f'<a href="/about/{i}">{chinese_text(rng, 4)}</a>' for i in range(60)) + "</footer>")
+    return "".join(head) + "".join(navigation), "".join(sidebar)
+
+# gets the paragraphs of an article body
+def body_paragraphs(rng : random.Random) -> str:
+    paragraphs = []
+    for _ in range(20):
+        paragraph = chinese_text(rng, rng.randint(40, 120)) + "。"
+        paragraph += f'<a href="/tag/{rng.randint(0, 99)}">{chinese_text(rng, 3)}</a>{chinese_text(rng, 30)}<strong>{chinese_text(rng, 8)}</strong>。'
+        paragraphs.append(f"<p>{paragraph}</p>")
+    return "\n".join(paragraphs)
+
+# gets a PTT Stock Board post with metalines, the body as bare text, and comments
+def PTT_post(rng : random.Random) -> str:
+    metalines = "".join(
+        f'<div class="article-metaline"><span class="article-meta-tag">{tag}</span><span class="article-meta-value">{value}</span></div>'
+        for tag, value in [("作者", "user (使用者)"), ("標題", f"[新聞] {chinese_text(rng, 12)}"), ("時間", "Mon Oct 13 10:00:00 2025")]
+    )
+    body = "\n".join(chinese_text(rng, rng.randint(20, 60)) for _ in range(40))
+    pushes = "".join(
+        f'<div class="push"><span class="push-tag">推 </span><span class="push-userid">user{i}</span><span class="push-content">: {chinese_text(rng, 20)}</span><span class="push-ipdatetime"> 10/13 10:{i % 60:02d}</span></div>'
+        for i in range(150)
+    )
+    return (f'<html><head><meta charset="utf-8"><title>PTT</title></head><body><div id="topbar-container"></div>'
+            f'<div id="main-container"><div id="main-content" class="bbs-screen bbs-content">{metalines}\n{body}\n'
+            f'<span class="f2">※ 發信站: 批踢踢實業坊(ptt.cc)</span>\n{pushes}</div></div></body></html>')
+
+# builds the page of an article from a source
+def build_fixture(source : str, seed : int = 0) -> str:
+    rng = random.Random(f"{source}-{seed}")
+    if source == "PTT Stock Board":
+        return PTT_post(rng)
+    top, bottom = page_chrome(rng)
+    opening, closing = body_containers[source]
+    return f"<!DOCTYPE html><html>{top}<body><main>{opening}<h1>{chinese_text(rng, 15)}</h1>{body_paragraphs(rng)}{closing}</main>{bottom}</body></html>"
+
+# gets the title of an article, starting with a stock name unless has_keyword is False
+def article_title(rng : random.Random, has_keyword : bool = True) -> str:
+    return ("台積電" if has_keyword else "") + chinese_text(rng, 12)
+
+# builds an RSS 2.0 feed of (title, link, published time string) entries
+def build_feed(name : str, entries : list[tuple[str, str, str]]) -> str:
+    items = "".join(
+        f"<item><title>{title}</title><link>{link}</link><pubDate>{published}</pubDate><description>{title}</description></item>"
+        for title, link, published in entries
+    )
+    return f'<?xml version="1.0" encoding="UTF-8"?><rss version="2.0"><channel><title>{name}</title>{items}</channel></rss>'
+
+# builds a PTT Stock Board index page listing (link path, title) posts oldest first, with a 上頁 button to previous_page
+def build_PTT_index(posts : list[tuple[str, str]], previous_page : str = None) -> str:
+    button = f'<a class="btn wide" href="{previous_page}">‹ 上頁</a>' if previous_page is not None else '<a class="btn wide disabled">‹ 上頁</a>'
+    entries = "".join(
+        f'<div class="r-ent"><div class="nrec"></div><div class="title"><a href="{path}">{title}</a></div><div class="meta"><div class="author">user</div></div></div>'
+        for path, title in posts
+    )
+    return (f'<html><head><meta charset="utf-8"><title>看板 Stock</title></head><body><div id="action-bar-container">'
+            f'<div class="btn-group btn-group-paging"><a class="btn wide" href="/bbs/Stock/index1.html">最舊</a>{button}</div></div>'
+            f'<div class="r-list-container action-bar-margin bbs-screen">{entries}</div></body></html>')
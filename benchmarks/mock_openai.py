@@ -0,0 +1,232 @@
+"""A local stand-in for the OpenAI API used by the benchmarks. It answers chat completions with a fixed JSON result after
+a configurable delay and reports token usage, counting each CJK character as one token and every 4 other characters as
+one token. Totals of requests and tokens are kept so benchmarks can compare runs. It can also act like a rate limited
+endpoint: requests past a max number running at once, and a random share of all requests, get a 429 response with a
+Retry-After header, and a random share of responses are slow. Batch jobs are supported through the files and batches
+endpoints: an uploaded JSONL request file is processed in a background thread after batch_delay seconds, and its
+results are written to an output file.
+"""
+
+from email.parser import BytesParser
+from email import policy
+import json
+import random
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from parsing.prompt_builder import count_tokens
+
+# result with every field of the sentiment, confidence, entity, and consolidated prompts
+mock_result : dict = {
+    "tone" : "neutral",
+    "topic" : "semiconductor",
+    "event_type" : "earnings",
+    "confidence" : 0.5,
+    "summary" : "台積電營收符合預期。",
+    "evidence" : "台積電公布上月營收。",
+    "answers" : ["Yes", "Yes", "No", "Yes", "No", "Yes", "No", "No", "Yes", "No"],
+    "yes_answers" : 5,
+    "confidence_score" : 0.5,
+    "entities" : ["台積電", "Fed"]
+}
+
+# gets the text of every message of a chat completion request
+def prompt_text(request : dict) -> str:
+    return "".join(message["content"] for message in request.get("messages", []))
+
+class MockOpenAIServer:
+    """Local HTTP server answering POST /v1/chat/completions, run in a background thread."""
+
+    def __init__(self, latency : float = 0.05, latency_per_token : float = 0.0, capacity : int = None, rate_limit_rate : float = 0.0,
+                 retry_after : float = 1.0, slow_rate : float = 0.0, slow_latency : float = 5.0, batch_delay : float = 0.5, seed : int = 0):
+        self.latency = latency # seconds added to every response
+        self.latency_per_token = latency_per_token # seconds added for every prompt token
+        self.capacity = capacity # requests past this many running at once get a 429 response, None for no limit
+        self.rate_limit_rate = rate_limit_rate # share of requests that get a 429 response at random
+        self.retry_after = retry_after # seconds in the Retry-After header of 429 responses
+        self.slow_rate = slow_rate # share of requests that take slow_latency seconds instead of latency
+        self.slow_latency = slow_latency
+        self.batch_delay = batch_delay # seconds before a batch is processed
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.files = {} # file id -> file content
+        self.batches = {} # batch id -> batch object
+        self.reset()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.path.startswith("/v1/files"):
+                    self.respond(*server.upload_file(self.headers.get("Content-Type", ""), body))
+                elif self.path.startswith("/v1/batches"):
+                    self.respond(*server.create_batch(json.loads(body or b"{}")))
+                else:
+                    self.respond(*server.handle(self.path, json.loads(body or b"{}")))
+
+            def do_GET(self):
+                parts = self.path.split("?")[0].strip("/").split("/")
+                if parts[1:2] == ["batches"] and len(parts) == 3:
+                    self.respond(*server.get_batch(parts[2]))
+                elif parts[1:2] == ["files"] and len(parts) == 4 and parts[3] == "content":
+                    self.respond(*server.get_file_content(parts[2]))
+                else:
+                    self.respond(404, {"error" : {"message" : "Not found"}}, {})
+
+            # sends a JSON response, or the raw bytes of a file
+            def respond(self, status : int, response, headers : dict) -> None:
+                if isinstance(response, bytes):
+                    data = response
+                    content_type = "application/octet-stream"
+                else:
+                    data = json.dumps(response).encode("utf-8")
+                    content_type = "application/json"
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.httpd.server_port}/v1"
+
+    # clears the request and token totals
+    def reset(self) -> None:
+        with self.lock:
+            self.requests = 0
+            self.in_flight = 0
+            self.peak_in_flight = 0
+            self.rate_limited = 0
+            self.batch_requests = 0 # requests answered as part of a batch, also counted in requests
+            self.prompt_tokens = 0
+            self.completion_tokens = 0
+
+    # answers one chat completion request, returning (status code, response body, extra headers)
+    def handle(self, path : str, request : dict) -> tuple[int, dict, dict]:
+        with self.lock:
+            over_capacity = self.capacity is not None and self.in_flight >= self.capacity
+            if over_capacity or self.rng.random() < self.rate_limit_rate:
+                self.rate_limited += 1
+                error = {"error" : {"message" : "Rate limit reached", "type" : "requests", "code" : "rate_limit_exceeded"}}
+                return 429, error, {"Retry-After" : str(self.retry_after)}
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+            slow = self.rng.random() < self.slow_rate
+
+        time.sleep((self.slow_latency if slow else self.latency) + self.latency_per_token * count_tokens(prompt_text(request)))
+        with self.lock:
+            self.in_flight -= 1
+        return 200, self.complete(request), {}
+
+    # builds the response to a chat completion request and adds it to the totals
+    def complete(self, request : dict) -> dict:
+        prompt_tokens = count_tokens(prompt_text(request))
+        content = json.dumps(mock_result, ensure_ascii = False)
+        completion_tokens = count_tokens(content)
+        with self.lock:
+            self.requests += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            request_number = self.requests
+        return {
+            "id" : f"chatcmpl-{request_number}",
+            "object" : "chat.completion",
+            "created" : int(time.time()),
+            "model" : request.get("model"),
+            "choices" : [{"index" : 0, "message" : {"role" : "assistant", "content" : content}, "finish_reason" : "stop"}],
+            "usage" : {"prompt_tokens" : prompt_tokens, "completion_tokens" : completion_tokens, "total_tokens" : prompt_tokens + completion_tokens}
+        }
+
+    # stores the file of a multipart upload, returning (status code, file object, extra headers)
+    def upload_file(self, content_type : str, body : bytes) -> tuple[int, dict, dict]:
+        message = BytesParser(policy = policy.default).parsebytes(f"Content-Type: {content_type}\r\n\r\n".encode("utf-8") + body)
+        fields = {part.get_param("name", header = "content-disposition") : part for part in message.iter_parts()}
+        content = fields["file"].get_payload(decode = True)
+        purpose = fields["purpose"].get_content().strip() if "purpose" in fields else "batch"
+        file = self.add_file(content, fields["file"].get_filename() or "upload.jsonl", purpose)
+        return 200, file, {}
+
+    # stores a file, returning its file object
+    def add_file(self, content : bytes, filename : str, purpose : str) -> dict:
+        with self.lock:
+            file_id = f"file-{len(self.files) + 1}"
+            self.files[file_id] = content
+        return {"id" : file_id, "object" : "file", "bytes" : len(content), "created_at" : int(time.time()), "filename" : filename, "purpose" : purpose, "status" : "processed"}
+
+    def get_file_content(self, file_id : str) -> tuple[int, bytes, dict]:
+        if file_id not in self.files:
+            return 404, {"error" : {"message" : f"No file {file_id}"}}, {}
+        return 200, self.files[file_id], {}
+
+    # creates a batch for an uploaded request file and starts processing it in the background
+    def create_batch(self, request : dict) -> tuple[int, dict, dict]:
+        if request.get("input_file_id") not in self.files:
+            return 400, {"error" : {"message" : "Invalid input_file_id"}}, {}
+        with self.lock:
+            batch_id = f"batch_{len(self.batches) + 1}"
+            batch = {
+                "id" : batch_id,
+                "object" : "batch",
+                "endpoint" : request.get("endpoint"),
+                "completion_window" : request.get("completion_window"),
+                "input_file_id" : request["input_file_id"],
+                "created_at" : int(time.time()),
+                "status" : "validating",
+                "output_file_id" : None,
+                "error_file_id" : None,
+                "request_counts" : {"total" : 0, "completed" : 0, "failed" : 0}
+            }
+            self.batches[batch_id] = batch
+        threading.Thread(target = self.process_batch, args = (batch_id,), daemon = True).start()
+        return 200, dict(batch), {}
+
+    def get_batch(self, batch_id : str) -> tuple[int, dict, dict]:
+        if batch_id not in self.batches:
+            return 404, {"error" : {"message" : f"No batch {batch_id}"}}, {}
+        with self.lock:
+            return 200, dict(self.batches[batch_id]), {}
+
+    # answers every request of a batch's input file and writes the results to its output file
+    def process_batch(self, batch_id : str) -> None:
+        batch = self.batches[batch_id]
+        lines = [line for line in self.files[batch["input_file_id"]].decode("utf-8").splitlines() if line.strip() != ""]
+        with self.lock:
+            batch["status"] = "in_progress"
+            batch["request_counts"]["total"] = len(lines)
+        time.sleep(self.batch_delay)
+
+        output = []
+        for line in lines:
+            request = json.loads(line)
+            response = self.complete(request["body"])
+            output.append(json.dumps({
+                "id" : f"batch_req_{len(output) + 1}",
+                "custom_id" : request["custom_id"],
+                "response" : {"status_code" : 200, "request_id" : response["id"], "body" : response},
+                "error" : None
+            }, ensure_ascii = False))
+        output_file = self.add_file(("\n".join(output) + "\n").encode("utf-8"), f"{batch_id}_output.jsonl", "batch_output")
+        with self.lock:
+            self.batch_requests += len(lines)
+            batch["request_counts"]["completed"] = len(lines)
+            batch["output_file_id"] = output_file["id"]
+            batch["status"] = "completed"
+
+    def start(self) -> "MockOpenAIServer":
+        threading.Thread(target = self.httpd.serve_forever, daemon = True).start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
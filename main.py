@@ -3,18 +3,29 @@ Data is obtained primarily through RSS parsing, and then web scraping with HTML.
 to MongoDB. 
 """
 
-import feedparser # for RSS parsing
 from pymongo import MongoClient # for uploading data to MongoDB
 import schedule # for scheduling fetches 3 times daily
-import pytz # for timezones
-from datetime import datetime
 import time # to sleep the program when not running
-import csv # for parsing the keyword filter set
 from parsing import html_scraper # getting module for the HTML scraper for the PTT stock board
+from parsing import extraction # getting module for extracting the body text of articles
 from parsing import sentiment_analysis # getting module for OpenAI analysis
 from parsing import deduplication # getting module for deduplication
+from parsing import keyword_matcher # getting module for keyword matching
+from parsing import http_client # getting module for the shared HTTP session
+from parsing import feed_state # getting module for conditional RSS downloads
+from parsing import llm_cache # getting module for the OpenAI response cache
+from parsing import minhash_index # getting module for the MinHash/LSH index used by the pipeline
+from parsing import pipeline # getting module for running deduplication and analysis while scraping
+from parsing import sources # getting module for the registry of news sources
+from parsing import metrics # getting module for the metrics of each run
+from parsing import profiling # getting module for the optional profiling of runs
+import sys # for the --profile flag
 import os # for my environmental variables, not ultimately needed
 import logging
+import threading # for limiting concurrent requests to the same website
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future # for fetching RSS feeds and article bodies concurrently
+from urllib.parse import urlparse
 
 logging.basicConfig(
     filename = "main.log",
@@ -26,87 +37,147 @@ logging.basicConfig(
 connection_string : str = os.getenv("MONGODB_CONNECTION_STRING")  # replace with wanted connection string
 database_name : str = "news_info" # replace with wanted database name
 
-# list of urls and source for higher quality websites. The indexes of url and source correspond
-high_priority_url_list : list[str] = ["https://news.cnyes.com/rss/v1/news/category/tw_stock", "https://www.moneydj.com/kmdj/RssCenter.aspx?svc=NW&fno=1&arg=X0000000", "https://tw.stock.yahoo.com/rss?category=tw-market", "https://news.cnyes.com/rss/v1/news/category/all", "https://udn.com/news/rssfeed/6645"]
-high_priority_source_list : list[str] = ["鉅亨網 (Anue)", "MoneyDJ 理財網", "Yahoo 奇摩股市", "鉅亨網 (Anue)", "經濟新聞網"]
-
-# list of urls and source for lower quality websites. The indexes of url and source correspond
-lower_priority_url_list : list[str] = ["https://cmsapi.businessweekly.com.tw/?CategoryId=efd99109-9e15-422e-97f0-078b21322450&TemplateId=8E19CF43-50E5-4093-B72D-70A912962D55", "https://techorange.com/feed/", "https://www.inside.com.tw/feed/rss", "https://feeds.feedburner.com/rsscna/finance", "https://www.ctee.com.tw/rss_web/livenews/ctee"]
-lower_priority_source_list : list[str] = ["商業週刊", "TechOrange 科技報橘", "Inside (科技媒體)", "中央社財經 (CNA)", "工商時報"]
+# feeds of higher quality websites and of lower quality websites, in the order they are fetched (see data/sources.csv)
+high_priority_sources : list[sources.Source] = sources.feeds_by_priority("high")
+lower_priority_sources : list[sources.Source] = sources.feeds_by_priority("lower")
 
 counter : int = 0 # counts the number of articles fetched
 
-# gets the body text of a given article, using the website title to match it with the proper html search format
-def get_body_text(article_link : str, rss_entry, title : str) -> str:
-    match title:
-        case "Yahoo 奇摩股市" | "商業週刊" | "MoneyDJ 理財網" | "TechOrange 科技報橘" | "工商時報" | "經濟新聞網":
-            text = html_scraper.find_text_by_name(article_link, "article")
-            if text is None:
-                text = rss_entry.get("description", None)
-                logging.error(f"No body text found for {title} article, RSS desc used. Link: {article_link}")
-
-        case "鉅亨網 (Anue)":
-            text = html_scraper.find_text_by_id(article_link, "article-container")
-            if text is None:
-                text = rss_entry.get("description", None)
-                logging.error(f"No body text found for {title} article, RSS desc used. Link: {article_link}")
-        
-        case "Inside (科技媒體)":
-            text = html_scraper.find_text_by_id(article_link, "article_content")
-            if text is None:
-                text = rss_entry.get("description", None)
-                logging.error(f"No body text found for {title} article, RSS desc used. Link: {article_link}")
-
-        case "中央社財經 (CNA)":
-            text = html_scraper.find_text_by_class(article_link, "centralContent")
-            if text is None:
-                text = rss_entry.get("description", None)
-                logging.error(f"No body text found for {title} article, RSS desc used. Link: {article_link}")
+pipelined : bool = True # deduplicates and analyzes each article while scraping, instead of after every article is scraped
+
+max_body_fetches : int = 8 # max number of article bodies fetched at once
+max_body_fetches_per_host : int = 4 # max number of article bodies fetched at once from the same website
+host_semaphores : dict[str, threading.BoundedSemaphore] = {} # limits concurrent requests to each website
+host_semaphores_lock = threading.Lock()
+
+metrics_port : int = 9108 # port of the local /metrics endpoint, None to turn it off
+metrics_directory : str = "metrics" # folder the JSON summary of each run's metrics is written to
+feeds = metrics.counter("news_agent_feeds_total", "RSS feed downloads by feed url and status (304 if unchanged since the last run)", ["feed", "status"])
+
+# gets the body text of a given article, using the extractor of its source
+def get_body_text(article_link : str, rss_entry, source : sources.Source) -> str:
+    text = extraction.fetch_body_text(article_link, source.extractor)
+    if text is None:
+        text = rss_entry.get("description", None)
+        logging.error(f"No body text found for {source.name} article, RSS desc used. Link: {article_link}")
     
     return text
 
-# converts a timestamp string to a datetime object and standardizes it to UTC+8 timezone
-def get_datetime(title, timestamp : str) -> datetime:
-    format = "" 
-    # get timestamp format depending on which website
-    match title:
-        case "鉅亨網 (Anue)" | "MoneyDJ 理財網" | "商業週刊" | "中央社財經 (CNA)" | "經濟新聞網":
-            format = f"%a, %d %b %Y %H:%M:%S %z"
-        case "Yahoo 奇摩股市" | "TechOrange 科技報橘":
-            format = f"%a, %d %b %Y %H:%M:%S %Z"
-        case "Inside (科技媒體)":
-            format = f"%Y-%m-%dT%H:%M:%S%z"
-        case "工商時報":
-            format = f"%Y-%m-%dT%H:%M:%S"
-    
-    # converts the timestamp string to a datetime object
+# gets the lock limiting how many article bodies are fetched at once from the host of a link
+def get_host_semaphore(article_link : str) -> threading.BoundedSemaphore:
+    host = urlparse(article_link).netloc
+    with host_semaphores_lock:
+        if host not in host_semaphores:
+            host_semaphores[host] = threading.BoundedSemaphore(max_body_fetches_per_host)
+        return host_semaphores[host]
+
+# gets the body text of an article while respecting the per-host concurrency limit
+def fetch_body_text(article_link : str, rss_entry, source : sources.Source) -> str:
+    with get_host_semaphore(article_link):
+        return get_body_text(article_link, rss_entry, source)
+
+# fetches the body text of each article concurrently, yielding (article, body text) in the same order as the articles
+# bodies are only requested a few at a time ahead of the consumer, so few extra pages are downloaded once the limit is reached
+def fetch_body_texts(articles : list, source : sources.Source):
+    fetch_task = profiling.stage_task(fetch_body_text) # profiled as part of the calling stage when profiling is on
+    with ThreadPoolExecutor(max_workers = max_body_fetches) as executor:
+        pending = deque()
+        article_iter = iter(articles)
+        try:
+            while True:
+                # keeps up to max_body_fetches requests running ahead of the article being processed
+                while len(pending) < max_body_fetches:
+                    article = next(article_iter, None)
+                    if article is None:
+                        break
+                    pending.append((article, executor.submit(fetch_task, article[1], article[0], source)))
+                if len(pending) == 0:
+                    break
+                article, future = pending.popleft()
+                yield article, future.result()
+        finally:
+            # cancels requests that have not started if the caller stops early
+            for article, future in pending:
+                future.cancel()
+
+# downloads and parses the RSS feed of a url, keeping only the entries that are new since the last run
+def parse_feed(state_collection, url : str):
+    start = time.perf_counter()
     try:
-        datetime_object = datetime.strptime(timestamp, format)
+        news_feed = feed_state.fetch_feed(state_collection, url)
     except Exception as e:
-        logging.error(f"Error converting {title} article to datetime object: {e}")
-        return None
-
-    # changes the datetime object to UTC+8 timezone if not already in UTC+8
-    tw_timezone = pytz.timezone("Etc/GMT-8")
-    if datetime_object.tzinfo is None:
-        converted_dt = tw_timezone.localize(datetime_object)
-        return converted_dt
-    else:
-        if datetime_object.tzinfo == tw_timezone:
-            return datetime_object
-        else:
-            converted_dt = datetime_object.astimezone(tw_timezone)
-            return converted_dt
-    
-
-
-# fetches articles from one source
-def fetch(collection, url : str, title : str, start_index : int, keywords : set) -> None:
+        logging.error(f"Error parsing RSS feed. Link: {url}. Error msg: {e}")
+        news_feed = feed_state.empty_feed(url, None)
+    end = time.perf_counter()
+    logging.info(f"Time taken to parse RSS feed {url}: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "parse_feed")
+    feeds.inc(feed = url, status = news_feed.status if news_feed.status is not None else "error")
+    return news_feed
+
+# starts downloading and parsing every RSS feed at the same time, returning a future for each feed in the order of the urls
+def parse_feeds(executor : ThreadPoolExecutor, state_collection, urls : list[str]) -> list[Future]:
+    return [executor.submit(parse_feed, state_collection, url) for url in urls]
+
+# fetches the articles of a parsed feed and saves the feed's state if every entry was checked before the 350 limit
+def fetch_and_save_state(collection, state_collection, NewsFeed, title : str, start_index : int, matcher : keyword_matcher.KeywordMatcher,
+                         article_pipeline : pipeline.ArticlePipeline = None) -> None:
+    if fetch(collection, NewsFeed, title, start_index, matcher, article_pipeline):
+        feed_state.save_state(state_collection, NewsFeed)
+
+# finds which of the values are already stored in a field of the collection, using one query on the field's index
+def find_existing(collection, field : str, values : list) -> set:
+    values = list({value for value in values if value is not None})
+    if len(values) == 0:
+        return set()
+    documents = collection.find({field : {"$in" : values}}, {field : 1, "_id" : 0})
+    return {doc[field] for doc in documents}
+
+# gets the number of articles fetched in this run, leaving out the ones the pipeline dropped instead of storing
+def fetched_articles(article_pipeline : pipeline.ArticlePipeline = None) -> int:
+    if article_pipeline is None:
+        return counter
+    return counter - article_pipeline.dropped
+
+# checks whether the 350 article limit is reached
+# with the pipeline, articles still waiting for deduplication may be dropped, so it waits for them before deciding
+def limit_reached(article_pipeline : pipeline.ArticlePipeline = None) -> bool:
+    if fetched_articles(article_pipeline) < 350:
+        return False
+    if article_pipeline is not None:
+        article_pipeline.wait_for_deduplication()
+    return fetched_articles(article_pipeline) >= 350
+
+# fetches articles from one source, using its parsed RSS feed
+# if article_pipeline is given, each article is submitted to it as soon as it is fetched instead of being inserted at the end
+# returns whether every entry was checked, which is False if the 350 limit was reached first
+@profiling.profile_stage("fetch")
+def fetch(collection, NewsFeed, title : str, start_index : int, matcher : keyword_matcher.KeywordMatcher, article_pipeline : pipeline.ArticlePipeline = None) -> bool:
     start = time.perf_counter()
     global counter # counts the number of articles fetched
     id = start_index + counter
-    NewsFeed = feedparser.parse(url) # parses the RSS of the url
     docs_to_save = [] # holds the documents to be uploaded
+    num_fetched = 0
+    articles = [] # holds (entry, link, title, timestamp) of the articles that need their body text fetched
+
+    completed = True # whether every entry was checked
+
+    # stops fetching data from articles if the 350 limit is reached
+    if limit_reached(article_pipeline):
+        return False
+
+    # finds the extractor and timestamp parser of the source
+    source = sources.get_source(title)
+    if source is None:
+        logging.error(f"Source {title} is not in the source registry, skipping feed.")
+        return True
+
+    # finds which links and titles in the feed already exist in the database, with one query for each field
+    existing_links = find_existing(collection, "url", [entry.get("link", None) for entry in NewsFeed.entries])
+    existing_titles = find_existing(collection, "title", [entry.get("title", None) for entry in NewsFeed.entries])
+    # articles submitted to the pipeline may not be stored yet, so they are skipped as well
+    if article_pipeline is not None:
+        existing_links |= article_pipeline.submitted_urls
+        existing_titles |= article_pipeline.submitted_titles
 
     # loops through each entry in the RSS feed
     for entry in NewsFeed.entries:
@@ -115,59 +186,63 @@ def fetch(collection, url : str, title : str, start_index : int, keywords : set)
         # logs an error and skips the article if the link cannot be found
         if article_link is None:
             logging.error(f"Link for current article not found, skipping article.")
+            metrics.articles.inc(source = title, outcome = "no_link")
             continue
         # skips the article if the link already exists in the database
-        if collection.find_one({"url" : article_link}) is not None:
+        if article_link in existing_links:
             logging.error(f"Link for current article already exists in database, skipping. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "existing_link")
             continue
 
         article_title = entry.get("title", None)
         # logs an error and skips the article if the title is not found in the RSS
         if article_title is None:
             logging.error(f"Article title not found. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "no_title")
             continue
         # skips the article if the title already exists in the database
-        if collection.find_one({"title" : article_title}) is not None:
+        if article_title in existing_titles:
             logging.error(f"Title for current article already exists in database, skipping. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "existing_title")
             continue
 
         timestamp_string = entry.get("published", None)
         # logs an error and skips the article if the article timestamp is not found
         if timestamp_string is None:
             logging.error(f"Article does not have timestamp. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "no_timestamp")
             continue
         else:
             # converts to datetime object with UTC+8 timezone
-            article_timestamp = get_datetime(title, timestamp_string)
-            # skips the article if converting to datetime object failed (error logged by get_datetime function)
+            article_timestamp = source.parse_timestamp(timestamp_string)
+            # skips the article if converting to datetime object failed (error logged by parse_timestamp)
             if article_timestamp is None:
+                metrics.articles.inc(source = title, outcome = "bad_timestamp")
                 continue
 
+        articles.append((entry, article_link, article_title, article_timestamp))
+
+    # parses html for each article's body text concurrently, handling the results in the order of the RSS feed
+    for (entry, article_link, article_title, article_timestamp), text in fetch_body_texts(articles, source):
+
         # stops fetching data from articles if the 350 limit is reached
-        if counter >= 350:
+        if limit_reached(article_pipeline):
+            completed = False
             break
 
-        # parses html for each article's body text case by case depending on the website
-        text = get_body_text(article_link, entry, title)
-
         # skips the article if body text could not be found
         if text is None:
             logging.error(f"No body text found for {title} article, article skipped. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "no_body")
             continue
 
-        article_keywords = []
-        
-        # loops through the keyword filter set
-        keyword_found = False
-        for keyword in keywords:
-            if keyword in article_title or keyword in text:
-                keyword_found = True
-                article_keywords.append(keyword)
-        
-        
+        # finds every keyword from the keyword filter set in the title and body text
+        article_keywords = list(matcher.match(article_title, text))
+
         # skips the article if no keywords are found
-        if keyword_found == False:
+        if len(article_keywords) == 0:
             logging.info(f"No keywords found, article skipped. Link: {article_link}")
+            metrics.articles.inc(source = title, outcome = "no_keywords")
             continue
         
         data = {
@@ -181,9 +256,14 @@ def fetch(collection, url : str, title : str, start_index : int, keywords : set)
         }
         print(data)
 
-        docs_to_save.append(data)
+        if article_pipeline is not None:
+            article_pipeline.submit(data)
+        else:
+            docs_to_save.append(data)
+        num_fetched += 1
         counter += 1
         id += 1
+        metrics.articles.inc(source = title, outcome = "fetched")
         print(article_title + " from " + title + " done")
 
     # stores the articles into the database
@@ -195,29 +275,21 @@ def fetch(collection, url : str, title : str, start_index : int, keywords : set)
     
     end = time.perf_counter()
     total_time = end - start
-    logging.info(f"Time taken to fetch {len(docs_to_save)} from {title}: {total_time}")
+    logging.info(f"Time taken to fetch {num_fetched} from {title}: {total_time}")
+    metrics.stage_seconds.observe(total_time, stage = "fetch")
+    metrics.source_seconds.observe(total_time, source = title)
+    return completed
 
 # fetches 350 articles
 def daily_fetch() -> None:
 
-    # creates a set of keywords
-    keywords = set()
-    keyword_file_path = os.path.join("data", "keyword_filter_set_zh.csv")
-    with open(keyword_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            keywords.add(row["Keyword"])
-    
-    # creates a set of stock names
-    stock_names = set()
-    stock_file_path = os.path.join("data", "TW_stock_list.csv")
-    with open(stock_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            stock_names.add(row["Cleaned company names"])
-    
-    # adds stock names to the list of keywords searched
-    keywords.update(stock_names)
+    # only the metrics recorded from here on are written to this run's summary
+    metrics.start_run()
+    # profiles the stages of the run if profiling is on
+    profiling.start_run()
+
+    # builds the keyword matcher from the keyword filter set and the stock names
+    matcher = keyword_matcher.load_matcher()
 
     start = time.perf_counter()
 
@@ -236,36 +308,11 @@ def daily_fetch() -> None:
     except Exception as e:
         print(f"Error creating collection: {e}")
     article_collection = database["article_info"]
+    state_collection = database[feed_state.collection_name] # holds the ETag and newest entry time of each RSS feed
 
-    # finds the index of the next document that will be added (to avoid repetitive parsing of articles from previous fetches)
-    start_index = article_collection.count_documents({})
-    print(f"start index: {start_index}")
-
-    # fetches articles from high priority websites w/ the 350 article limit
-    index : int = 0
-    while counter <= 350:
-        print("loop iterated")
-        # breaks out of the loop if every website has been visited
-        if index >= len(high_priority_url_list):
-            break
-        fetch(article_collection, high_priority_url_list[index], high_priority_source_list[index], start_index, keywords)
-        index += 1
-    
-    # fetches articles from lower priority websites w/ the 350 article limit
-    index : int = 0
-    while counter <= 350:
-        if index >= len(lower_priority_url_list):
-            break
-        fetch(article_collection, lower_priority_url_list[index], lower_priority_source_list[index], start_index, keywords)
-        index += 1
-    
-    # fetches the rest of the 350 articles from the PTT stock board
-    if counter < 350:
-        num = 350 - counter
-        html_scraper.PTT_fetch(article_collection, num, start_index + counter, keywords)
-
-    # runs deduplication logic using tfidf
-    deduplication.tfidf_comparison(article_collection, 1)
+    # creates the indexes used to check if an article already exists, unless they already exist
+    article_collection.create_index("url")
+    article_collection.create_index("title")
 
     # creates collections for sentiment info, entity match results, and confidence score details, unless they already exist
     try:
@@ -277,23 +324,100 @@ def daily_fetch() -> None:
     sentiment_collection = database["sentiment_info"]
     entity_collection = database["entity_match_results"]
     confidence_collection = database["confidence_score_details"]
+    analysis_collections = [sentiment_collection, entity_collection, confidence_collection]
 
-    # runs sentiment analysis logic
-    #sentiment_analysis.analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index)
-    sentiment_analysis.start_async(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index)
+    # creates the indexes used to renumber articles and their analysis results after deduplication
+    article_collection.create_index("id")
+    for analysis_collection in analysis_collections:
+        analysis_collection.create_index("id")
+
+    article_pipeline = None
+    if pipelined:
+        # adds articles stored since the MinHash index was last updated to it, removing any duplicates among them
+        index_collection = database[minhash_index.collection_name]
+        deduplication.minhash_comparison(article_collection, index_collection, pipeline.dedup_threshold, analysis_collections)
+
+    # finds the index of the next document that will be added (to avoid repetitive parsing of articles from previous fetches)
+    start_index = article_collection.count_documents({})
+    print(f"start index: {start_index}")
+
+    if pipelined:
+        # deduplicates, stores, and analyzes each article in the background as soon as it is scraped
+        article_pipeline = pipeline.ArticlePipeline(article_collection, sentiment_collection, entity_collection, confidence_collection, index_collection, start_index,
+                                                    cache_collection = database[llm_cache.collection_name]).start()
+
+    # downloads and parses every RSS feed at the same time, so the slowest feed does not hold up the others
+    with ThreadPoolExecutor(max_workers = len(high_priority_sources) + len(lower_priority_sources)) as feed_executor:
+        high_priority_feeds = parse_feeds(feed_executor, state_collection, [source.feed_url for source in high_priority_sources])
+        lower_priority_feeds = parse_feeds(feed_executor, state_collection, [source.feed_url for source in lower_priority_sources])
+
+        # fetches articles from high priority websites w/ the 350 article limit
+        # each feed is used in priority order as soon as it is parsed, so high priority websites still fill the limit first
+        index : int = 0
+        while not limit_reached(article_pipeline):
+            print("loop iterated")
+            # breaks out of the loop if every website has been visited
+            if index >= len(high_priority_sources):
+                break
+            fetch_and_save_state(article_collection, state_collection, high_priority_feeds[index].result(), high_priority_sources[index].name, start_index, matcher, article_pipeline)
+            index += 1
+        
+        # fetches articles from lower priority websites w/ the 350 article limit
+        index : int = 0
+        while not limit_reached(article_pipeline):
+            if index >= len(lower_priority_sources):
+                break
+            fetch_and_save_state(article_collection, state_collection, lower_priority_feeds[index].result(), lower_priority_sources[index].name, start_index, matcher, article_pipeline)
+            index += 1
+    
+    # fetches the rest of the 350 articles from the PTT stock board
+    if not limit_reached(article_pipeline):
+        num = 350 - fetched_articles(article_pipeline)
+        html_scraper.PTT_fetch(article_collection, num, start_index + counter, matcher, article_pipeline, state_collection)
+
+    if article_pipeline is not None:
+        # waits for the pipeline to finish analyzing the articles still in it
+        article_pipeline.close()
+    else:
+        # saves which articles were added in this run, since deduplication can renumber them
+        new_article_ids = [doc["_id"] for doc in article_collection.find({"id" : {"$gte" : start_index}}, {"_id" : 1})]
+
+        # runs deduplication logic using tfidf, keeping the ids of the analysis results linked to their articles
+        deduplication.tfidf_comparison(article_collection, 1, analysis_collections)
+
+        # finds where this run's remaining articles start, as deduplication may have removed articles from earlier runs
+        start_index = article_collection.count_documents({}) - article_collection.count_documents({"_id" : {"$in" : new_article_ids}})
+
+        # runs sentiment analysis logic
+        #sentiment_analysis.analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index)
+        sentiment_analysis.start_async(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index, cache_collection = database[llm_cache.collection_name])
 
     client.close() # closes MongoClient
+    http_client.close() # closes the pooled connections to the websites
 
     end = time.perf_counter()
     logging.info(f"total time taken: {end - start}")
-
-daily_fetch()
-# schedules the daily fetch for the three times each day, in Taiwan's time zone
-schedule.every().day.at("07:30", "Etc/GMT-8").do(daily_fetch)
-schedule.every().day.at("13:30", "Etc/GMT-8").do(daily_fetch)
-schedule.every().day.at("18:00", "Etc/GMT-8").do(daily_fetch)
-
-# pauses the program while waiting for the scheduled fetches
-while True:
-    schedule.run_pending()
-    time.sleep(1)
\ No newline at end of file
+    metrics.stage_seconds.observe(end - start, stage = "daily_fetch")
+    metrics.write_run_summary(metrics_directory)
+    profiling.finish_run()
+
+if __name__ == "__main__":
+    # with --profile, runs once with profiling on and exits instead of scheduling runs
+    if "--profile" in sys.argv:
+        profiling.enable()
+        daily_fetch()
+        sys.exit()
+
+    # serves the metrics of every run at http://127.0.0.1:<metrics_port>/metrics, if the port is free
+    if metrics_port is not None:
+        metrics.start_server(metrics_port)
+    daily_fetch()
+    # schedules the daily fetch for the three times each day, in Taiwan's time zone
+    schedule.every().day.at("07:30", "Etc/GMT-8").do(daily_fetch)
+    schedule.every().day.at("13:30", "Etc/GMT-8").do(daily_fetch)
+    schedule.every().day.at("18:00", "Etc/GMT-8").do(daily_fetch)
+
+    # pauses the program while waiting for the scheduled fetches
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
\ No newline at end of file
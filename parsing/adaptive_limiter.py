@@ -0,0 +1,71 @@
+"""This program contains the adaptive concurrency limit used for OpenAI requests. The limit grows by about one request for
+every round of successful requests and is cut in half when OpenAI responds with a rate limit error or times out (additive
+increase, multiplicative decrease), so the endpoint is kept busy without causing bursts of rate limit errors. A Retry-After
+header pauses all new requests until it has passed.
+"""
+
+import asyncio
+import time
+
+class AdaptiveLimiter:
+    """Async concurrency limit with additive increase on success and multiplicative decrease on overload."""
+
+    def __init__(self, initial_limit : int = 10, min_limit : int = 1, max_limit : int = 64, decrease_factor : float = 0.5, decrease_cooldown : float = 1.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.decrease_cooldown = decrease_cooldown # seconds after a decrease in which more overloads do not decrease the limit again
+        self.in_flight = 0
+        self.paused_until = 0.0 # time.monotonic() before which no new requests start
+        self.last_decrease = 0.0
+        self.condition = asyncio.Condition()
+        self.successes = 0
+        self.overloads = 0
+        self.peak_limit = self.limit
+
+    # number of requests allowed to run at once
+    def current_limit(self) -> int:
+        return max(self.min_limit, int(self.limit))
+
+    # waits until the limit allows another request and no pause is in effect, then counts the request as running
+    async def acquire(self) -> None:
+        while True:
+            delay = self.paused_until - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            async with self.condition:
+                await self.condition.wait_for(lambda: self.in_flight < self.current_limit())
+                # a request that finished while waiting may have started a new pause
+                if self.paused_until <= time.monotonic():
+                    self.in_flight += 1
+                    return
+
+    async def release(self) -> None:
+        async with self.condition:
+            self.in_flight -= 1
+            self.condition.notify_all()
+
+    async def __aenter__(self) -> "AdaptiveLimiter":
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, traceback) -> None:
+        await self.release()
+
+    # raises the limit by 1 / limit, which adds about one request for every full round of successful requests
+    def record_success(self) -> None:
+        self.successes += 1
+        self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+        self.peak_limit = max(self.peak_limit, self.limit)
+
+    # lowers the limit after a rate limit error or timeout, and pauses new requests for retry_after seconds if given
+    def record_overload(self, retry_after : float = None) -> None:
+        self.overloads += 1
+        now = time.monotonic()
+        if retry_after is not None:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        # one burst of errors from requests that were already running only lowers the limit once
+        if now - self.last_decrease >= self.decrease_cooldown:
+            self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+            self.last_decrease = now
@@ -0,0 +1,181 @@
+"""This program contains an approximate nearest-neighbor index for article embeddings, built with NumPy only. It is an
+inverted file (IVF) index: the embeddings are clustered with k-means, each embedding is stored in the list of its nearest
+cluster, and a query is only compared to the embeddings in the clusters closest to it. The number of clusters searched
+(nprobe) is a fixed share of the clusters, so recall stays about the same as the index grows and is retrained. Embeddings
+can be added one at a time, and the index can be saved to and loaded from disk.
+"""
+
+import numpy as np
+import logging
+import os
+
+logging.basicConfig(
+    filename = "deduplication.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+min_train_size : int = 1024 # below this many embeddings every query is compared to every embedding
+retrain_growth : float = 2.0 # the clusters are retrained when the index grows by this factor since the last training
+kmeans_iterations : int = 10
+# share of the clusters searched for each query, picked with benchmarks/bench_ann_index.py for a recall@10 above 0.9 on
+# clustered data at a fraction of the time of brute force, while a near duplicate of a stored article is always found
+default_probe_fraction : float = 0.1
+min_nprobe : int = 8 # least number of clusters searched for each query
+
+# normalizes vectors so dot products are cosine similarities
+def normalize_rows(vectors : np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype = np.float32)
+    norms = np.linalg.norm(vectors, axis = 1, keepdims = True)
+    norms[norms == 0] = 1
+    return vectors / norms
+
+class IVFIndex:
+    """Inverted file index over normalized float32 vectors, searched by cosine similarity."""
+
+    def __init__(self, dimension : int, probe_fraction : float = default_probe_fraction, seed : int = 0):
+        self.dimension = dimension
+        self.probe_fraction = probe_fraction
+        self.rng = np.random.default_rng(seed)
+        self.vectors = np.zeros((0, dimension), dtype = np.float32) # grows with spare capacity, only the first size rows are used
+        self.size = 0
+        self.ids = [] # id of each row
+        self.rows = {} # id -> row
+        self.centroids = None # cluster centers, None until the index has min_train_size vectors
+        self.assignments = np.zeros(0, dtype = np.int32) # cluster of each row
+        self.lists = [] # array of the rows in each cluster
+        self.trained_size = 0 # number of vectors when the clusters were last trained
+
+    def __len__(self) -> int:
+        return self.size
+
+    def __contains__(self, id) -> bool:
+        return id in self.rows
+
+    # gets the number of clusters searched for each query
+    @property
+    def nprobe(self) -> int:
+        if self.centroids is None:
+            return 0
+        return min(len(self.centroids), max(min_nprobe, int(np.ceil(self.probe_fraction * len(self.centroids)))))
+
+    # rebuilds the array of rows in each cluster from the cluster of each row
+    def build_lists(self) -> None:
+        order = np.argsort(self.assignments, kind = "stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self.lists = [order[bounds[cluster]:bounds[cluster + 1]] for cluster in range(len(self.centroids))]
+
+    # clusters the stored vectors with k-means and rebuilds the list of each cluster
+    def train(self) -> None:
+        data = self.vectors[:self.size]
+        num_lists = max(1, int(np.sqrt(self.size)))
+        centroids = data[self.rng.choice(self.size, size = num_lists, replace = False)].copy()
+        for _ in range(kmeans_iterations):
+            assignments = self.nearest_centroids(data, centroids, 1)[:, 0]
+            for cluster in range(num_lists):
+                members = data[assignments == cluster]
+                # keeps the old center if a cluster is empty
+                if len(members) != 0:
+                    centroids[cluster] = members.mean(axis = 0)
+            centroids = normalize_rows(centroids)
+
+        self.centroids = centroids
+        self.assignments = self.nearest_centroids(data, centroids, 1)[:, 0].astype(np.int32)
+        self.build_lists()
+        self.trained_size = self.size
+        logging.info(f"Trained IVF index with {num_lists} clusters on {self.size} vectors")
+
+    # finds the indexes of the closest centroids to each vector
+    @staticmethod
+    def nearest_centroids(vectors : np.ndarray, centroids : np.ndarray, count : int) -> np.ndarray:
+        scores = vectors @ centroids.T
+        count = min(count, centroids.shape[0])
+        closest = np.argpartition(-scores, count - 1, axis = 1)[:, :count]
+        return closest
+
+    # adds vectors to the index under the given ids
+    def add(self, ids : list, vectors : np.ndarray) -> None:
+        vectors = normalize_rows(vectors).reshape(-1, self.dimension)
+        # doubles the capacity when the matrix is full, so adding one vector at a time stays cheap
+        if self.size + len(vectors) > self.vectors.shape[0]:
+            capacity = max(self.size + len(vectors), 2 * self.vectors.shape[0], 64)
+            grown = np.zeros((capacity, self.dimension), dtype = np.float32)
+            grown[:self.size] = self.vectors[:self.size]
+            self.vectors = grown
+
+        first_row = self.size
+        self.vectors[first_row:first_row + len(vectors)] = vectors
+        for offset, id in enumerate(ids):
+            self.rows[id] = first_row + offset
+            self.ids.append(id)
+        self.size += len(vectors)
+
+        if self.centroids is None:
+            if self.size >= min_train_size:
+                self.train()
+        elif self.size >= self.trained_size * retrain_growth:
+            self.train()
+        else:
+            # puts each new vector in the list of its nearest cluster
+            clusters = self.nearest_centroids(vectors, self.centroids, 1)[:, 0].astype(np.int32)
+            self.assignments = np.concatenate([self.assignments, clusters])
+            for offset, cluster in enumerate(clusters):
+                self.lists[cluster] = np.append(self.lists[cluster], first_row + offset)
+
+    # finds up to k stored vectors most similar to the query that are at or above the threshold
+    # returns a list of (id, cosine similarity), most similar first
+    def search(self, vector : np.ndarray, k : int = 1, threshold : float = -1.0, nprobe : int = None) -> list[tuple]:
+        if self.size == 0:
+            return []
+        query = normalize_rows(np.reshape(vector, (1, -1)))
+
+        if self.centroids is None:
+            candidates = np.arange(self.size)
+        else:
+            clusters = self.nearest_centroids(query, self.centroids, nprobe or self.nprobe)[0]
+            candidates = np.concatenate([self.lists[cluster] for cluster in clusters])
+            if len(candidates) == 0:
+                return []
+
+        scores = self.vectors[candidates] @ query[0]
+        count = min(k, len(candidates))
+        best = np.argpartition(-scores, count - 1)[:count]
+        best = best[np.argsort(-scores[best])]
+        return [(self.ids[candidates[i]], float(scores[i])) for i in best if scores[i] >= threshold]
+
+    # saves the index to a .npz file
+    def save(self, path : str) -> None:
+        directory = os.path.dirname(path)
+        if directory != "":
+            os.makedirs(directory, exist_ok = True)
+        temporary_path = path + ".tmp.npz"
+        np.savez(
+            temporary_path,
+            dimension = self.dimension,
+            probe_fraction = self.probe_fraction,
+            vectors = self.vectors[:self.size],
+            ids = np.array(self.ids, dtype = str),
+            centroids = self.centroids if self.centroids is not None else np.zeros((0, self.dimension), dtype = np.float32),
+            assignments = self.assignments,
+            trained_size = self.trained_size
+        )
+        os.replace(temporary_path, path)
+
+    # loads an index saved with save
+    @classmethod
+    def load(cls, path : str) -> "IVFIndex":
+        with np.load(path) as data:
+            # indexes saved with a fixed nprobe use the default share of clusters
+            probe_fraction = float(data["probe_fraction"]) if "probe_fraction" in data else default_probe_fraction
+            index = cls(int(data["dimension"]), probe_fraction)
+            index.vectors = data["vectors"].astype(np.float32)
+            index.size = len(index.vectors)
+            index.ids = data["ids"].tolist()
+            index.rows = {id : row for row, id in enumerate(index.ids)}
+            index.trained_size = int(data["trained_size"])
+            if len(data["centroids"]) != 0:
+                index.centroids = data["centroids"]
+                index.assignments = data["assignments"].astype(np.int32)
+                index.build_lists()
+        return index
@@ -4,11 +4,23 @@ similarity threshold will be deleted.
 """
 
 from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
+from sklearn.preprocessing import normalize
+from sklearn.feature_extraction.text import HashingVectorizer
+from scipy.sparse import coo_matrix, csr_matrix, issparse, vstack
+from scipy.sparse.csgraph import connected_components # for grouping similar articles
+import numpy as np
 import string
-from sentence_transformers import SentenceTransformer
+import unicodedata # for finding full-width punctuation
 import logging
 import time
+from parsing import minhash_index
+from parsing import metrics # for the time taken, pairs compared, and duplicates found
+from parsing import profiling # for profiling deduplication as a stage of a run
+from parsing import embedding_store # for the saved SBERT embeddings
+from parsing import ann_index # for approximate nearest-neighbor search over the embeddings
+import os
+from pymongo import UpdateOne, UpdateMany # for bulk renumbering
+from bson import ObjectId # for _ids saved as strings
 
 logging.basicConfig(
     filename = "deduplication.log", 
@@ -17,15 +29,196 @@ logging.basicConfig(
     format = "%(asctime)s - %(levelname)s - %(message)s"
 )
 
-# removes punctuation and formatting text from a document
+max_block_elements : int = 2 ** 25 # max number of similarity scores computed at once (128 MB of float32 scores)
+similarity_tolerance : float = 1e-6 # allows for rounding, so identical articles still reach a threshold of 1
+ann_index_path : str = os.path.join("embeddings", "ann_index.npz") # saved nearest-neighbor index of accepted articles
+hashed_vectors_path : str = os.path.join("embeddings", "hashed_vectors.npz") # saved vectors of hashing_comparison
+id_batch_size : int = 10_000 # max _ids in one $in query, keeping the query far below MongoDB's 16 MB document limit
+
+# vectorizes chinese text by overlapping 2 and 3 character n-grams, hashed into a fixed number of features so it needs no fitting
+hashing_vectorizer = HashingVectorizer(analyzer = "char", ngram_range = (2, 3), n_features = 2 ** 20, alternate_sign = False, norm = "l2", dtype = np.float32)
+
+# finds the full-width punctuation used in chinese text, from the CJK punctuation, general punctuation, and full-width forms blocks
+def cjk_punctuation() -> str:
+    characters = []
+    for start, end, categories in ((0x3000, 0x303F, "P"), (0x2000, 0x206F, "P"), (0xFE30, 0xFE6F, "P"), (0xFF00, 0xFFEF, "PS")):
+        for code in range(start, end + 1):
+            if unicodedata.category(chr(code))[0] in categories:
+                characters.append(chr(code))
+    return "".join(characters)
+
+punctuation_translator : dict = str.maketrans("", "", string.punctuation + cjk_punctuation()) # built once for every call of clean
+
+# removes punctuation (including full-width CJK punctuation) and formatting text from a document
 def clean(document : str) -> str:
-    translator = str.maketrans("", "", string.punctuation)
-    cleaned_doc = document.translate(translator)
+    cleaned_doc = document.translate(punctuation_translator)
     cleaned_doc = cleaned_doc.replace("\n", "")
     return cleaned_doc
 
+# gets the _id and body of the documents with the given _ids, oldest first, with one bounded $in query for each batch
+def find_bodies(collection, ids : list):
+    ids = sorted(ids)
+    for batch_start in range(0, len(ids), id_batch_size):
+        batch = ids[batch_start : batch_start + id_batch_size]
+        yield from collection.find({"_id" : {"$in" : batch}}, {"_id" : 1, "body" : 1}).sort("_id", 1)
+
+# deletes the documents marked as duplicates and renumbers the ids of the documents after them, with bulk operations
+# related_collections hold documents linked to articles by the "id" field (e.g. sentiment results), which are deleted and
+# renumbered the same way so they stay linked to the same articles
+def remove_duplicates(collection, duplicate_article_ids : list, related_collections = ()) -> None:
+    if len(duplicate_article_ids) == 0:
+        return
+    # _ids read back from saved vectors are strings, which would match no document
+    duplicate_article_ids = [ObjectId(id) if isinstance(id, str) and ObjectId.is_valid(id) else id for id in duplicate_article_ids]
+
+    # finds the id and title of every document marked to be deleted
+    deleted_counter_ids = []
+    for article in collection.find({"_id" : {"$in" : duplicate_article_ids}}, {"id" : 1, "title" : 1}):
+        deleted_counter_ids.append(article["id"])
+        logging.info(f"deleting article {article['title']}")
+    if len(deleted_counter_ids) == 0:
+        logging.info("None of the articles marked as duplicates are stored, nothing deleted")
+        return
+
+    # deletes every id marked to be deleted
+    result = collection.delete_many({"_id" : {"$in" : duplicate_article_ids}})
+    print(f"deleted {result.deleted_count} duplicates")
+    for related_collection in related_collections:
+        related_collection.delete_many({"id" : {"$in" : deleted_counter_ids}})
+
+    # resets ids for the new number of documents, from the first deleted id onward
+    start = time.perf_counter()
+    index = min(deleted_counter_ids)
+    article_updates = []
+    related_updates = []
+    documents = collection.find({"id" : {"$gt" : index}}, {"id" : 1}).sort("id", 1)
+    for doc in documents:
+        if doc["id"] != index:
+            article_updates.append(UpdateOne({"_id" : doc["_id"]}, {"$set" : {"id" : index}}))
+            # ids only move down and are renumbered lowest first, so an update never collides with an id not yet renumbered
+            related_updates.append(UpdateMany({"id" : doc["id"]}, {"$set" : {"id" : index}}))
+        index += 1
+    documents.close()
+
+    if len(article_updates) != 0:
+        collection.bulk_write(article_updates, ordered = False)
+        for related_collection in related_collections:
+            related_collection.bulk_write(related_updates, ordered = True)
+    end = time.perf_counter()
+    logging.info(f"Time taken redoing indexes in deduplication: {end - start} seconds")
+
+# finds the rows of a normalized matrix that are duplicates, comparing every pair of rows with blocked matrix products
+# rows at or above the threshold are joined into groups, and every row of a group except the first is returned
+# only one block of max_block_elements similarity scores is held in memory at a time
+# if first_row is given, the rows before it are taken as already deduplicated, and only pairs with a later row are compared
+# a group can then join rows before first_row through a later row, but only rows from first_row on are returned
+def find_duplicate_rows(matrix, threshold : float, first_row : int = 0) -> list[int]:
+    num_rows = matrix.shape[0]
+    if num_rows == 0 or first_row >= num_rows:
+        return []
+    chunk_size = max(1, max_block_elements // num_rows)
+    pair_rows = [] # first row of each pair at or above the threshold
+    pair_cols = [] # second row of each pair at or above the threshold
+
+    # transposes sparse matrices once, since converting them for every chunk costs more than the products
+    transposed = matrix.T.tocsr() if issparse(matrix) else None
+
+    for chunk_start in range(first_row, num_rows, chunk_size):
+        chunk_end = min(chunk_start + chunk_size, num_rows)
+        if transposed is not None:
+            # compares the rows in the chunk with every row, keeping only the scores at or above the threshold
+            block = (matrix[chunk_start:chunk_end] @ transposed).tocoo()
+            above = block.data >= threshold - similarity_tolerance
+            rows, cols = block.row[above], block.col[above]
+        else:
+            # compares the rows in the chunk with themselves and every later row, so each pair is only compared once
+            # (and with every row before first_row, if given)
+            column_start = 0 if first_row > 0 else chunk_start
+            block = matrix[chunk_start:chunk_end] @ matrix[column_start:].T
+            rows, cols = np.nonzero(block >= threshold - similarity_tolerance)
+            cols = cols + column_start
+        rows = rows + chunk_start
+        # drops each row compared with itself and pairs counted twice, keeping pairs with a row before first_row
+        kept = (cols > rows) | (cols < first_row)
+        pair_rows.append(rows[kept])
+        pair_cols.append(cols[kept])
+
+    num_pairs = num_rows * (num_rows - 1) // 2 - first_row * (first_row - 1) // 2
+    pair_rows = np.concatenate(pair_rows)
+    pair_cols = np.concatenate(pair_cols)
+    logging.info(f"Compared {num_pairs} pairs of articles, {len(pair_rows)} at or above the threshold")
+    metrics.dedup_pairs.inc(num_pairs, method = "all_pairs")
+
+    # groups the similar rows with connected components, and keeps the first row of each group
+    adjacency = coo_matrix((np.ones(len(pair_rows), dtype = np.int8), (pair_rows, pair_cols)), shape = (num_rows, num_rows))
+    labels = connected_components(adjacency, directed = False)[1]
+    first_rows = np.unique(labels, return_index = True)[1]
+    is_duplicate = np.ones(num_rows, dtype = bool)
+    is_duplicate[first_rows] = False
+    is_duplicate[:first_row] = False
+    return np.flatnonzero(is_duplicate).tolist()
+
+# saves hashed vectors and the _ids of their documents to a .npz file
+def save_hashed_vectors(path : str, ids : list[str], matrix) -> None:
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok = True)
+    temporary_path = path + ".tmp.npz"
+    np.savez(temporary_path, ids = np.array(ids, dtype = str), data = matrix.data, indices = matrix.indices, indptr = matrix.indptr, shape = matrix.shape)
+    os.replace(temporary_path, path)
+
+# loads hashed vectors saved with save_hashed_vectors, returning (list of _ids, sparse matrix)
+def load_hashed_vectors(path : str) -> tuple[list[str], csr_matrix]:
+    if not os.path.exists(path):
+        return [], csr_matrix((0, hashing_vectorizer.n_features), dtype = np.float32)
+    with np.load(path) as data:
+        matrix = csr_matrix((data["data"], data["indices"], data["indptr"]), shape = tuple(data["shape"]))
+        return data["ids"].tolist(), matrix
+
+# removes documents considered duplicates w/ hashed character n-gram vectors, which need no fitting on the whole collection
+# vectors of earlier runs are saved and reused, so only new documents are vectorized and compared
+def hashing_comparison(collection, threshold : float, related_collections = (), vectors_path : str = hashed_vectors_path) -> None:
+    start = time.perf_counter()
+
+    stored_ids, stored_matrix = load_hashed_vectors(vectors_path)
+    stored_rows = {id : row for row, id in enumerate(stored_ids)}
+
+    # splits the documents into ones with saved vectors (kept in the order they were saved) and new ones
+    document_ids = [doc["_id"] for doc in collection.find({}, {"_id" : 1})]
+    current_ids = {str(doc_id) for doc_id in document_ids}
+    old_ids = [id for id in stored_ids if id in current_ids] # drops vectors of documents deleted since they were saved
+    unsaved_ids = [doc_id for doc_id in document_ids if str(doc_id) not in stored_rows]
+    new_ids = []
+    cleaned_texts = []
+    for doc in find_bodies(collection, unsaved_ids):
+        new_ids.append(doc["_id"])
+        cleaned_texts.append(clean(doc["body"]))
+
+    if len(new_ids) == 0:
+        logging.info("No new articles for hashed n-gram deduplication")
+        return
+
+    # vectorizes only the new documents, and compares them with each other and every saved document
+    new_matrix = hashing_vectorizer.transform(cleaned_texts).astype(np.float32)
+    matrix = vstack([stored_matrix[[stored_rows[id] for id in old_ids]], new_matrix]).tocsr()
+    duplicate_rows = find_duplicate_rows(matrix, threshold, first_row = len(old_ids))
+    all_ids = old_ids + new_ids
+    duplicate_article_ids = [all_ids[row] for row in duplicate_rows] # stores ids of articles marked as duplicates (all new)
+
+    remove_duplicates(collection, duplicate_article_ids, related_collections)
+
+    # saves the vectors of every document that was kept, which includes every document with saved vectors
+    kept_rows = np.setdiff1d(np.arange(len(all_ids)), duplicate_rows)
+    save_hashed_vectors(vectors_path, [str(all_ids[row]) for row in kept_rows], matrix[kept_rows])
+
+    end = time.perf_counter()
+    logging.info(f"Time taken for hashed n-gram deduplication of {len(new_ids)} new articles: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "hashing_comparison")
+    metrics.duplicates.inc(len(duplicate_article_ids), stage = "hashing_comparison")
+
 # removes all documents considered duplicates from the MongoDB database w/ td-idf logic
-def tfidf_comparison(collection, threshold : int) -> None:
+@profiling.profile_stage("tfidf_comparison")
+def tfidf_comparison(collection, threshold : int, related_collections = ()) -> None:
     start = time.perf_counter()
     
     vectorizer = TfidfVectorizer() # creates a vectorizer for the document
@@ -45,67 +238,24 @@ def tfidf_comparison(collection, threshold : int) -> None:
     # creates a matrix of each text vectorized
     tfidf_matrix = vectorizer.fit_transform(cleaned_texts)
 
-    duplicate_article_ids = [] # stores ids of articles marked as duplicates
+    # finds every group of similar articles, keeping the first article of each group (tf-idf rows are already normalized)
+    duplicate_rows = find_duplicate_rows(tfidf_matrix, threshold)
+    duplicate_article_ids = [ids[row] for row in duplicate_rows] # stores ids of articles marked as duplicates
 
-    # loops through indexes of each stored text
-    for index, current_id in enumerate(ids):
-        
-        # skips the article if it has been marked as a duplicate
-        if current_id in duplicate_article_ids:
-            continue
-
-        # creates a cosine similarity matrix between the current text and the rest of the texts
-        similarities = cosine_similarity(tfidf_matrix[index][0], tfidf_matrix)
-
-        counter = 0 # counts the number of similar articles
-
-        # loops through each index in the cosine similarity matrix
-        for score_index, (similarity_score, article_id) in enumerate(zip(similarities[0], ids)): # using similarities[0] b/c there is only one row in the matrix
-            
-            # checks if the similarity index is at or above the threshold
-            if similarity_score >= threshold:
-                
-                # finds the id of the duplicate and adds it to the list of duplicates
-                duplicate_id = article_id
-                duplicate_article_ids.append(duplicate_id)
-                counter += 1
-            
-        # removes one of the duplicates marked for deletion so the first instance of the article is preserved
-        if counter > 0:
-            duplicate_article_ids.pop((len(duplicate_article_ids) - counter))
+    remove_duplicates(collection, duplicate_article_ids, related_collections)
 
-    deleted_counter_ids = []
-    # deletes every id marked to be deleted
-    for id in duplicate_article_ids:
-
-        article = collection.find_one({"_id" : id})
-        deleted_counter_ids.append(article["id"])
-        title = article["title"]
-        logging.info(f"deleting article {title}")
-        collection.delete_one({"_id" : id})
-        print("deleting duplicate " + str(id))
-    
-    # resets ids for the new number of documents
-    start = time.perf_counter()
-    index = deleted_counter_ids[0]
-    all_documents = collection.find()
-    documents = all_documents[index:]
-    for doc in documents:
-        collection.update_one({"_id" : doc["_id"]}, {"$set": {"id": index}})
-        index += 1
-    end = time.perf_counter()
-    logging.info(f"Time taken redoing indexes in deduplication: {end - start} seconds")
-
-    # closes cursor
-    documents.close()
     end = time.perf_counter()
     logging.info(f"Time taken for TFIDF deduplication: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "tfidf_comparison")
+    metrics.duplicates.inc(len(duplicate_article_ids), stage = "tfidf_comparison")
 
 # removes all documents considered duplicates with sbert
-def sbert_comparison(collection, threshold : int) -> None:
+# embeddings are read from the persistent embedding store, so only new or changed articles are encoded
+def sbert_comparison(collection, threshold : int, related_collections = (), store : embedding_store.EmbeddingStore = None) -> None:
     start = time.perf_counter()
 
-    vectorizer = SentenceTransformer("all-MiniLM-L6-v2") # creates a vectorizer for the document
+    if store is None:
+        store = embedding_store.EmbeddingStore()
     
     # gets all the documents from the database
     documents = collection.find()
@@ -119,59 +269,102 @@ def sbert_comparison(collection, threshold : int) -> None:
         cleaned_texts.append(clean(text))
         ids.append(id)
     
-    # creates a matrix of each text vectorized
-    vectorized_docs = vectorizer.encode(cleaned_texts)
-    print(vectorized_docs)
+    # creates a matrix of each text vectorized, normalized so dot products are cosine similarities
+    vectorized_docs = normalize(store.get_embeddings(ids, cleaned_texts))
+
+    # finds every group of similar articles, keeping the first article of each group
+    duplicate_rows = find_duplicate_rows(vectorized_docs, threshold)
+    duplicate_article_ids = [ids[row] for row in duplicate_rows] # stores ids of articles marked as duplicates
+
+    remove_duplicates(collection, duplicate_article_ids, related_collections)
+
+    # rewrites the saved embeddings without the rows of deleted and changed articles, once enough of them pile up
+    duplicates = set(duplicate_article_ids)
+    kept_ids = [id for id in ids if id not in duplicates]
+    if store.dead_rows(kept_ids) > embedding_store.max_dead_fraction * store.num_rows:
+        store.compact(kept_ids)
+
+    end = time.perf_counter()
+    logging.info(f"Time taken for SBERT deduplication: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "sbert_comparison")
+    metrics.duplicates.inc(len(duplicate_article_ids), stage = "sbert_comparison")
+
+# removes documents that are near duplicates of already accepted articles, using a persistent approximate nearest-neighbor
+# index of SBERT embeddings. Only documents not yet in the index are checked, each against its nearest indexed articles
+def sbert_ann_comparison(collection, threshold : float, related_collections = (), store : embedding_store.EmbeddingStore = None, index_path : str = ann_index_path) -> None:
+    start = time.perf_counter()
+
+    if store is None:
+        store = embedding_store.EmbeddingStore()
+    index = ann_index.IVFIndex.load(index_path) if os.path.exists(index_path) else None
+
+    # gets the documents that are not in the index yet, oldest first so the earliest copy of an article is the one kept
+    # only the _ids of the whole collection are read, the body text is only read for new documents
+    new_ids = [doc["_id"] for doc in collection.find({}, {"_id" : 1}) if index is None or str(doc["_id"]) not in index]
+    cleaned_texts = []
+    ids = []
+    for doc in find_bodies(collection, new_ids):
+        cleaned_texts.append(clean(doc["body"]))
+        ids.append(doc["_id"])
 
     duplicate_article_ids = [] # stores ids of articles marked as duplicates
+    if len(ids) != 0:
+        vectorized_docs = store.get_embeddings(ids, cleaned_texts)
+        if index is None:
+            index = ann_index.IVFIndex(vectorized_docs.shape[1])
 
-    # loops through indexes of each stored text
-    for index, current_id in enumerate(ids):
-        
-        # skips the article if it has been marked as a duplicate
-        if current_id in duplicate_article_ids:
-            continue
-        
-        current_doc = vectorized_docs[index]
-
-        # creates a cosine similarity matrix between the current text and the rest of the texts
-        similarities = cosine_similarity(current_doc.reshape(1, -1), vectorized_docs)
-        print(similarities)
-
-        counter = 0
-        # loops through each index in the cosine similarity matrix
-        for score_index, (similarity_score, article_id) in enumerate(zip(similarities[0], ids)): # using similarities[0] b/c there is only one row in the matrix
-            
-            # checks if the similarity index is at or above the threshold
-            if similarity_score >= threshold:
-                
-                # finds the id of the duplicate and adds it to the list of duplicates
-                duplicate_id = article_id
-                duplicate_article_ids.append(duplicate_id)
-                counter += 1
-            
-        # removes one of the duplicates so one instance of the article is preserved
-        if counter > 0:
-            print(len(duplicate_article_ids) - counter)
-            duplicate_article_ids.pop((len(duplicate_article_ids) - counter))
+        # queries the index for each document, adding it to the index if no indexed article is similar enough
+        for id, vector in zip(ids, vectorized_docs):
+            matches = index.search(vector, k = 1, threshold = threshold - similarity_tolerance)
+            if len(matches) != 0:
+                logging.info(f"article {id} is a duplicate of {matches[0][0]} (similarity {matches[0][1]})")
+                duplicate_article_ids.append(id)
+            else:
+                index.add([str(id)], vector.reshape(1, -1))
+        index.save(index_path)
 
-    # deletes every id marked to be deleted
-    for id in duplicate_article_ids:
+    remove_duplicates(collection, duplicate_article_ids, related_collections)
 
-        collection.delete_one({"_id" : id})
-        print("deleting duplicate " + str(id))
-    
-    # resets ids for the new number of documents
-    index = 0
-    documents = collection.find()
+    end = time.perf_counter()
+    logging.info(f"Time taken for SBERT ANN deduplication of {len(ids)} new articles ({len(duplicate_article_ids)} duplicates): {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "sbert_ann_comparison")
+    metrics.duplicates.inc(len(duplicate_article_ids), stage = "sbert_ann_comparison")
+
+# removes newly fetched documents that are near duplicates of already accepted articles, using a persistent MinHash/LSH index
+# only documents added since the last run are checked, each against the few indexed articles it shares an LSH band with
+@profiling.profile_stage("minhash_comparison")
+def minhash_comparison(collection, index_collection, threshold : float = 0.8, related_collections = ()) -> None:
+    start = time.perf_counter()
+
+    index = minhash_index.MinHashIndex(index_collection)
+
+    # gets the documents added after the newest indexed article (every document the first time the index is built)
+    newest_id = index.newest_id()
+    query = {} if newest_id is None else {"_id" : {"$gt" : newest_id}}
+    documents = collection.find(query, {"_id" : 1, "title" : 1, "body" : 1}).sort("_id", 1)
+
+    duplicate_article_ids = [] # stores ids of articles marked as duplicates
+    checked = 0
+
+    # checks each new document against the index, adding it to the index if it is not a duplicate
+    # documents are checked oldest first, so the earliest copy of an article is the one kept
     for doc in documents:
-        collection.update_one({"_id" : doc["_id"]}, {"$set": {"id": "index"}})
-        index += 1
-    
-    # closes cursor
+        checked += 1
+        article_signature = minhash_index.signature(clean(doc["body"]))
+        matches = index.query(article_signature, threshold)
+        if len(matches) != 0:
+            logging.info(f"article {doc['title']} is a duplicate of {matches[0][0]} (estimated similarity {matches[0][1]})")
+            duplicate_article_ids.append(doc["_id"])
+        else:
+            index.add(doc["_id"], article_signature)
     documents.close()
+
+    remove_duplicates(collection, duplicate_article_ids, related_collections)
+
     end = time.perf_counter()
-    logging.info(f"Time taken for SBERT deduplication: {end - start}")
+    logging.info(f"Time taken for MinHash deduplication of {checked} new articles ({len(duplicate_article_ids)} duplicates): {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "minhash_comparison")
+    metrics.duplicates.inc(len(duplicate_article_ids), stage = "minhash_comparison")
 
 if __name__ == "__main__":
     import os
@@ -179,4 +372,4 @@ if __name__ == "__main__":
 
     connection_string = os.getenv("MONGODB_CONNECTION_STRING")
     client = MongoClient(connection_string)
-    sbert_comparison(client, "news_info", 1)
\ No newline at end of file
+    sbert_comparison(client["news_info"]["article_info"], 1)
\ No newline at end of file
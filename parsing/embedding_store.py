@@ -0,0 +1,146 @@
+"""This program contains the persistent store of SBERT embeddings used for deduplication. Embeddings are saved on disk
+as a float32 matrix that is memory-mapped when read, with an index file mapping each article's MongoDB _id to its row and
+the hash of the text it was encoded from. Only articles that are new or whose text changed are encoded, and the SBERT
+model is loaded once per process. New embeddings are always appended, so the rows of changed and deleted articles stay
+in the matrix until compact rewrites it with only the rows still in use.
+"""
+
+from sentence_transformers import SentenceTransformer
+import numpy as np
+import hashlib
+import json
+import logging
+import os
+import threading
+
+logging.basicConfig(
+    filename = "deduplication.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+model_name : str = "all-MiniLM-L6-v2"
+store_directory : str = "embeddings" # folder holding the embedding matrix and its index
+max_dead_fraction : float = 0.25 # the matrix is compacted once more than this share of its rows are no longer used
+compact_chunk_rows : int = 65536 # rows copied at once while compacting
+
+model : SentenceTransformer = None # shared model, loaded on first use
+model_lock = threading.Lock()
+
+# gets the shared SBERT model, loading it the first time it is used
+def get_model() -> SentenceTransformer:
+    global model
+    if model is None:
+        with model_lock:
+            if model is None:
+                model = SentenceTransformer(model_name)
+    return model
+
+# gets the hash of the text an embedding was encoded from, so changed articles are encoded again
+def content_hash(text : str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class EmbeddingStore:
+    """On-disk float32 embedding matrix with an index of article _id -> (row, content hash)."""
+
+    def __init__(self, directory : str = store_directory):
+        self.directory = directory
+        self.vectors_file = "vectors.f32" # name of the matrix file, which changes each time the matrix is compacted
+        self.index_path = os.path.join(directory, "index.json")
+        os.makedirs(directory, exist_ok = True)
+
+        self.dimension = None # set from the model the first time anything is encoded
+        self.rows = {} # article _id -> [row, content hash]
+        if os.path.exists(self.index_path):
+            with open(self.index_path, mode = "r", encoding = "utf-8") as file:
+                index = json.load(file)
+            self.dimension = index["dimension"]
+            self.rows = index["rows"]
+            self.vectors_file = index.get("vectors", self.vectors_file)
+        # counts the rows from the file size, since rows of changed articles stay in the file unused
+        self.num_rows = 0
+        if self.dimension is not None and os.path.exists(self.vectors_path):
+            self.num_rows = os.path.getsize(self.vectors_path) // (self.dimension * 4)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    @property
+    def vectors_path(self) -> str:
+        return os.path.join(self.directory, self.vectors_file)
+
+    # saves the index, replacing the old file only once the new one is fully written
+    def save_index(self) -> None:
+        temporary_path = self.index_path + ".tmp"
+        with open(temporary_path, mode = "w", encoding = "utf-8") as file:
+            json.dump({"model" : model_name, "dimension" : self.dimension, "vectors" : self.vectors_file, "rows" : self.rows}, file)
+        os.replace(temporary_path, self.index_path)
+
+    # gets the number of rows in the matrix not used by any of the given articles
+    # article_ids are the MongoDB _ids of the articles still stored
+    def dead_rows(self, article_ids : list) -> int:
+        keys = {str(article_id) for article_id in article_ids}
+        return self.num_rows - sum(1 for key in self.rows if key in keys)
+
+    # rewrites the matrix with only the rows of the given articles, dropping the rows of changed and deleted articles
+    # the new matrix is written to a new file and the index is switched to it, so a crash leaves the old files usable
+    def compact(self, article_ids : list) -> None:
+        if self.dimension is None or self.num_rows == 0:
+            return
+        keys = {str(article_id) for article_id in article_ids}
+        live = sorted((row, key) for key, (row, _) in self.rows.items() if key in keys) # kept in their old order
+        old_path = self.vectors_path
+        old_rows = self.num_rows
+        matrix = np.memmap(old_path, dtype = np.float32, mode = "r", shape = (self.num_rows, self.dimension))
+
+        # names the new file after the one it replaces, like vectors-1.f32 after vectors.f32
+        name = os.path.splitext(self.vectors_file)[0]
+        generation = int(name.split("-")[1]) + 1 if "-" in name else 1
+        new_file = f"vectors-{generation}.f32"
+        with open(os.path.join(self.directory, new_file), mode = "wb") as file:
+            for chunk_start in range(0, len(live), compact_chunk_rows):
+                chunk = live[chunk_start:chunk_start + compact_chunk_rows]
+                file.write(np.asarray(matrix[[row for row, _ in chunk]], dtype = np.float32).tobytes())
+        del matrix
+
+        self.rows = {key : [new_row, self.rows[key][1]] for new_row, (_, key) in enumerate(live)}
+        self.num_rows = len(live)
+        self.vectors_file = new_file
+        self.save_index()
+        os.remove(old_path)
+        logging.info(f"Compacted the embedding matrix from {old_rows} to {self.num_rows} rows")
+
+    # encodes the texts and appends their embeddings to the end of the matrix
+    def add(self, keys : list[str], texts : list[str]) -> None:
+        embeddings = np.asarray(get_model().encode(texts), dtype = np.float32)
+        self.dimension = embeddings.shape[1]
+        with open(self.vectors_path, mode = "ab") as file:
+            file.write(embeddings.tobytes())
+        for key, text in zip(keys, texts):
+            self.rows[key] = [self.num_rows, content_hash(text)]
+            self.num_rows += 1
+        self.save_index()
+
+    # gets the embedding of every text, encoding only the ones not already stored with the same content
+    # article_ids are the MongoDB _ids of the articles, texts are the cleaned texts to encode
+    def get_embeddings(self, article_ids : list, texts : list[str]) -> np.ndarray:
+        keys = [str(article_id) for article_id in article_ids]
+
+        missing_keys = []
+        missing_texts = []
+        for key, text in zip(keys, texts):
+            stored = self.rows.get(key)
+            if stored is None or stored[1] != content_hash(text):
+                missing_keys.append(key)
+                missing_texts.append(text)
+        logging.info(f"Embeddings stored: {len(keys) - len(missing_keys)}, embeddings to encode: {len(missing_keys)}")
+
+        if len(missing_keys) != 0:
+            self.add(missing_keys, missing_texts)
+        if len(keys) == 0:
+            return np.zeros((0, self.dimension or 0), dtype = np.float32)
+
+        # reads only the rows needed from the memory-mapped matrix
+        matrix = np.memmap(self.vectors_path, dtype = np.float32, mode = "r", shape = (self.num_rows, self.dimension))
+        return np.array(matrix[[self.rows[key][0] for key in keys]])
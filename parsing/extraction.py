@@ -0,0 +1,127 @@
+"""This program extracts the body text of articles from their HTML. Pages are parsed with lxml, and the paragraphs of
+the body are selected with an XPath expression compiled once for each source in sources.py, instead of building a
+BeautifulSoup tree and searching it for every article. The text of the paragraphs is joined in one step.
+"""
+
+import lxml.html
+from lxml import etree
+import requests # for request errors
+import logging
+from parsing import http_client # to get the HTML of websites
+
+logging.basicConfig(
+    filename = "html.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+# gets the XPath of the <p> tags under the first tag with a certain name, like the find_text_by_name helper it replaced
+def by_name(name : str) -> str:
+    return f"(//{name})[1]//p"
+
+# gets the XPath of the <p> tags under the first tag with a certain id, like the find_text_by_id helper it replaced
+def by_id(id_name : str) -> str:
+    return f"(//*[@id='{id_name}'])[1]//p"
+
+# gets the XPath of the <p> tags under the first tag with a certain class, like the find_text_by_class helper it replaced
+def by_class(class_name : str) -> str:
+    return f"(//*[contains(concat(' ', normalize-space(@class), ' '), ' {class_name} ')])[1]//p"
+
+class Extractor:
+    """Precompiled XPath selecting the paragraphs that hold an article's body text."""
+
+    def __init__(self, xpath : str):
+        self.xpath = xpath
+        self.paragraphs = etree.XPath(xpath)
+
+    # gets the text of every selected paragraph joined together, or None if there is none
+    def extract(self, document) -> str:
+        text = "".join(paragraph.text_content() for paragraph in self.paragraphs(document))
+        if text == "":
+            return None
+        return text
+
+# PTT posts: the last metaline before the body, its following siblings, and the value of the time metaline
+PTT_body_start = etree.XPath("(//*[contains(concat(' ', normalize-space(@class), ' '), ' article-metaline ')])[last()]")
+PTT_time = etree.XPath("//*[contains(concat(' ', normalize-space(@class), ' '), ' article-metaline ')]"
+                       "[*[contains(@class, 'article-meta-tag')] = '時間']/*[contains(@class, 'article-meta-value')]")
+
+# parses HTML into an lxml document, or returns None if it cannot be parsed
+def parse_html(html : str):
+    try:
+        return lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError) as e:
+        # lxml refuses text with an XML encoding declaration, so the declaration is dropped
+        if isinstance(e, ValueError) and html.lstrip().startswith("<?xml"):
+            return parse_html(html[html.index("?>") + 2:])
+        logging.error(f"Could not parse HTML: {e}")
+        return None
+
+# downloads a page and parses it, or returns None if the request fails
+def get_document(url : str):
+    try:
+        response = http_client.get(url)
+    except requests.Timeout as e:
+        logging.error(f"requests timed out. Link of article: {url}")
+        return None
+    except Exception as e:
+        logging.error(f"requests failed for website. Link: {url}. Error msg: {e}")
+        return None
+    return parse_html(response.text)
+
+# gets the body text of an article from its HTML, using the extractor of its source
+def extract_body_text(html : str, extractor : Extractor) -> str:
+    document = parse_html(html)
+    if document is None:
+        return None
+    return extractor.extract(document)
+
+# downloads an article and gets its body text, using the extractor of its source (from the source registry)
+# returns None if the source has no extractor, the request fails, or no text is found
+def fetch_body_text(article_link : str, extractor : Extractor) -> str:
+    if extractor is None:
+        logging.error(f"No extractor for the source of this article. Link: {article_link}")
+        return None
+    document = get_document(article_link)
+    if document is None:
+        return None
+    text = extractor.extract(document)
+    if text is None:
+        logging.error(f"No text found for this article. Link: {article_link}")
+    return text
+
+# gets the time string and body text of a PTT Stock Board post, like the get_PTT_body_text helper it replaced
+# the body is the text between the last metaline and the first comment, leaving out the text of tags in between
+# WARNING: Specifically customized to PTT Stock Board's html, so if the html structure changes this will stop working
+def extract_PTT_post(document) -> tuple[str, str]:
+    times = PTT_time(document)
+    timestamp_string = times[0].text_content() if len(times) != 0 else None
+
+    start = PTT_body_start(document)
+    if len(start) == 0:
+        logging.error(f"Class 'article-metaline' could not be found in current article. Check if PTT html has been updated.")
+        return timestamp_string, None
+
+    parts = []
+    element = start[0]
+    while element is not None:
+        # comments have no tag name or class
+        element_class = element.get("class", "") if isinstance(element.tag, str) else ""
+        if element is not start[0] and element_class.split()[:1] == ["push"]:
+            break
+        if element.tail is not None:
+            parts.append(element.tail)
+        element = element.getnext()
+    text = "".join(parts)
+
+    # removing substrings used for formatting on the website for better legibility in the BSON document
+    text = text.replace("\n", "")
+    text = text.replace("  ", "")
+    text = text.replace("===", "")
+    text = text.replace("---", "")
+
+    if text == "":
+        logging.error(f"No text found in current article. Check if PTT html has been updated.")
+        return timestamp_string, None
+    return timestamp_string, text
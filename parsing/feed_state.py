@@ -0,0 +1,119 @@
+"""This program keeps the state of each RSS feed between runs in MongoDB. Feeds are downloaded with conditional GET
+requests (ETag / If-Modified-Since), so a feed that has not changed is skipped when the website answers 304 Not Modified.
+The newest published time seen in each feed is also saved, so entries that were already checked in an earlier run are
+dropped before any database or HTTP work is done for them. Websites crawled without RSS, such as the PTT Stock Board,
+keep a checkpoint of the newest post seen in the same collection.
+"""
+
+import feedparser # for RSS parsing
+import calendar
+import logging
+from parsing import http_client # to download the feeds
+
+logging.basicConfig(
+    filename = "main.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+collection_name : str = "feed_state" # name of the collection holding the state of each feed
+
+# creates an empty parsed feed, used when a feed is unchanged or could not be downloaded
+def empty_feed(url : str, status : int) -> feedparser.FeedParserDict:
+    return feedparser.FeedParserDict(entries = [], href = url, status = status, etag = None, modified = None)
+
+# gets the saved state of a feed, or an empty state if the feed has not been fetched before
+def load_state(state_collection, url : str) -> dict:
+    state = state_collection.find_one({"url" : url})
+    if state is None:
+        return {"url" : url}
+    return state
+
+# gets the published time of an RSS entry in seconds since the epoch (UTC), or None if the entry has no time
+def entry_published(entry) -> float:
+    published = entry.get("published_parsed") or entry.get("updated_parsed")
+    if published is None:
+        return None
+    return calendar.timegm(published)
+
+# downloads and parses a feed, sending the ETag and Last-Modified saved from the last run
+def download_feed(url : str, state : dict) -> feedparser.FeedParserDict:
+    headers = {}
+    if state.get("etag") is not None:
+        headers["If-None-Match"] = state["etag"]
+    if state.get("modified") is not None:
+        headers["If-Modified-Since"] = state["modified"]
+
+    response = http_client.get(url, headers = headers)
+
+    # skips the feed if it has not changed since the last run
+    if response.status_code == 304:
+        logging.info(f"RSS feed not modified since last run, skipping. Link: {url}")
+        return empty_feed(url, 304)
+    if response.status_code != 200:
+        logging.error(f"RSS feed returned status {response.status_code}. Link: {url}")
+        return empty_feed(url, response.status_code)
+
+    response_headers = {key.lower() : value for key, value in response.headers.items()}
+    response_headers["content-location"] = url
+    news_feed = feedparser.parse(response.content, response_headers = response_headers)
+    news_feed["href"] = url
+    news_feed["status"] = response.status_code
+    news_feed["etag"] = response.headers.get("ETag")
+    news_feed["modified"] = response.headers.get("Last-Modified")
+    return news_feed
+
+# drops the entries that are not newer than the newest entry saved from an earlier run
+def drop_seen_entries(news_feed : feedparser.FeedParserDict, state : dict) -> None:
+    newest_published = state.get("newest_published")
+    if newest_published is None:
+        return
+
+    new_entries = []
+    for entry in news_feed.entries:
+        published = entry_published(entry)
+        # keeps entries without a time, since they cannot be compared
+        if published is None or published > newest_published:
+            new_entries.append(entry)
+
+    if len(new_entries) != len(news_feed.entries):
+        logging.info(f"Dropped {len(news_feed.entries) - len(new_entries)} entries already seen in earlier runs. Link: {news_feed.href}")
+    news_feed["entries"] = new_entries
+
+# downloads a feed and keeps only the entries that are new since the last run
+def fetch_feed(state_collection, url : str) -> feedparser.FeedParserDict:
+    state = load_state(state_collection, url)
+    news_feed = download_feed(url, state)
+    drop_seen_entries(news_feed, state)
+    return news_feed
+
+# saves the ETag, Last-Modified, and newest published time of a feed once every entry in it has been checked
+def save_state(state_collection, news_feed : feedparser.FeedParserDict) -> None:
+    # nothing changes if the feed was not modified or could not be downloaded
+    if news_feed.status != 200:
+        return
+
+    update = {"$set" : {"etag" : news_feed.etag, "modified" : news_feed.modified}}
+    published_times = [entry_published(entry) for entry in news_feed.entries]
+    published_times = [published for published in published_times if published is not None]
+    if len(published_times) != 0:
+        # $max keeps the saved time if it is newer
+        update["$max"] = {"newest_published" : max(published_times)}
+
+    try:
+        state_collection.update_one({"url" : news_feed.href}, update, upsert = True)
+    except Exception as e:
+        logging.error(f"Error saving RSS feed state. Link: {news_feed.href}. Error msg: {e}")
+
+# saves the link and time of the newest post of a website crawled without RSS, such as the PTT Stock Board
+# newest_published is in seconds since the epoch, and $max keeps the saved time if it is newer
+def save_checkpoint(state_collection, url : str, newest_post : str, newest_published : float) -> None:
+    try:
+        state_collection.update_one(
+            {"url" : url},
+            {"$set" : {"newest_post" : newest_post}, "$max" : {"newest_published" : newest_published}},
+            upsert = True
+        )
+    except Exception as e:
+        logging.error(f"Error saving crawl checkpoint. Link: {url}. Error msg: {e}")
@@ -1,23 +1,29 @@
 """This program is an HTML web scraper that obtains title, source, body, url, timestamp, and keywords from articles from
 the PTT Stock Board. THe data obtained is uploaded to MongoDB. This program is specific to the PTT Stock Board, and cannot
-be used for other websites due to different HTML structures. Also contains basic functions for html web scraping to find
-text in <p> tags within other tags. Also contains a scraper for cmoney, but it has not been thoroughly tested yet so it is not
-currently implemented in main.
+be used for other websites due to different HTML structures. The body text of posts is found with the extraction engine in
+extraction.py. Also contains a scraper for cmoney, but it has not been thoroughly tested yet so it is not currently
+implemented in main.
 """
 
 from bs4 import BeautifulSoup # for HTML parsing
-import bs4 # for HTML parsing
-import requests # to get the HTML of websites
+import requests # for request errors
+from parsing import http_client # to get the HTML of websites
+from parsing import feed_state # for the checkpoint of the newest PTT post
+from parsing import extraction # for extracting the body text of PTT posts
+from parsing import sources # for the PTT Stock Board's url and timestamp parser
+from parsing import metrics # for the number of PTT posts fetched and skipped
+from parsing import profiling # for profiling PTT_fetch as a stage of a run
 import logging
 import time
 import os
-import pytz
-from datetime import datetime
 from selenium import webdriver
 from selenium.webdriver.common.by import By
 from newspaper import Article
 from langdetect import detect
 import math
+import re
+from concurrent.futures import ThreadPoolExecutor # for fetching PTT posts concurrently
+from parsing.keyword_matcher import KeywordMatcher
 
 logging.basicConfig(
     filename = "html.log", 
@@ -26,11 +32,11 @@ logging.basicConfig(
     format = "%(asctime)s - %(levelname)s - %(message)s"
 )
 
-# gets the BeautifulSoup object of the webpage for scraping
+# gets the BeautifulSoup object of the webpage for scraping, using the shared pooled session
 def get_article(url : str) -> BeautifulSoup:
     try:
-        response = requests.get(url, timeout = 15)
-    except TimeoutError as e:
+        response = http_client.get(url)
+    except requests.Timeout as e:
         logging.error(f"requests timed out. Link of article: {url}")
         return None
     except Exception as e:
@@ -41,253 +47,200 @@ def get_article(url : str) -> BeautifulSoup:
 
     return BeautifulSoup(html_content, "lxml")
 
-# finds text in <p> tags under the tag with a certain name
-def find_text_by_name(article_link : str, name : str) -> str:
-    text = ""
-    soup = get_article(article_link)
-    if soup is None:
-        return None
-    article = soup.find(name)
-
-    # checks if the correct tag was found
-    if article != None:
-        paragraphs = article.find_all("p")
-
-        # adds the text in each p tag to the saved text
-        for i in paragraphs:
-            text += i.get_text()
-    
-    if text == "":
-        logging.error(f"No text found for this article. Link: {article_link}")
-        text = None
-    
-    return text
+PTT_source : sources.Source = sources.get_source("PTT Stock Board")
+PTT_url : str = PTT_source.feed_url # newest index page of the PTT Stock Board
+PTT_max_fetches : int = 4 # max number of PTT posts fetched at once
+PTT_max_pages : int = 50 # max number of index pages read in one run
 
-# finds the text in <p> tags under a tag with a certain id
-def find_text_by_id(article_link : str, id_name : str) -> str:
-    text = ""
-    soup = get_article(article_link)
-    if soup is None:
+# gets the links and titles of the posts on a PTT Stock Board index page, newest first, and the link of the previous page
+# pinned posts listed below the separator at the bottom of the newest page are left out
+# WARNING: Specifically customized to PTT Stock Board's html, so if the html structure changes this will stop working
+def parse_PTT_index(soup : BeautifulSoup) -> tuple[list[tuple[str, str]], str]:
+    posts = []
+    for entry in soup.find_all("div", class_ = ["r-ent", "r-list-sep"]):
+        if "r-list-sep" in entry.get("class"):
+            break
+        title_tag = entry.find(class_ = "title")
+        link = title_tag.find("a") if title_tag is not None else None
+        # deleted posts have no link
+        if link is not None and link.get("href") is not None:
+            posts.append(("https://www.ptt.cc" + link.get("href"), link.get_text()))
+    posts.reverse()
+
+    previous_page = None
+    for button in soup.find_all(class_ = "btn wide"):
+        if button.get_text() == "‹ 上頁" and button.get("href") is not None:
+            previous_page = "https://www.ptt.cc" + button.get("href")
+    if previous_page is None:
+        logging.error(f"上頁 button not found on PTT Stock Board. Check if html has changed.")
+    return posts, previous_page
+
+# gets the time a PTT post was made in seconds since the epoch from its link (.../M.<time>.A.<id>.html), or None if it has none
+def PTT_post_time(article_link : str) -> int:
+    match = re.search(r"/M\.(\d+)\.", article_link)
+    if match is None:
         return None
-    article = soup.find(id = id_name)
-
-    # checks if the correct tag was found
-    if article != None:
-        paragraphs = article.find_all("p")
+    return int(match.group(1))
 
-        # adds the text in each p tag to the saved text
-        for i in paragraphs:
-            text += i.get_text()
-    
-    if text == "":
-        logging.error(f"No text found for this article. Link: {article_link}")
-        text = None
-
-    return text
-
-# finds the text in <p> tags under a tag with a certain class
-def find_text_by_class(article_link : str, class_name : str) -> str:
-    text = ""
-    soup = get_article(article_link)
-    if soup is None:
+# fetches a PTT post and creates its document without an id, or returns None if it is skipped
+def parse_PTT_post(article_link : str, title : str, matcher : KeywordMatcher) -> dict:
+    document = extraction.get_document(article_link)
+    if document is None:
+        metrics.articles.inc(source = PTT_source.name, outcome = "request_failed")
         return None
-    article = soup.find(class_ = class_name)
-
-    # checks if the correct tag was found
-    if article != None:
-        paragraphs = article.find_all("p")
-
-        # adds the text in each p tag to the saved text
-        for i in paragraphs:
-            text += i.get_text()
-    
-    if text == "":
-        logging.error(f"No text found for this article. Link: {article_link}")
-        text = None
-
-    return text
 
-# gets the body text of a PTT Stock Board Post
-# WARNING: Specifically customized to PTT Stock Board's html, so if the html structure changes this will stop working
-def get_PTT_body_text(soup : BeautifulSoup) -> str:
+    # finds the timestamp and body text
+    timestamp_string, text = extraction.extract_PTT_post(document)
+    converted_dt = None
+    if timestamp_string is not None:
+        # converts to datetime object with UTC+8 timezone (PTT does not include time zone, so it is treated as UTC+8)
+        converted_dt = PTT_source.parse_timestamp(timestamp_string)
+        if converted_dt is None:
+            metrics.articles.inc(source = PTT_source.name, outcome = "bad_timestamp")
+            return None
 
-    article = soup.find_all(class_ = "article-metaline") # uses article-metaline tags as starting point for body text
-    if article is None or len(article) == 0:
-        logging.error(f"Class 'article-metaline' could not be found in current article. Check if PTT html has been updated.")
+    if text is None:
+        logging.error(f"Body text could not be found for an article from PTT Stock Board. Link: {article_link}")
+        metrics.articles.inc(source = PTT_source.name, outcome = "no_body")
         return None
-    else:
-        tag = article[len(article) - 1] # finds the last article-metaline tag
-
-    text = ""
-    while True:
-        # breaks from the loop if the end of the page is reached
-        if tag is None or tag.next_sibling is None:
-            break
 
-        # checks if the next sibling is a tag
-        if isinstance(tag, bs4.Tag):
+    # finds every keyword from the keyword filter set in the title and body text
+    article_keywords = list(matcher.match(title, text))
 
-            # checks if the next tag has a class
-            if tag.get("class") is not None:
-
-                # ends the loop if the article has ended and the next tag is for comments
-                if tag.get("class")[0] == "push":
-                    break
-        
-        # adds the current element to text if it is not a tag object
-        else:
-            text = text + str(tag)
-        
-        # sets tag to the next item in the webpage
-        tag = tag.next_sibling
-
-    # removing substrings used for formatting on the website for better legibility in the BSON document
-    text = text.replace("\n", "")
-    text = text.replace("  ", "")
-    text = text.replace("===", "")
-    text = text.replace("---", "")
-
-    # checks if any text was actually scraped
-    if text == "":
-        logging.error(f"No text found in current article. Check if PTT html has been updated.")
-        text = None
-
-    return(text)
+    # skips the article if no keywords are found
+    if len(article_keywords) == 0:
+        logging.info(f"No keywords found for this PTT Stock Board article. Link: {article_link}")
+        metrics.articles.inc(source = PTT_source.name, outcome = "no_keywords")
+        return None
 
-# fetches a specified number of articles from the PTT Stock Board
+    return {
+        "title" : title,
+        "source" : "PTT Stock Board",
+        "body" : text,
+        "url" : article_link,
+        "timestamp" : converted_dt,
+        "keywords" : article_keywords
+    }
+
+# fetches a specified number of new articles from the PTT Stock Board, newest first
+# the posts on each index page are fetched concurrently, and paging back stops at the first post not newer than the
+# checkpoint saved in state_collection, or at the first post already in the collection when there is no checkpoint yet
+# the checkpoint is moved to the newest post once every newer post is checked, or only down to where paging stopped if
+# some newer posts were left unfetched because enough articles were found, so the next run goes back for them
+# a first run that stops before reaching a stored post sets the checkpoint just below the oldest post it read instead
+# if article_pipeline is given, each article is submitted to it as soon as it is fetched instead of being inserted at the end
 # WARNING: Specifically customized to PTT Stock Board's html, so if the html structure changes this will stop working
-def PTT_fetch(collection, number : int, start_index : int, keywords : set) -> None:
-    
-    global time
+@profiling.profile_stage("PTT_fetch")
+def PTT_fetch(collection, number : int, start_index : int, matcher : KeywordMatcher, article_pipeline = None, state_collection = None) -> None:
     start = time.perf_counter()
     counter = 0 # counts the number of articles fetched
-    url = "https://www.ptt.cc/bbs/stock/index.html"
-    cont = True
     index = start_index
     docs_to_save = []
 
-    # loops until the number of articles needed is met
-    while cont:
-
-        # finds all articles on the homepage
-        tries = 0
-        while tries < 3:
-            content = get_article(url)
-            articles = content.find_all(class_ = "title", limit = number)
-            if articles is None:
-                tries += 1
-                continue
-            else:
+    checkpoint = None
+    if state_collection is not None:
+        checkpoint = feed_state.load_state(state_collection, PTT_url).get("newest_published")
+    newest_post = None # link and time of the newest post seen
+    oldest_post = None # link and time of the oldest post seen
+    completed = False # whether paging back reached a post handled in an earlier run
+    boundary_post = None # link and time of the stored post paging stopped at, when there was no checkpoint
+    unfetched = False # whether some new posts were left unfetched because enough articles were found
+
+    url = PTT_url
+    pages = 0
+    post_task = profiling.stage_task(parse_PTT_post) # profiled as part of PTT_fetch when profiling is on
+    with ThreadPoolExecutor(max_workers = PTT_max_fetches) as executor:
+        while counter < number:
+            if url is None or pages >= PTT_max_pages:
+                completed = url is None
                 break
-        if tries == 3:
-            logging.error("Requests timed out")
-            return None
-
 
-        # loops for each article on the page
-        for i in articles:
-
-            # finds the tag holding the link and title of each article
-            info = i.find("a")
-            if info is not None:
-                # parses the article linked
-                article_link = "https://www.ptt.cc" + info.get("href")
-                article = get_article(article_link)
-                title = info.get_text()
-
-                # finds the timestamp
-                skip_article = False
-                try:
-                    for i in article.find_all(class_ = "article-metaline"):
-                        if i.find(class_ = "article-meta-tag").get_text() == "時間":
-                            timestamp_string = i.find(class_ = "article-meta-value").get_text()
-                            format = f"%a %b %d %H:%M:%S %Y"
-                            try:
-                                datetime_object = datetime.strptime(timestamp_string, format)
-                            except Exception as e:
-                                logging.error(f"Error converting {title} article to datetime object: {e}")
-                                skip_article = True
-                                break
-        
-                            # changes the datetime object to UTC+8 timezone (uses localize b/c PTT does not include time zone)
-                            tw_timezone = pytz.timezone("Etc/GMT-8")
-                            converted_dt = tw_timezone.localize(datetime_object)
-                except Exception as e:
-                    logging.error(f"Could not find timestamp for PTT post: {e}")
-                    continue
-                
-                if skip_article:
-                    continue
-
-                # finds body text
-                text = get_PTT_body_text(article)
-                if text is None:
-                    logging.error(f"Body text could not be found for an article from PTT Stock Board. Link: {article_link}")
-                    continue
-
-                article_keywords = []
-                
-                # loops through the keyword filter set
-                keyword_found = False
-                for keyword in keywords:
-                    if keyword in title or keyword in text:
-                        keyword_found = True
-                        article_keywords.append(keyword)
-                
-                # skips the article if no keywords are found
-                if keyword_found == False:
-                    logging.info(f"No keywords found for this PTT Stock Board article. Link: {article_link}")
+            # finds all articles on the index page
+            soup = None
+            for _ in range(3):
+                soup = get_article(url)
+                if soup is not None:
+                    break
+            if soup is None:
+                logging.error("Requests timed out")
+                break
+            posts, url = parse_PTT_index(soup)
+            pages += 1
+
+            # keeps the posts newer than the checkpoint, or before the first one already stored if there is no checkpoint
+            existing_links = {doc["url"] for doc in collection.find({"url" : {"$in" : [link for link, _ in posts]}}, {"url" : 1, "_id" : 0})}
+            new_posts = []
+            for article_link, title in posts:
+                post_time = PTT_post_time(article_link)
+                if checkpoint is not None and post_time is not None and post_time <= checkpoint:
+                    completed = True
+                    break
+                if checkpoint is None and article_link in existing_links:
+                    completed = True
+                    if post_time is not None:
+                        boundary_post = (article_link, post_time)
+                    break
+                if post_time is not None and (newest_post is None or post_time > newest_post[1]):
+                    newest_post = (article_link, post_time)
+                if post_time is not None and (oldest_post is None or post_time < oldest_post[1]):
+                    oldest_post = (article_link, post_time)
+                # posts stored by an earlier run that stopped part way down the page are not fetched again
+                if article_link not in existing_links:
+                    new_posts.append((article_link, title))
+
+            # fetches the new posts on the page concurrently, handling them newest first
+            futures = [executor.submit(post_task, article_link, title, matcher) for article_link, title in new_posts]
+            for position, future in enumerate(futures):
+                data = future.result()
+                if data is None:
                     continue
-
-                # creates the file to be stored
-                data = {
-                    "id" : index,
-                    "title" : title,
-                    "source" : "PTT Stock Board",
-                    "body" : text,
-                    "url" : article_link,
-                    "timestamp" : converted_dt,
-                    "keywords" : article_keywords
-                }
-
-                # saves the file to a list
-                docs_to_save.append(data)
+                data["id"] = index
+                metrics.articles.inc(source = PTT_source.name, outcome = "fetched")
+
+                # saves the file to a list, or passes it on to the pipeline
+                if article_pipeline is not None:
+                    article_pipeline.submit(data)
+                else:
+                    docs_to_save.append(data)
                 counter += 1
                 index += 1
-                
+
                 # stops fetching if the number of articles needed is reached
                 if counter >= number:
-                    cont = False
+                    unfetched = position != len(futures) - 1
                     break
+            # cancels the fetches that have not started once enough articles are found
+            for future in futures:
+                future.cancel()
+
+            if completed:
+                break
 
-        # finds all the buttons for navigating the page
-        buttons = get_article(url).find_all(class_ = "btn wide")
-        
-        if len(buttons) == 0:
-            logging.error(f"No buttons found on PTT Stock Board. Check if html has changed.")
-            break
-        
-        # finds the button to go to the next page and sets the link for parsing to the next page
-        button_found = False
-        for i in buttons:
-                if i.get_text() == "‹ 上頁":
-                    url = "https://www.ptt.cc" + i.get("href")
-                    button_found = True
-        
-        if button_found == False:
-            logging.error(f"上頁 button not found on PTT Stock Board. Check if html has changed.")
-    
     # inserts docs to MongoDB
-    try:
-        collection.insert_many(docs_to_save)
-    except Exception as e:
-        logging.error(f"PTT Stock Board docs failed to upload to MongoDB: {e}")
+    if len(docs_to_save) != 0:
+        try:
+            collection.insert_many(docs_to_save)
+        except Exception as e:
+            logging.error(f"PTT Stock Board docs failed to upload to MongoDB: {e}")
+
+    # moves the checkpoint to the newest post once every newer post has been checked, like the RSS feed state
+    # if posts were left unfetched, only the posts up to the stored post paging stopped at are known to be checked
+    # the next run then skips the stored posts above the checkpoint instead of stopping at them, and fetches the rest
+    checked_post = None
+    if completed:
+        checked_post = boundary_post if unfetched else newest_post
+    elif checkpoint is None and oldest_post is not None:
+        checked_post = (oldest_post[0], oldest_post[1] - 1)
+    if state_collection is not None and checked_post is not None:
+        feed_state.save_checkpoint(state_collection, PTT_url, checked_post[0], checked_post[1])
     
     end = time.perf_counter()
-    logging.info(f"Time taken to scrape {len(docs_to_save)} articles from PTT Stock Board: {end - start}")
+    logging.info(f"Time taken to scrape {counter} articles from {pages} PTT Stock Board pages: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "PTT_fetch")
+    metrics.source_seconds.observe(end - start, source = PTT_source.name)
 
 # scrapes a set amount of articles from cmoney w/ Selenium
-def cmoney_scraper(collection, number : int, start_index : int, keywords : set):
+def cmoney_scraper(collection, number : int, start_index : int, matcher : KeywordMatcher):
     global time
     start = time.perf_counter()
     counter = 0 # counts the number of articles fetched
@@ -368,16 +321,11 @@ def cmoney_scraper(collection, number : int, start_index : int, keywords : set):
             # gets the body text of the article
             text = expanded_article.text
             
-            # loops through the keyword filter set
-            article_keywords = []
-            keyword_found = False
-            for keyword in keywords:
-                if keyword in title or keyword in text:
-                    keyword_found = True
-                    article_keywords.append(keyword)
+            # finds every keyword from the keyword filter set in the title and body text
+            article_keywords = list(matcher.match(title, text))
 
             # skips the article if no keywords are found
-            if keyword_found == False:
+            if len(article_keywords) == 0:
                 logging.info(f"No keywords found for this 股市同學會 post. Title: {title}")
                 continue
             
@@ -417,7 +365,7 @@ def cmoney_scraper(collection, number : int, start_index : int, keywords : set):
 if __name__ == "__main__":
     import os
     from pymongo import MongoClient # for uploading data to MongoDB
-    import csv # to parse the keyword filter set
+    from parsing.keyword_matcher import load_matcher
 
     connection_string : str = os.getenv("MONGODB_CONNECTION_STRING")
     database_name : str = "news_info" # replace with wanted database name
@@ -429,24 +377,8 @@ if __name__ == "__main__":
         print(f"Error creating collection: {e}")
     article_collection = database["article_info"]
 
-    # creates a set of keywords
-    keywords = set()
-    keyword_file_path = os.path.join("data", "keyword_filter_set_zh.csv")
-    with open(keyword_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            keywords.add(row["Keyword"])
-    
-    # creates a set of stock names
-    stock_names = set()
-    stock_file_path = os.path.join("data", "TW_stock_list.csv")
-    with open(stock_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
-        reader = csv.DictReader(file)
-        for row in reader:
-            stock_names.add(row["Cleaned company names"])
-    
-    # adds stock names to the list of keywords searched
-    keywords.update(stock_names)
+    # builds the keyword matcher from the keyword filter set and the stock names
+    matcher = load_matcher()
 
-    cmoney_scraper(article_collection, 31, 0, keywords)
-    PTT_fetch(article_collection, 15, 31, keywords)
\ No newline at end of file
+    cmoney_scraper(article_collection, 31, 0, matcher)
+    PTT_fetch(article_collection, 15, 31, matcher, state_collection = database[feed_state.collection_name])
\ No newline at end of file
@@ -0,0 +1,87 @@
+"""This program contains the shared HTTP client used by every scraper. A single pooled requests Session keeps connections
+to each website alive between requests, limits how many connections are opened to the same website, retries failed
+requests with backoff, and sends a consistent User-Agent and Accept-Encoding header.
+"""
+
+import requests # to get the HTML of websites
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from urllib3.util.request import ACCEPT_ENCODING # encodings urllib3 can decode, includes br if Brotli is installed
+import threading
+import time
+from urllib.parse import urlparse
+from parsing import metrics # for the latency, status, and bytes of requests to each website
+
+user_agent : str = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/126.0 Safari/537.36 news-agent/0.1"
+timeout : float = 15 # seconds to wait for a website to respond
+
+pool_connections : int = 20 # number of websites to keep a connection pool for
+pool_maxsize : int = 8 # max number of open connections to the same website, requests wait for a free connection past this
+
+retry_total : int = 3 # max number of retries for a request
+retry_backoff_factor : float = 0.5 # seconds to wait before the first retry, doubled for each retry after
+retry_status_codes : tuple[int, ...] = (429, 500, 502, 503, 504) # status codes that are retried
+
+session : requests.Session = None # shared session, created on first use
+session_lock = threading.Lock()
+
+request_seconds = metrics.histogram("news_agent_http_request_seconds", "Time taken by HTTP requests to each website, including retries", ["host"])
+responses = metrics.counter("news_agent_http_responses_total", "HTTP responses from each website by status code, or error if the request failed", ["host", "status"])
+response_bytes = metrics.counter("news_agent_http_response_bytes_total", "Bytes of response bodies downloaded from each website, after decompression", ["host"])
+
+# creates a session with pooled connections, retries, and the default headers
+def create_session() -> requests.Session:
+    retry = Retry(
+        total = retry_total,
+        backoff_factor = retry_backoff_factor,
+        status_forcelist = retry_status_codes,
+        allowed_methods = ["HEAD", "GET"],
+        respect_retry_after_header = True,
+        raise_on_status = False
+    )
+    adapter = HTTPAdapter(pool_connections = pool_connections, pool_maxsize = pool_maxsize, max_retries = retry, pool_block = True)
+
+    new_session = requests.Session()
+    new_session.mount("http://", adapter)
+    new_session.mount("https://", adapter)
+    new_session.headers.update({
+        "User-Agent" : user_agent,
+        "Accept-Encoding" : ACCEPT_ENCODING,
+        "Connection" : "keep-alive"
+    })
+    return new_session
+
+# gets the shared session, creating it the first time it is used
+def get_session() -> requests.Session:
+    global session
+    if session is None:
+        with session_lock:
+            if session is None:
+                session = create_session()
+    return session
+
+# sends a GET request through the shared session, recording its latency, status, and size for the website
+def get(url : str, **kwargs) -> requests.Response:
+    kwargs.setdefault("timeout", timeout)
+    host = urlparse(url).netloc
+    start = time.perf_counter()
+    try:
+        response = get_session().get(url, **kwargs)
+    except Exception:
+        responses.inc(host = host, status = "error")
+        raise
+    finally:
+        request_seconds.observe(time.perf_counter() - start, host = host)
+    responses.inc(host = host, status = response.status_code)
+    # the body is already downloaded unless the response is streamed
+    if not kwargs.get("stream", False):
+        response_bytes.inc(len(response.content), host = host)
+    return response
+
+# closes the shared session and its pooled connections
+def close() -> None:
+    global session
+    with session_lock:
+        if session is not None:
+            session.close()
+            session = None
@@ -0,0 +1,99 @@
+"""This program contains the keyword matcher used to tag articles with keywords. The keyword filter set and the stock names
+are compiled once into an Aho-Corasick automaton, so every keyword in an article is found in one pass over the title and
+body instead of checking each keyword one at a time.
+"""
+
+import csv # for parsing the keyword filter set
+import os
+from collections import deque
+
+keyword_file_path : str = os.path.join("data", "keyword_filter_set_zh.csv")
+stock_file_path : str = os.path.join("data", "TW_stock_list.csv")
+stock_category : str = "TW Stock" # category given to the stock names, which have no category in their CSV
+
+class KeywordMatcher:
+    """Finds every keyword of a fixed keyword set in a text with a prebuilt Aho-Corasick automaton."""
+
+    # builds the automaton from a dictionary of keyword -> category
+    def __init__(self, keywords : dict[str, str]):
+        self.categories = dict(keywords)
+        self.transitions : list[dict[str, int]] = [{}] # transitions[state][character] gives the next state
+        self.fail : list[int] = [0] # state to fall back to when a character has no transition
+        self.outputs : list[tuple[str, ...]] = [()] # keywords that end at each state
+
+        # builds the trie of keywords
+        for keyword in self.categories:
+            if keyword == "":
+                continue
+            state = 0
+            for character in keyword:
+                next_state = self.transitions[state].get(character)
+                if next_state is None:
+                    next_state = len(self.transitions)
+                    self.transitions[state][character] = next_state
+                    self.transitions.append({})
+                    self.fail.append(0)
+                    self.outputs.append(())
+                state = next_state
+            self.outputs[state] = (keyword,)
+
+        # sets the fail links breadth first, so each state also outputs the keywords ending at its fail state
+        queue = deque(self.transitions[0].values())
+        while queue:
+            state = queue.popleft()
+            for character, next_state in self.transitions[state].items():
+                queue.append(next_state)
+                fallback = self.fail[state]
+                while fallback != 0 and character not in self.transitions[fallback]:
+                    fallback = self.fail[fallback]
+                self.fail[next_state] = self.transitions[fallback].get(character, 0)
+                self.outputs[next_state] = self.outputs[next_state] + self.outputs[self.fail[next_state]]
+
+    def __len__(self) -> int:
+        return len(self.categories)
+
+    # finds the keywords in one text, adding them to found in the order they first appear
+    def _scan(self, text : str, found : dict[str, str]) -> None:
+        transitions = self.transitions
+        fail = self.fail
+        outputs = self.outputs
+        state = 0
+        for character in text:
+            next_state = transitions[state].get(character)
+            while next_state is None and state != 0:
+                state = fail[state]
+                next_state = transitions[state].get(character)
+            state = 0 if next_state is None else next_state
+            if outputs[state]:
+                for keyword in outputs[state]:
+                    if keyword not in found:
+                        found[keyword] = self.categories[keyword]
+
+    # returns every keyword found in the title or the body text, mapped to its category
+    def match(self, title : str, text : str) -> dict[str, str]:
+        found = {}
+        # the title and body are scanned separately so no keyword is matched across the two
+        self._scan(title, found)
+        self._scan(text, found)
+        return found
+
+# reads the keyword filter set and the stock names into a dictionary of keyword -> category
+def load_keywords() -> dict[str, str]:
+    keywords = {}
+
+    # adds the stock names first so the categories from the keyword filter set take priority
+    with open(stock_file_path, mode = "r", encoding = "utf-8-sig", newline = "") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            keywords[row["Cleaned company names"]] = stock_category
+
+    with open(keyword_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            keywords[row["Keyword"]] = row["Category"]
+
+    return keywords
+
+# builds the keyword matcher for the keyword filter set and stock names
+def load_matcher() -> KeywordMatcher:
+    return KeywordMatcher(load_keywords())
@@ -0,0 +1,87 @@
+"""This program contains the cache of OpenAI responses used by sentiment analysis, stored in MongoDB. A response is cached
+under the hash of the article's normalized title and body, the model name, and the hash of the prompt text, so syndicated
+copies of a story and articles analyzed in earlier runs are not sent to OpenAI again. Only responses that parse are cached. Entries expire after a maximum age
+(with a TTL index) and the oldest entries are removed when the cache grows past a maximum size.
+"""
+
+from datetime import datetime, timezone
+import hashlib
+import logging
+import re
+
+logging.basicConfig(
+    filename = "sentiment.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+collection_name : str = "llm_cache" # name of the collection holding the cached responses
+max_age_seconds : int = 30 * 24 * 60 * 60 # entries older than 30 days are removed by MongoDB
+max_entries : int = 200_000 # the oldest entries are removed past this many
+
+# collapses whitespace so formatting differences between copies of an article do not change its hash
+def normalize(text : str) -> str:
+    return re.sub(r"\s+", " ", text).strip()
+
+def sha256(text : str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+# gets the hash of an article's normalized title and body
+def article_hash(title : str, body : str) -> str:
+    return sha256(normalize(title) + "\n" + normalize(body))
+
+# gets the hash of the prompt text, so changing a prompt does not reuse responses to the old prompt
+def prompt_hash(*prompt_texts : str) -> str:
+    return sha256("\n".join(prompt_texts))
+
+# gets the cache key of a response
+def make_key(article_hash : str, model : str, prompt_hash : str) -> str:
+    return f"{article_hash}:{model}:{prompt_hash}"
+
+class LLMCache:
+    """Cache of response text by key, with hit and miss counters."""
+
+    def __init__(self, cache_collection):
+        self.collection = cache_collection
+        self.collection.create_index("created_at", expireAfterSeconds = max_age_seconds)
+        self.hits = 0
+        self.misses = 0
+
+    # gets the cached response for a key, or None if it is not cached
+    def get(self, key : str) -> str:
+        entry = self.collection.find_one({"_id" : key}, {"response" : 1})
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return entry["response"]
+
+    # caches the response for a key
+    def put(self, key : str, response : str) -> None:
+        try:
+            self.collection.replace_one({"_id" : key}, {"_id" : key, "response" : response, "created_at" : datetime.now(timezone.utc)}, upsert = True)
+        except Exception as e:
+            logging.error(f"Error caching OpenAI response: {e}")
+
+    # removes the entries of the given keys, such as responses that turned out to be invalid
+    def delete(self, keys : list[str]) -> None:
+        try:
+            self.collection.delete_many({"_id" : {"$in" : keys}})
+        except Exception as e:
+            logging.error(f"Error removing OpenAI responses from the cache: {e}")
+
+    # removes the oldest entries past max_entries
+    def evict(self) -> None:
+        extra = self.collection.count_documents({}) - max_entries
+        if extra <= 0:
+            return
+        oldest = [entry["_id"] for entry in self.collection.find({}, {"_id" : 1}).sort("created_at", 1).limit(extra)]
+        self.collection.delete_many({"_id" : {"$in" : oldest}})
+        logging.info(f"Evicted {len(oldest)} entries from the OpenAI response cache")
+
+    # logs the hit and miss counters
+    def log_stats(self) -> None:
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total != 0 else 0
+        logging.info(f"OpenAI response cache hits: {self.hits}, misses: {self.misses}, hit rate: {hit_rate:.2%}")
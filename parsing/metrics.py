@@ -0,0 +1,250 @@
+"""This program contains the metrics kept by every stage of a run: counters, gauges, and latency histograms, each with
+optional labels such as the source or website. The modules that record a metric create it when they are imported, and
+recording a value only takes a lock and a dictionary update. The metrics are served in the Prometheus text format on a
+local /metrics endpoint, and the values recorded during each run of daily_fetch are written to a JSON summary.
+"""
+
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+logging.basicConfig(
+    filename = "main.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+server_host : str = "127.0.0.1" # address the /metrics endpoint listens on, only reachable from this machine by default
+default_buckets : tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300) # seconds
+
+registry : list = [] # every metric, in the order they were created
+run_started_at : datetime = None # time the current run started
+run_start_values : dict = {} # metric name -> values when the current run started
+
+# escapes a label value for the Prometheus text format
+def escape(value : str) -> str:
+    return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+# formats the labels of a sample, like {source="MoneyDJ 理財網",outcome="fetched"}
+def format_labels(names : list[str], values : tuple, extra : str = "") -> str:
+    pairs = [f"{name}=\"{escape(value)}\"" for name, value in zip(names, values)]
+    if extra != "":
+        pairs.append(extra)
+    if len(pairs) == 0:
+        return ""
+    return "{" + ",".join(pairs) + "}"
+
+def format_value(value : float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+class Metric:
+    """Base of the metric types: a name, a help text, label names, and a value for each combination of label values."""
+
+    type_name = ""
+
+    def __init__(self, name : str, help : str, label_names : list[str] = ()):
+        self.name = name
+        self.help = help
+        self.label_names = list(label_names)
+        self.values = {} # label values -> value
+        self.lock = threading.Lock()
+
+    # gets the label values of a sample in the order of the label names
+    def key(self, labels : dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.label_names)
+
+    # copies the values, so they can be compared with the values at the start of a run
+    def copy_values(self) -> dict:
+        with self.lock:
+            return dict(self.values)
+
+    # gets the lines of the metric in the Prometheus text format
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for key, value in self.copy_values().items():
+            lines.append(f"{self.name}{format_labels(self.label_names, key)} {format_value(value)}")
+        return lines
+
+    # gets the values recorded since the start values were copied, as a list of {"labels", "value"}
+    def summarize(self, start_values : dict) -> list[dict]:
+        samples = []
+        for key, value in self.copy_values().items():
+            change = value - start_values.get(key, 0)
+            if change != 0:
+                samples.append({"labels" : dict(zip(self.label_names, key)), "value" : change})
+        return samples
+
+class Counter(Metric):
+    """Total that only goes up, such as the number of articles fetched."""
+
+    type_name = "counter"
+
+    def inc(self, amount : float = 1, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+class Gauge(Metric):
+    """Value that is set to the latest reading, such as the current concurrency limit."""
+
+    type_name = "gauge"
+
+    def set(self, value : float, **labels) -> None:
+        key = self.key(labels)
+        with self.lock:
+            self.values[key] = value
+
+    # gauges are reported as their latest value instead of the change during the run
+    def summarize(self, start_values : dict) -> list[dict]:
+        return [{"labels" : dict(zip(self.label_names, key)), "value" : value} for key, value in self.copy_values().items()]
+
+class Histogram(Metric):
+    """Distribution of observed values, such as request latencies, counted into buckets with their sum and count."""
+
+    type_name = "histogram"
+
+    def __init__(self, name : str, help : str, label_names : list[str] = (), buckets : tuple[float, ...] = default_buckets):
+        super().__init__(name, help, label_names)
+        self.buckets = sorted(buckets)
+
+    def observe(self, value : float, **labels) -> None:
+        key = self.key(labels)
+        bucket = bisect.bisect_left(self.buckets, value) # index of the first bucket the value fits in, len(buckets) for +Inf
+        with self.lock:
+            counts, total, count = self.values.get(key) or ([0] * (len(self.buckets) + 1), 0.0, 0)
+            counts[bucket] += 1
+            self.values[key] = (counts, total + value, count + 1)
+
+    # copies the bucket counts too, since observe changes them in place
+    def copy_values(self) -> dict:
+        with self.lock:
+            return {key : (list(counts), total, count) for key, (counts, total, count) in self.values.items()}
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        for key, (counts, total, count) in self.copy_values().items():
+            # buckets in the text format are cumulative
+            cumulative = 0
+            for upper_bound, bucket_count in zip(self.buckets + [float("inf")], counts):
+                cumulative += bucket_count
+                bound_label = "le=\"" + format_value(upper_bound) + "\""
+                lines.append(f"{self.name}_bucket{format_labels(self.label_names, key, bound_label)} {cumulative}")
+            lines.append(f"{self.name}_sum{format_labels(self.label_names, key)} {format_value(total)}")
+            lines.append(f"{self.name}_count{format_labels(self.label_names, key)} {count}")
+        return lines
+
+    def summarize(self, start_values : dict) -> list[dict]:
+        samples = []
+        for key, (counts, total, count) in self.copy_values().items():
+            start_counts, start_total, start_count = start_values.get(key, ([0] * len(counts), 0.0, 0))
+            count -= start_count
+            if count == 0:
+                continue
+            total -= start_total
+            run_counts = [bucket_count - start_bucket_count for bucket_count, start_bucket_count in zip(counts, start_counts)]
+            samples.append({
+                "labels" : dict(zip(self.label_names, key)),
+                "count" : count,
+                "sum" : total,
+                "mean" : total / count,
+                "buckets" : {format_value(upper_bound) : bucket_count for upper_bound, bucket_count in zip(self.buckets + [float("inf")], run_counts) if bucket_count != 0}
+            })
+        return samples
+
+def counter(name : str, help : str, label_names : list[str] = ()) -> Counter:
+    return register(Counter(name, help, label_names))
+
+def gauge(name : str, help : str, label_names : list[str] = ()) -> Gauge:
+    return register(Gauge(name, help, label_names))
+
+def histogram(name : str, help : str, label_names : list[str] = (), buckets : tuple[float, ...] = default_buckets) -> Histogram:
+    return register(Histogram(name, help, label_names, buckets))
+
+def register(metric : Metric) -> Metric:
+    registry.append(metric)
+    return metric
+
+# metrics recorded by more than one module
+stage_seconds = histogram("news_agent_stage_seconds", "Time taken by each stage of a run", ["stage"])
+source_seconds = histogram("news_agent_source_fetch_seconds", "Time taken to fetch the articles of each source", ["source"])
+articles = counter("news_agent_articles_total", "Articles checked by the scrapers, by source and by whether they were fetched or why they were skipped", ["source", "outcome"])
+dedup_pairs = counter("news_agent_dedup_pairs_compared_total", "Pairs of articles compared during deduplication, every pair or only LSH candidates", ["method"])
+duplicates = counter("news_agent_duplicates_total", "Articles found to be duplicates, by the deduplication stage that found them", ["stage"])
+
+# gets every metric in the Prometheus text format
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+# starts serving the metrics at http://<server_host>:<port>/metrics in a background thread
+# returns None if the port cannot be used, such as when another program is listening on it, since the endpoint is optional
+def start_server(port : int) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    try:
+        server = ThreadingHTTPServer((server_host, port), Handler)
+    except OSError as e:
+        logging.error(f"Metrics endpoint could not be started on {server_host}:{port}, running without it. Error msg: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target = server.serve_forever, name = "metrics-server", daemon = True).start()
+    logging.info(f"Serving metrics at http://{server_host}:{port}/metrics")
+    return server
+
+# marks the start of a run, so its summary only has the values recorded after this
+def start_run() -> None:
+    global run_started_at
+    run_started_at = datetime.now(timezone.utc)
+    run_start_values.clear()
+    for metric in registry:
+        run_start_values[metric.name] = metric.copy_values()
+
+# gets the values recorded since start_run, by metric name
+def run_summary() -> dict:
+    ended_at = datetime.now(timezone.utc)
+    summary = {
+        "started_at" : run_started_at.isoformat() if run_started_at is not None else None,
+        "ended_at" : ended_at.isoformat(),
+        "metrics" : {}
+    }
+    for metric in registry:
+        samples = metric.summarize(run_start_values.get(metric.name, {}))
+        if len(samples) != 0:
+            summary["metrics"][metric.name] = {"type" : metric.type_name, "help" : metric.help, "samples" : samples}
+    return summary
+
+# writes the summary of the current run to a JSON file in a directory, returning the path of the file
+def write_run_summary(directory : str) -> str:
+    os.makedirs(directory, exist_ok = True)
+    path = os.path.join(directory, f"run-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    try:
+        with open(path, "w", encoding = "utf-8") as file:
+            json.dump(run_summary(), file, ensure_ascii = False, indent = 2)
+    except Exception as e:
+        logging.error(f"Error writing run metrics to {path}: {e}")
+        return None
+    logging.info(f"Run metrics written to {path}")
+    return path
@@ -0,0 +1,87 @@
+"""This program contains a MinHash/LSH index of accepted articles, stored in MongoDB so it persists between runs. Each
+article is reduced to a MinHash signature of its character shingles, and the signature is split into bands. Articles that
+share a band are candidate duplicates, so a new article is only compared to the few articles it shares a band with
+instead of the whole archive.
+"""
+
+import numpy as np
+import zlib
+from parsing import metrics # for the number of candidates compared
+
+collection_name : str = "minhash_index" # name of the collection holding the index
+num_permutations : int = 128 # length of each MinHash signature
+num_bands : int = 16 # the signature is split into 16 bands of 8 rows, catching pairs with about 0.7 Jaccard similarity or more
+rows_per_band : int = num_permutations // num_bands
+shingle_size : int = 3 # number of characters in each shingle, suited to chinese text with no spaces between words
+
+prime : int = 4294967311 # smallest prime above 2^32, the largest shingle hash
+permutation_seed : int = 42 # fixed so signatures saved in earlier runs stay comparable
+_rng = np.random.default_rng(permutation_seed)
+_a = _rng.integers(1, 2 ** 31, size = num_permutations, dtype = np.uint64)
+_b = _rng.integers(0, 2 ** 31, size = num_permutations, dtype = np.uint64)
+
+# gets the hash of every shingle in a text
+def shingle_hashes(text : str) -> np.ndarray:
+    if len(text) < shingle_size:
+        shingles = {text}
+    else:
+        shingles = {text[i:i + shingle_size] for i in range(len(text) - shingle_size + 1)}
+    return np.fromiter((zlib.crc32(shingle.encode("utf-8")) for shingle in shingles), dtype = np.uint64, count = len(shingles))
+
+# gets the MinHash signature of a text
+def signature(text : str) -> np.ndarray:
+    hashes = shingle_hashes(text)
+    # applies every permutation to every shingle hash and keeps the smallest value for each permutation
+    permuted = (np.outer(hashes, _a) + _b) % prime
+    return permuted.min(axis = 0)
+
+# gets the keys of each band of a signature, used to look up candidate duplicates
+def band_keys(article_signature : np.ndarray) -> list[str]:
+    keys = []
+    for band in range(num_bands):
+        rows = article_signature[band * rows_per_band:(band + 1) * rows_per_band]
+        keys.append(f"{band}:{zlib.crc32(rows.tobytes()):08x}")
+    return keys
+
+# estimates the Jaccard similarity of two articles from their signatures
+def similarity(signature_1 : np.ndarray, signature_2 : np.ndarray) -> float:
+    return float(np.mean(signature_1 == signature_2))
+
+class MinHashIndex:
+    """MinHash/LSH index of accepted articles, with one document per article holding its signature and band keys."""
+
+    def __init__(self, index_collection):
+        self.collection = index_collection
+        self.collection.create_index("bands") # multikey index, so each band key is looked up directly
+
+    def __len__(self) -> int:
+        return self.collection.count_documents({})
+
+    # gets the _id of the newest article in the index, or None if the index is empty
+    def newest_id(self):
+        newest = self.collection.find_one({}, {"_id" : 1}, sort = [("_id", -1)])
+        if newest is None:
+            return None
+        return newest["_id"]
+
+    # finds the indexed articles that share a band with the signature and are at least as similar as the threshold
+    # returns a list of (article _id, estimated similarity), most similar first
+    def query(self, article_signature : np.ndarray, threshold : float) -> list[tuple]:
+        matches = []
+        compared = 0
+        for candidate in self.collection.find({"bands" : {"$in" : band_keys(article_signature)}}, {"signature" : 1}):
+            compared += 1
+            score = similarity(article_signature, np.array(candidate["signature"], dtype = np.uint64))
+            if score >= threshold:
+                matches.append((candidate["_id"], score))
+        metrics.dedup_pairs.inc(compared, method = "minhash")
+        matches.sort(key = lambda match: match[1], reverse = True)
+        return matches
+
+    # adds an accepted article to the index, keyed by its MongoDB _id
+    def add(self, article_id, article_signature : np.ndarray) -> None:
+        self.collection.replace_one(
+            {"_id" : article_id},
+            {"_id" : article_id, "signature" : article_signature.tolist(), "bands" : band_keys(article_signature)},
+            upsert = True
+        )
@@ -0,0 +1,155 @@
+"""This program runs the stages after scraping as concurrent stages of a pipeline, so articles are deduplicated, stored,
+and analyzed while the rest are still being scraped. Scrapers submit each accepted article as soon as it is extracted.
+A deduplication thread checks it against the MinHash/LSH index of stored articles, stores it with the next id if it is
+not a duplicate, and passes it on to sentiment analysis, which runs in its own thread. The stages are joined by bounded
+queues, so a slow stage makes the stages before it wait instead of letting articles pile up in memory.
+"""
+
+import logging
+import queue
+import statistics
+import threading
+import time
+from parsing import deduplication
+from parsing import minhash_index
+from parsing import sentiment_analysis
+from parsing import metrics # for the pipeline's latency and duplicates
+
+logging.basicConfig(
+    filename = "main.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+stage_queue_size : int = 20 # max articles waiting between two stages
+dedup_threshold : float = 1.0 # estimated Jaccard similarity at or above which an article is a duplicate of a stored one
+
+latency_seconds = metrics.histogram("news_agent_pipeline_latency_seconds", "Time from an article being scraped to its sentiment being stored")
+
+class ArticlePipeline:
+    """Deduplication, storage, and sentiment analysis stages fed by scrapers through submit."""
+
+    def __init__(self, article_collection, sentiment_collection, entity_collection, confidence_collection, index_collection, start_index : int,
+                 threshold : float = dedup_threshold, consolidated : bool = False, cache_collection = None):
+        self.article_collection = article_collection
+        self.analysis_collections = [sentiment_collection, entity_collection, confidence_collection]
+        self.index = minhash_index.MinHashIndex(index_collection)
+        self.next_id = start_index # id of the next article stored
+        self.threshold = threshold
+        self.consolidated = consolidated
+        self.cache_collection = cache_collection
+        self.dedup_queue = queue.Queue(maxsize = stage_queue_size) # (time submitted, article) waiting for deduplication
+        self.analysis_queue = queue.Queue(maxsize = stage_queue_size) # (id, title, body) waiting for sentiment analysis
+        self.submitted_at = {} # id -> time.monotonic() when the article was submitted, until its results are stored
+        self.latencies = [] # seconds from each article's submission to its results being stored
+        self.start_time = None
+        self.accepted = 0
+        self.duplicates = 0
+        self.dropped = 0 # articles submitted but not stored: duplicates, failed uploads, and errors
+        self.submitted_urls = set() # urls of every article submitted, so scrapers can skip them before they are stored
+        self.submitted_titles = set() # titles of every article submitted
+        self.dedup_thread = threading.Thread(target = self.deduplicate, name = "pipeline-dedup", daemon = True)
+        self.analysis_thread = threading.Thread(target = self.analyze, name = "pipeline-analysis", daemon = True)
+
+    def start(self) -> "ArticlePipeline":
+        self.start_time = time.perf_counter()
+        self.dedup_thread.start()
+        self.analysis_thread.start()
+        return self
+
+    # passes a scraped article to the pipeline, waiting if deduplication is behind
+    def submit(self, article : dict) -> None:
+        self.submitted_urls.add(article.get("url"))
+        self.submitted_titles.add(article.get("title"))
+        self.dedup_queue.put((time.monotonic(), article))
+
+    # waits until every article submitted so far has been stored or dropped, so the number dropped is up to date
+    def wait_for_deduplication(self) -> None:
+        self.dedup_queue.join()
+
+    # deduplication stage: stores each article that is not a duplicate and passes it on to sentiment analysis
+    # an error with one article is logged and the article skipped, so the stage keeps taking articles until it gets None
+    def deduplicate(self) -> None:
+        try:
+            while True:
+                item = self.dedup_queue.get()
+                if item is None:
+                    break
+                submitted_at, article = item
+                stored = False
+                try:
+                    stored = self.deduplicate_article(submitted_at, article)
+                except Exception as e:
+                    logging.error(f"Pipeline deduplication failed, article skipped. Link: {article.get('url')}. Error msg: {e}")
+                finally:
+                    if not stored:
+                        self.dropped += 1
+                    self.dedup_queue.task_done()
+        finally:
+            self.analysis_queue.put(None)
+
+    # stores an article if it is not a duplicate of a stored one and passes it on to sentiment analysis
+    # returns whether the article was stored
+    def deduplicate_article(self, submitted_at : float, article : dict) -> bool:
+        start = time.perf_counter()
+        article_signature = minhash_index.signature(deduplication.clean(article["body"]))
+        matches = self.index.query(article_signature, self.threshold)
+        metrics.stage_seconds.observe(time.perf_counter() - start, stage = "pipeline_deduplication")
+        if len(matches) != 0:
+            logging.info(f"article {article['title']} is a duplicate of {matches[0][0]} (estimated similarity {matches[0][1]}), skipped")
+            self.duplicates += 1
+            metrics.duplicates.inc(stage = "pipeline")
+            return False
+
+        article["id"] = self.next_id
+        try:
+            self.article_collection.insert_one(article)
+        except Exception as e:
+            logging.error(f"Upload to MongoDB failed. Link: {article.get('url')}. Error msg: {e}")
+            return False
+        self.next_id += 1
+        self.accepted += 1
+        # the article is stored, so it is still analyzed if its signature could not be added to the index
+        try:
+            self.index.add(article["_id"], article_signature)
+        except Exception as e:
+            logging.error(f"Adding article to the MinHash index failed. Link: {article.get('url')}. Error msg: {e}")
+        self.submitted_at[article["id"]] = submitted_at
+        self.analysis_queue.put((article["id"], article["title"], article["body"]))
+        return True
+
+    # sentiment analysis stage: analyzes the articles from the analysis queue until it gets None
+    def analyze(self) -> None:
+        try:
+            sentiment_analysis.start_async(None, *self.analysis_collections, self.next_id, self.consolidated, self.cache_collection,
+                                           source = self.analysis_queue, on_insert = self.record_stored)
+        except Exception as e:
+            logging.error(f"Pipeline sentiment analysis stopped: {e}")
+            # keeps taking articles so deduplication does not wait forever on a full queue
+            while True:
+                try:
+                    if self.analysis_queue.get(timeout = 1) is None:
+                        break
+                except queue.Empty:
+                    if not self.dedup_thread.is_alive():
+                        break
+
+    # records how long the articles of an inserted batch of results took to get through the pipeline
+    def record_stored(self, ids : list[int]) -> None:
+        now = time.monotonic()
+        for id in ids:
+            submitted_at = self.submitted_at.pop(id, None)
+            if submitted_at is not None:
+                self.latencies.append(now - submitted_at)
+                latency_seconds.observe(now - submitted_at)
+
+    # waits for every submitted article to be analyzed, then logs the pipeline's totals
+    def close(self) -> None:
+        self.dedup_queue.put(None)
+        self.dedup_thread.join()
+        self.analysis_thread.join()
+        end = time.perf_counter()
+        logging.info(f"Pipeline stored {self.accepted} articles, skipped {self.duplicates} duplicates, in {end - self.start_time} seconds")
+        if len(self.latencies) != 0:
+            logging.info(f"Seconds from scraping to stored sentiment: median {statistics.median(self.latencies):.2f}, max {max(self.latencies):.2f}")
@@ -0,0 +1,191 @@
+"""This program contains the optional profiling mode for runs of daily_fetch, turned on with the NEWS_AGENT_PROFILE
+environment variable or the --profile flag of main.py. The main stages of a run (fetch, PTT_fetch, the deduplication
+functions, and start_async) are marked with profile_stage. When profiling is on, each stage is run under cProfile, and a
+background thread samples the stack of every thread running a stage, so each stage gets a .pstats file and a .folded file
+of stack samples that flamegraph.pl, speedscope, or inferno can draw. Functions a stage hands to a thread pool are wrapped
+with stage_task, so the worker threads running them are profiled and sampled as part of the stage too. When profiling is
+off, a marked stage only checks one flag before running.
+"""
+
+import cProfile
+import functools
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+from collections import Counter
+
+logging.basicConfig(
+    filename = "main.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+enabled : bool = os.getenv("NEWS_AGENT_PROFILE", "").lower() not in ("", "0", "false", "no") # profiles every run when True
+profile_directory : str = "profiles" # each profiled run writes its files to a folder in here
+sample_interval : float = 0.005 # seconds between stack samples
+top_functions : int = 25 # functions listed for each stage in the run's summary
+
+class StageProfile:
+    """cProfile statistics and stack samples of one stage, kept over every call of the stage in a run."""
+
+    def __init__(self, stage : str):
+        self.stage = stage
+        self.profiler = cProfile.Profile()
+        self.stacks = Counter() # folded stack -> number of samples
+        self.calls = 0
+        self.seconds = 0.0
+        self.active = False # whether the stage is being profiled, so calls made inside it or at the same time are not
+        self.task_profilers = {} # id of each worker thread that ran a task of the stage -> its profiler
+        self.lock = threading.Lock()
+
+    # gets the profiler of a worker thread, since one cProfile profiler cannot follow several threads at once
+    def task_profiler(self, thread_id : int) -> cProfile.Profile:
+        with self.lock:
+            if thread_id not in self.task_profilers:
+                self.task_profilers[thread_id] = cProfile.Profile()
+            return self.task_profilers[thread_id]
+
+    # gets the statistics of the stage's thread and every worker thread that ran one of its tasks
+    def stats(self, stream = None) -> pstats.Stats:
+        stats = pstats.Stats(self.profiler, stream = stream)
+        for profiler in self.task_profilers.values():
+            stats.add(profiler)
+        return stats
+
+stage_profiles : dict[str, StageProfile] = {} # stage -> its profile in the current run
+sampled_threads : dict[int, tuple] = {} # id of each thread running a profiled stage or task -> (stage, frame of the wrapper)
+run_directory : str = None # folder of the current profiled run, None when no run is being profiled
+sampler_stop = threading.Event()
+sampler_thread : threading.Thread = None
+
+# turns profiling on for the runs started after this
+def enable() -> None:
+    global enabled
+    enabled = True
+
+# gets the name of a frame's function in a folded stack, like "fetch (main.py:150)"
+def frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})".replace(";", ":")
+
+# adds the current stack of every thread running a profiled stage to its stage's samples, until sampler_stop is set
+def sample_stacks() -> None:
+    while not sampler_stop.wait(sample_interval):
+        frames = sys._current_frames()
+        for thread_id, (stage, stage_frame) in list(sampled_threads.items()):
+            frame = frames.get(thread_id)
+            if frame is None:
+                continue
+            # keeps the frames from the stage's function inwards
+            names = []
+            while frame is not None and frame is not stage_frame:
+                names.append(frame_name(frame))
+                frame = frame.f_back
+            names.append(stage)
+            stage_profiles[stage].stacks[";".join(reversed(names))] += 1
+
+# starts profiling a run, if profiling is on
+def start_run() -> None:
+    global run_directory, sampler_thread
+    if not enabled:
+        return
+    run_directory = os.path.join(profile_directory, time.strftime("%Y%m%d-%H%M%S"))
+    stage_profiles.clear()
+    sampler_stop.clear()
+    sampler_thread = threading.Thread(target = sample_stacks, name = "profile-sampler", daemon = True)
+    sampler_thread.start()
+    logging.info(f"Profiling this run, files will be written to {run_directory}")
+
+# stops profiling the current run and writes the files of each stage, returning the folder they are in
+def finish_run() -> str:
+    global run_directory, sampler_thread
+    if run_directory is None:
+        return None
+    sampler_stop.set()
+    sampler_thread.join()
+    sampler_thread = None
+    directory = run_directory
+    run_directory = None
+
+    os.makedirs(directory, exist_ok = True)
+    summary = []
+    for stage, profile in stage_profiles.items():
+        summary.append(f"{stage}: {profile.calls} calls, {profile.seconds:.2f} seconds, {len(profile.task_profilers)} worker threads, "
+                       f"{sum(profile.stacks.values())} stack samples")
+        try:
+            profile.stats().dump_stats(os.path.join(directory, f"{stage}.pstats"))
+            with open(os.path.join(directory, f"{stage}.folded"), "w", encoding = "utf-8") as file:
+                for stack, count in profile.stacks.most_common():
+                    file.write(f"{stack} {count}\n")
+            # lists the functions that took the most time, including the functions they called
+            stream = io.StringIO()
+            profile.stats(stream).sort_stats("cumulative").print_stats(top_functions)
+            summary.append(stream.getvalue())
+        except Exception as e:
+            logging.error(f"Error writing the profile of {stage}: {e}")
+    with open(os.path.join(directory, "summary.txt"), "w", encoding = "utf-8") as file:
+        file.write("\n".join(summary))
+    logging.info(f"Profiles of this run written to {directory}")
+    return directory
+
+# marks a function as a stage of a run, which is profiled when the run is being profiled
+def profile_stage(stage : str):
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if run_directory is None:
+                return function(*args, **kwargs)
+
+            profile = stage_profiles.get(stage)
+            if profile is None:
+                profile = stage_profiles.setdefault(stage, StageProfile(stage))
+            with profile.lock:
+                # cProfile can only profile one call of a stage at a time
+                already_active = profile.active
+                profile.active = True
+            if already_active:
+                return function(*args, **kwargs)
+
+            thread_id = threading.get_ident()
+            sampled_threads[thread_id] = (stage, sys._getframe())
+            start = time.perf_counter()
+            profile.profiler.enable()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profile.profiler.disable()
+                sampled_threads.pop(thread_id, None)
+                profile.calls += 1
+                profile.seconds += time.perf_counter() - start
+                profile.active = False
+        return wrapper
+    return decorator
+
+# wraps a function a stage hands to a thread pool, so the worker thread running it is profiled and sampled under the stage
+# the function is returned as it is when the calling thread is not running a profiled stage
+def stage_task(function):
+    running = sampled_threads.get(threading.get_ident()) if run_directory is not None else None
+    if running is None:
+        return function
+    profile = stage_profiles[running[0]]
+
+    @functools.wraps(function)
+    def task(*args, **kwargs):
+        thread_id = threading.get_ident()
+        # runs the function as it is in a thread that is already profiled, such as when the pool runs it in the caller
+        if thread_id in sampled_threads:
+            return function(*args, **kwargs)
+        profiler = profile.task_profiler(thread_id)
+        sampled_threads[thread_id] = (profile.stage, sys._getframe())
+        profiler.enable()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            profiler.disable()
+            sampled_threads.pop(thread_id, None)
+    return task
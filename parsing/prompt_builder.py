@@ -0,0 +1,104 @@
+"""This program builds the prompts sent to OpenAI for sentiment analysis. The static instructions of each prompt are
+always sent first, as the system prompt, and the article is sent after them, so every request of a kind starts with the
+same text and OpenAI can reuse its cached processing of that prefix. Tokens are counted locally, article bodies longer
+than a token budget are cut at the last full sentence that fits, and the tokens trimmed and sent in repeated prefixes are
+counted for each run.
+"""
+
+import logging
+import re
+
+logging.basicConfig(
+    filename = "sentiment.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+max_body_tokens : int = 2000 # article bodies are trimmed to about this many tokens
+min_cached_prefix_tokens : int = 1024 # OpenAI only caches prompt prefixes of at least this many tokens
+
+# splits text after sentence-ending punctuation and line breaks, keeping them with the sentence before
+sentence_pattern = re.compile(r"[^。！？!?\n]+[。！？!?」』”\"]*\n*|\n+")
+
+# estimates the number of tokens in a text, counting each CJK character as one token and every 4 other characters as one
+def count_tokens(text : str) -> int:
+    cjk = sum(1 for character in text if "一" <= character <= "鿿" or "　" <= character <= "〿" or "＀" <= character <= "￯")
+    return cjk + (len(text) - cjk + 3) // 4
+
+# trims text to at most budget tokens, ending at the last full sentence that fits
+# if even the first sentence is too long, it is cut at the most characters that fit
+def trim_to_budget(text : str, budget : int) -> str:
+    if count_tokens(text) <= budget:
+        return text
+
+    kept = []
+    used = 0
+    for sentence in sentence_pattern.findall(text):
+        tokens = count_tokens(sentence)
+        if used + tokens > budget:
+            break
+        kept.append(sentence)
+        used += tokens
+    if len(kept) != 0:
+        return "".join(kept).rstrip()
+
+    # finds the longest prefix within the budget by binary search
+    low, high = 0, len(text)
+    while low < high:
+        middle = (low + high + 1) // 2
+        if count_tokens(text[:middle]) <= budget:
+            low = middle
+        else:
+            high = middle - 1
+    return text[:low]
+
+class PromptBuilder:
+    """Builds [system prompt, user prompt] pairs for articles and counts the tokens trimmed and sent in repeated prefixes."""
+
+    # prompts maps each kind of prompt to its (static system prompt, user prompt template with {headline} and {content})
+    def __init__(self, prompts : dict[str, tuple[str, str]], body_budget : int = max_body_tokens):
+        self.prompts = prompts
+        self.body_budget = body_budget
+        self.prefix_tokens = {kind : count_tokens(system) for kind, (system, _) in prompts.items()}
+        self.sent_kinds = set() # kinds of prompt sent at least once, so later ones repeat a prefix already sent
+        self.articles = 0
+        self.trimmed_articles = 0
+        self.body_tokens = 0 # tokens of the bodies before trimming
+        self.trimmed_tokens = 0 # tokens removed by trimming, counted once for every prompt that includes the body
+        self.repeated_prefix_tokens = 0 # tokens of static prefixes already sent earlier in the run
+        self.cacheable_prefix_tokens = 0 # repeated prefix tokens in prefixes long enough for OpenAI to cache
+
+    # trims an article's body to the budget, counting the tokens removed
+    def trim(self, content : str, num_prompts : int = 1) -> str:
+        tokens = count_tokens(content)
+        self.articles += 1
+        self.body_tokens += tokens
+        if tokens <= self.body_budget:
+            return content
+        trimmed = trim_to_budget(content, self.body_budget)
+        self.trimmed_articles += 1
+        self.trimmed_tokens += (tokens - count_tokens(trimmed)) * num_prompts
+        return trimmed
+
+    # builds the [system prompt, user prompt] of each kind of prompt for an article, with its body trimmed to the budget
+    # returns the trimmed body and the prompts
+    def build(self, headline : str, content : str, kinds : list[str]) -> tuple[str, list[list[str]]]:
+        content = self.trim(content, len(kinds))
+        prompts = []
+        for kind in kinds:
+            system, template = self.prompts[kind]
+            if kind in self.sent_kinds:
+                self.repeated_prefix_tokens += self.prefix_tokens[kind]
+                if self.prefix_tokens[kind] >= min_cached_prefix_tokens:
+                    self.cacheable_prefix_tokens += self.prefix_tokens[kind]
+            self.sent_kinds.add(kind)
+            prompts.append([system, template.format(headline = headline, content = content)])
+        return content, prompts
+
+    # logs the tokens trimmed and the tokens sent in repeated prefixes
+    def log_stats(self) -> None:
+        logging.info(f"Prompt bodies: {self.articles} articles, {self.body_tokens} tokens, {self.trimmed_articles} trimmed to {self.body_budget} tokens, "
+                     f"{self.trimmed_tokens} tokens saved by trimming")
+        logging.info(f"Static prompt prefixes: {self.repeated_prefix_tokens} repeated tokens, {self.cacheable_prefix_tokens} long enough for OpenAI to cache "
+                     f"(prefixes of {self.prefix_tokens})")
@@ -3,10 +3,19 @@ output for each article. Uses asyncio to run prompts concurrently.
 """
 
 import asyncio
-from openai import OpenAI, APITimeoutError, APIConnectionError, AsyncOpenAI
+from openai import OpenAI, APITimeoutError, APIConnectionError, AsyncOpenAI, RateLimitError, InternalServerError
+from email.utils import parsedate_to_datetime
 import json
+import os
+import queue
+import random
 import time
 import logging
+from parsing import llm_cache # for caching OpenAI responses
+from parsing.adaptive_limiter import AdaptiveLimiter # for adjusting the number of concurrent OpenAI requests
+from parsing.prompt_builder import PromptBuilder # for building prompts within a token budget
+from parsing import metrics # for the latency, outcome, and tokens of OpenAI requests
+from parsing import profiling # for profiling start_async as a stage of a run
 
 logging.basicConfig(
     filename = "sentiment.log", 
@@ -15,6 +24,8 @@ logging.basicConfig(
     format = "%(asctime)s - %(levelname)s - %(message)s"
 )
 
+model_name : str = "gpt-4.1-nano"
+
 event_type_list : list[str] = [
     "earnings",
     "policy",
@@ -45,7 +56,18 @@ Directional market implication is proven when at least 2 of the 3 following cond
 -If there is directional market implication proven and it is clearly positive, label the sentiment tone as "bullish". If there is directional market implication proven and it is clearly negative, label the sentiment tone as "bearish". 
 -If none of these conditions apply, make your own judgement and select the sentiment tone that best applies."""
 
-confidence_prompt : str = """
+confidence_questions : str = """1. Is the sentiment direction (positive/negative) clearly implied by the article?
+2. Does the article mention a price movement or valuation change?
+3. Is there reference to performance versus expectation (e.g. beats, misses)?
+4. Does the article include strong directional wording (e.g. surges, collapses)?
+5. Is the event covered relevant to a broader market, not just internal news?
+6. Is there a quote or opinion from a named source (e.g. analyst, executive)?
+7. Would most readers interpret this as having market impact?
+8. Is the timing of the event recent (within the past 72 hours)?
+9. Are there multiple supporting data points or factual references?
+10. Would this article be relevant for a trading alert?"""
+
+confidence_prompt : str = f"""
 
 To determine the confidence score: 
 
@@ -57,22 +79,13 @@ Then, calculate your confidence score as:
 (Number of "Yes" answers) ÷ 10 → Return a float between 0.0 and 1.0
 
 Here are your questions:
-1. Is the sentiment direction (positive/negative) clearly implied by the article?
-2. Does the article mention a price movement or valuation change?
-3. Is there reference to performance versus expectation (e.g. beats, misses)?
-4. Does the article include strong directional wording (e.g. surges, collapses)?
-5. Is the event covered relevant to a broader market, not just internal news?
-6. Is there a quote or opinion from a named source (e.g. analyst, executive)?
-7. Would most readers interpret this as having market impact?
-8. Is the timing of the event recent (within the past 72 hours)?
-9. Are there multiple supporting data points or factual references?
-10. Would this article be relevant for a trading alert?
+{confidence_questions}
 After answering, output the total number of "Yes", and return the confidence score as a float between 0.0 and 1.0. Format the output as a json file, in the following format:
 
-{
+{{
     "yes_answers" : "..."
     "confidence_score" : "..."
-}"""
+}}"""
 
 entities_prompt : str = """Extract all named entities mentioned in the following financial article.
 
@@ -116,69 +129,320 @@ system_prompt : str = f"""You are a financial news analyst. Given a headline and
 Return all results in the following JSON format:
 {output_json_format}"""
 
+consolidated_output_json_format : str = """
+{
+    "tone" : "...",
+    "topic": "...",
+    "event_type": "...",
+    "summary": "...",
+    "evidence": "...",
+    "answers": ["Yes", "No", ...],
+    "yes_answers": ...,
+    "confidence_score": ...,
+    "entities": ["TSMC", "NVIDIA", "Fed", "Elon Musk"]
+}"""
+
+# asks for the sentiment, confidence, and entity results in one response, so the article is only sent once
+consolidated_system_prompt : str = f"""You are a financial news analyst. Given a headline and its content, determine:
+- Overall sentiment tone: bullish / bearish / neutral {tone_prompt} 
+- Topic classification (e.g., semiconductor, Fed policy, trade war)
+- Event type (e.g., earnings, regulation, M&A, downgrade) {event_type_prompt}
+- A one-sentence explanation summarizing your reasoning
+- A sentence quoted from the news that best supports your sentiment decision
+- Answers to the following 10 yes/no questions, assessing how confident you are in your sentiment classification. Answer each question with "Yes" or "No" only:
+{confidence_questions}
+- The total number of "Yes" answers, and the confidence score calculated as (Number of "Yes" answers) ÷ 10, a float between 0.0 and 1.0
+- All named entities mentioned in the article, including company names, public institutions, and key executives or analysts
+
+Return all results in the following JSON format:
+{consolidated_output_json_format}"""
+
+# templates for the parts of the prompts that include the article
+content_prompt_template : str = "Give me the output for an article using the language of the article, for which the headline is: {headline}, and the content is: {content}"
+article_prompt_template : str = "The headline is {headline}, and the content is: {content}"
+
+# the confidence and entity prompts start with their static instructions and end with the article, like the sentiment
+# prompt, so every request of a kind begins with the same text that OpenAI can cache
+analyst_prompt : str = "You are a financial news analyst analyzing an article."
+confidence_system_prompt : str = analyst_prompt + confidence_prompt
+entities_system_prompt : str = analyst_prompt + "\n\n" + entities_prompt
+
+# static system prompt and article prompt template of each kind of prompt
+prompt_layouts : dict[str, tuple[str, str]] = {
+    "sentiment" : (system_prompt, content_prompt_template),
+    "confidence" : (confidence_system_prompt, article_prompt_template),
+    "entities" : (entities_system_prompt, article_prompt_template),
+    "consolidated" : (consolidated_system_prompt, content_prompt_template)
+}
+
 headline_content_prompt : str = """Return the headline and content in the following format:
 News headline: {{title}}
 News content: {{content}}"""
 
 
-# async func to get OpenAI response
-async def get_async_response(semaphore, client, system_prompt, content) -> str:
-    async with semaphore:
+initial_concurrent_requests : int = 10 # OpenAI requests allowed at once at the start of a run
+max_concurrent_requests : int = 64 # the limit on concurrent requests grows while requests succeed, up to this many
+request_timeout : float = 120.0 # max seconds for one OpenAI request
+max_retries : int = 6 # max retries of a request after rate limit errors, timeouts, connection errors, and server errors
+base_backoff_seconds : float = 1.0 # the max wait before a retry starts at this and doubles with every retry
+max_backoff_seconds : float = 60.0
+article_deadline_seconds : float = 600.0 # an article's requests are not retried past this many seconds after it is started
+
+# gets the seconds to wait from the Retry-After headers of a response, or None if it has none
+def retry_after_seconds(response) -> float:
+    if response is None:
+        return None
+    retry_after_ms = response.headers.get("retry-after-ms")
+    if retry_after_ms is not None:
         try:
-            response =  await client.chat.completions.create(
-                        model = "gpt-4.1-nano",
-                        messages = [
-                            {"role": "system", "content": system_prompt},
-                            {"role": "user", "content": content},
-                        ],
-                        response_format = {"type": "json_object"},
-                        timeout = 120.0
-                    )
-            return response.choices[0].message.content
-        except Exception as e:
-            logging.error(f"error getting openai response: {e}")
-            return None
-
-# runs OpenAI prompts for documents concurrently to speed up the process
-async def async_analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index : int):
-    prompts = [] # holds each article's 3 unique prompts
-    documents = article_collection.find({})
-    semaphore = asyncio.Semaphore(10) # sets to max 10 concurrent runs
-    client = AsyncOpenAI()
-
-    # creates a list of each document's 3 unique prompts
-    for doc in documents[start_index:]:
-        headline = doc["title"]
-        content = doc["body"]
-        content_prompt_sentiment = f"Give me the output for an article using the language of the article, for which the headline is: {headline}, and the content is: {content}"
-        system_prompt_2 = f"You are a financial news analyst analyzing an article. The headline is {headline}, and the content is: {content}"
-        prompts.extend([[system_prompt, content_prompt_sentiment], [system_prompt_2, confidence_prompt], [system_prompt_2, entities_prompt]])
-
-
-    # calls get_async_response to create the task for each article
-    tasks = [get_async_response(semaphore, client, prompt[0], prompt[1]) for prompt in prompts]
-    
-    # runs the tasks
-    results = await asyncio.gather(*tasks)
-
-    # parses each result into python format
-    parsed_results = [json.loads(result) for result in results]
-    
-    # splits the results into their category
-    sentiment_responses = parsed_results[0::3]
-    confidence_responses = parsed_results[1::3]
-    entity_responses = parsed_results[2::3]
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+    retry_after = response.headers.get("retry-after")
+    if retry_after is None:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+    # Retry-After can also be an HTTP date
+    try:
+        return max(0.0, parsedate_to_datetime(retry_after).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+# gets the wait before a retry: a random time up to an exponentially growing max (full jitter), and at least retry_after
+# attempt counts from 1 for the first retry, whose max wait is base_backoff_seconds
+def backoff_delay(attempt : int, retry_after : float = None) -> float:
+    delay = random.uniform(0, min(max_backoff_seconds, base_backoff_seconds * 2 ** (attempt - 1)))
+    if retry_after is not None:
+        delay = retry_after + random.uniform(0, base_backoff_seconds)
+    return delay
+
+llm_request_seconds = metrics.histogram("news_agent_llm_request_seconds", "Time taken by successful OpenAI requests", ["model"])
+llm_requests = metrics.counter("news_agent_llm_requests_total", "OpenAI requests by outcome (ok, cache_hit, rate_limited, overloaded, connection_error, failed, gave_up)", ["outcome"])
+llm_tokens = metrics.counter("news_agent_llm_tokens_total", "Tokens used by OpenAI requests (prompt, completion, and cached_prompt, which is part of prompt)", ["model", "kind"])
+llm_concurrency_limit = metrics.gauge("news_agent_llm_concurrency_limit", "Current limit of concurrent OpenAI requests")
+
+# records the tokens used by an OpenAI response
+def record_usage(response) -> None:
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    llm_tokens.inc(usage.prompt_tokens or 0, model = model_name, kind = "prompt")
+    llm_tokens.inc(usage.completion_tokens or 0, model = model_name, kind = "completion")
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and details.cached_tokens:
+        llm_tokens.inc(details.cached_tokens, model = model_name, kind = "cached_prompt")
 
-    for index, (sentiment, confidence, entities) in enumerate(zip(sentiment_responses, confidence_responses, entity_responses)):
-        print(start_index)
+# async func to get OpenAI response
+# retries with backoff until the deadline (a time.monotonic() time), and returns None if the request fails
+async def get_async_response(limiter : AdaptiveLimiter, client, system_prompt, content, deadline : float = None) -> str:
+    if deadline is None:
+        deadline = time.monotonic() + article_deadline_seconds
+
+    attempt = 0
+    while True:
+        retry_after = None
+        async with limiter:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                logging.error("openai request passed the article deadline")
+                llm_requests.inc(outcome = "gave_up")
+                return None
+            request_start = time.perf_counter()
+            try:
+                response =  await client.chat.completions.create(
+                            model = model_name,
+                            messages = [
+                                {"role": "system", "content": system_prompt},
+                                {"role": "user", "content": content},
+                            ],
+                            response_format = {"type": "json_object"},
+                            timeout = min(request_timeout, remaining)
+                        )
+                response_content = response.choices[0].message.content
+                limiter.record_success()
+                llm_request_seconds.observe(time.perf_counter() - request_start, model = model_name)
+                llm_requests.inc(outcome = "ok")
+                llm_concurrency_limit.set(limiter.current_limit())
+                record_usage(response)
+                break
+            except RateLimitError as e:
+                retry_after = retry_after_seconds(e.response)
+                limiter.record_overload(retry_after)
+                llm_requests.inc(outcome = "rate_limited")
+                llm_concurrency_limit.set(limiter.current_limit())
+                error = e
+            except (APITimeoutError, InternalServerError) as e:
+                limiter.record_overload()
+                llm_requests.inc(outcome = "overloaded")
+                llm_concurrency_limit.set(limiter.current_limit())
+                error = e
+            except APIConnectionError as e:
+                llm_requests.inc(outcome = "connection_error")
+                error = e
+            except Exception as e:
+                # other errors, such as invalid requests, would fail again if retried
+                logging.error(f"error getting openai response: {e}")
+                llm_requests.inc(outcome = "failed")
+                return None
+
+        attempt += 1
+        delay = backoff_delay(attempt, retry_after)
+        if attempt > max_retries or time.monotonic() + delay >= deadline:
+            logging.error(f"error getting openai response after {attempt} attempts: {error}")
+            llm_requests.inc(outcome = "gave_up")
+            return None
+        logging.warning(f"retrying openai request in {delay:.2f} seconds after error: {error}")
+        await asyncio.sleep(delay)
+
+    return response_content
+
+# gets the response to a prompt ([system prompt, user prompt, cache key]) from the cache, or from OpenAI if it is not
+# cached, returning the response and whether it came from the cache
+async def get_cached_response(limiter : AdaptiveLimiter, client, cache : llm_cache.LLMCache, prompt : list[str], deadline : float) -> tuple[str, bool]:
+    if cache is not None:
+        cached_response = await asyncio.to_thread(cache.get, prompt[2])
+        if cached_response is not None:
+            llm_requests.inc(outcome = "cache_hit")
+            return cached_response, True
+    return await get_async_response(limiter, client, prompt[0], prompt[1], deadline), False
+
+# splits a consolidated response into the sentiment, confidence, and entity results stored in separate collections
+def split_consolidated_result(result : dict) -> tuple[dict, dict, dict]:
+    sentiment = {
+        "tone" : result.get("tone"),
+        "topic" : result.get("topic"),
+        "event_type" : result.get("event_type"),
+        "confidence" : result.get("confidence_score"),
+        "summary" : result.get("summary"),
+        "evidence" : result.get("evidence")
+    }
+    confidence = {
+        "answers" : result.get("answers"),
+        "yes_answers" : result.get("yes_answers"),
+        "confidence_score" : result.get("confidence_score")
+    }
+    entities = {"entities" : result.get("entities", [])}
+    return sentiment, confidence, entities
+
+# hashes of the text of each kind of prompt, used in the cache keys of their responses
+prompt_hashes : dict[str, str] = {kind : llm_cache.prompt_hash(*layout) for kind, layout in prompt_layouts.items()}
+
+num_workers : int = 32 # max articles analyzed at once
+queue_size : int = 20 # max articles read from MongoDB ahead of the workers, and max results waiting to be inserted
+insert_batch_size : int = 20 # results are inserted to MongoDB in batches of this many articles
+
+# names of the prompts of each article, in order
+def prompt_kinds(consolidated : bool) -> list[str]:
+    if consolidated:
+        return ["consolidated"]
+    return ["sentiment", "confidence", "entities"]
+
+# builds the prompts of an article, each as [system prompt, user prompt, cache key], with its body trimmed to the budget
+def build_prompts(builder : PromptBuilder, headline : str, content : str, consolidated : bool) -> list[list[str]]:
+    kinds = prompt_kinds(consolidated)
+    content, prompts = builder.build(headline, content, kinds)
+    body_hash = llm_cache.article_hash(headline, content)
+    return [prompt + [llm_cache.make_key(body_hash, model_name, prompt_hashes[kind])] for kind, prompt in zip(kinds, prompts)]
+
+# parses the responses to an article's prompts into its sentiment, confidence, and entity results
+# returns None if any of the responses is missing or invalid, article is the article's headline or index for logging
+def parse_results(article, results : list[str], consolidated : bool) -> tuple[dict, dict, dict]:
+    try:
+        parsed_results = [json.loads(result) for result in results]
+        if consolidated:
+            sentiment, confidence, entities = split_consolidated_result(parsed_results[0])
+        else:
+            sentiment, confidence, entities = parsed_results
         # switches the confidence score from sentiment analysis to the more in depth confidence score from the confidence prompt
-        sentiment["confidence"] = confidence["confidence_score"] 
+        sentiment["confidence"] = confidence["confidence_score"]
+    except (TypeError, KeyError, ValueError) as e:
+        logging.error(f"Error parsing OpenAI responses for article {article}: {e}")
+        return None
+    return sentiment, confidence, entities
+
+# gets the sentiment, confidence, and entity results of an article, or None if any of its prompts failed
+# new responses are cached only once they all parse, and cached responses that fail to parse are removed from the cache,
+# so a malformed response is not served again on every run
+async def analyze_article(limiter : AdaptiveLimiter, client, cache : llm_cache.LLMCache, builder : PromptBuilder, headline : str, content : str, consolidated : bool) -> tuple[dict, dict, dict]:
+    prompts = build_prompts(builder, headline, content, consolidated)
+    deadline = time.monotonic() + article_deadline_seconds
+    responses = await asyncio.gather(*[get_cached_response(limiter, client, cache, prompt, deadline) for prompt in prompts])
+    result = parse_results(headline, [response for response, _ in responses], consolidated)
+    if cache is not None:
+        if result is None:
+            rejected_keys = [prompt[2] for prompt, (_, from_cache) in zip(prompts, responses) if from_cache]
+            if len(rejected_keys) != 0:
+                await asyncio.to_thread(cache.delete, rejected_keys)
+        else:
+            for prompt, (response, from_cache) in zip(prompts, responses):
+                if not from_cache:
+                    await asyncio.to_thread(cache.put, prompt[2], response)
+    return result
+
+# reads the articles from start_index onwards into the article queue, waiting whenever the queue is full
+# ends by putting one None per worker in the queue to stop the workers
+async def read_articles(article_collection, start_index : int, article_queue : asyncio.Queue) -> None:
+    documents = article_collection.find({}, {"title" : 1, "body" : 1}).skip(start_index)
+    try:
+        index = start_index
+        while True:
+            # reads from the cursor in a thread so the event loop is not blocked while MongoDB returns the next batch
+            doc = await asyncio.to_thread(next, documents, None)
+            if doc is None:
+                break
+            await article_queue.put((index, doc["title"], doc["body"]))
+            index += 1
+    except Exception as e:
+        logging.error(f"Error reading articles from MongoDB: {e}")
+    finally:
+        documents.close()
+        for _ in range(num_workers):
+            await article_queue.put(None)
+
+# moves (article index, headline, body) articles from a thread-safe source queue into the article queue until it gets None
+# ends by putting one None per worker in the queue to stop the workers
+async def read_article_stream(source : queue.Queue, article_queue : asyncio.Queue) -> None:
+    try:
+        while True:
+            # waits for the source in a thread so the event loop keeps running while no article is ready
+            article = await asyncio.to_thread(source.get)
+            if article is None:
+                break
+            await article_queue.put(article)
+    finally:
+        for _ in range(num_workers):
+            await article_queue.put(None)
+
+# analyzes articles from the article queue and puts their results in the result queue until it gets None
+async def analysis_worker(article_queue : asyncio.Queue, result_queue : asyncio.Queue, limiter : AdaptiveLimiter, client, cache : llm_cache.LLMCache, builder : PromptBuilder, consolidated : bool) -> None:
+    while True:
+        article = await article_queue.get()
+        if article is None:
+            return
+        index, headline, content = article
+        result = await analyze_article(limiter, client, cache, builder, headline, content, consolidated)
+        if result is None:
+            logging.error(f"Skipping sentiment analysis of article {index}")
+            continue
+        await result_queue.put((index, result))
+
+# inserts a batch of (article index, (sentiment, confidence, entities)) results to MongoDB
+def insert_results(batch : list[tuple], sentiment_collection, entity_collection, confidence_collection) -> None:
+    sentiment_responses = []
+    confidence_responses = []
+    entity_responses = []
+    for index, (sentiment, confidence, entities) in batch:
         # matches all 3 ids
-        sentiment["id"] = index + start_index
-        confidence["id"] = index + start_index
-        entities["id"] = index + start_index
+        sentiment["id"] = index
+        confidence["id"] = index
+        entities["id"] = index
+        sentiment_responses.append(sentiment)
+        confidence_responses.append(confidence)
+        entity_responses.append(entities)
 
-    # inserts the responses to MongoDB
     try:
         sentiment_collection.insert_many(sentiment_responses)
     except Exception as e:
@@ -192,12 +456,182 @@ async def async_analyze(article_collection, sentiment_collection, entity_collect
     except Exception as e:
         logging.error(f"Error occured inserting entity responses to MongoDB: {e}")
 
+# inserts results from the result queue until it gets None, in batches of up to insert_batch_size
+# a smaller batch is inserted whenever no more results are waiting, so results are not held back while others are analyzed
+# on_insert is called with the article indexes of each inserted batch, returns the number of articles inserted
+async def write_results(result_queue : asyncio.Queue, sentiment_collection, entity_collection, confidence_collection, on_insert = None) -> int:
+    batch = []
+    num_written = 0
+    while True:
+        result = await result_queue.get()
+        if result is not None:
+            batch.append(result)
+        if len(batch) >= insert_batch_size or (result_queue.empty() and len(batch) != 0):
+            await asyncio.to_thread(insert_results, batch, sentiment_collection, entity_collection, confidence_collection)
+            num_written += len(batch)
+            if on_insert is not None:
+                on_insert([index for index, _ in batch])
+            batch = []
+        if result is None:
+            return num_written
+
+# runs OpenAI prompts for documents concurrently to speed up the process
+# articles are streamed from MongoDB through a bounded queue to a fixed pool of workers, and results are inserted in small
+# batches as they complete, so memory use does not grow with the number of articles and a failure only loses one article
+# if consolidated is True, each article gets one prompt returning all 3 results instead of 3 separate prompts
+# if cache_collection is given, responses are cached in it and articles already analyzed are not sent to OpenAI again
+# if source is given, (article index, headline, body) articles are taken from that queue until it gets None instead of
+# being read from article_collection, and on_insert is called with the article indexes of each batch of inserted results
+async def async_analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index : int, consolidated : bool = False, cache_collection = None,
+                        source : queue.Queue = None, on_insert = None):
+    limiter = AdaptiveLimiter(initial_concurrent_requests, max_limit = max_concurrent_requests)
+    client = AsyncOpenAI(max_retries = 0) # retries are handled by get_async_response
+    cache = llm_cache.LLMCache(cache_collection) if cache_collection is not None else None
+    builder = PromptBuilder(prompt_layouts)
+    article_queue = asyncio.Queue(maxsize = queue_size)
+    result_queue = asyncio.Queue(maxsize = queue_size)
+
+    writer = asyncio.create_task(write_results(result_queue, sentiment_collection, entity_collection, confidence_collection, on_insert))
+    if source is not None:
+        reader = asyncio.create_task(read_article_stream(source, article_queue))
+    else:
+        reader = asyncio.create_task(read_articles(article_collection, start_index, article_queue))
+    await asyncio.gather(*[analysis_worker(article_queue, result_queue, limiter, client, cache, builder, consolidated) for _ in range(num_workers)])
+    await reader
+    await result_queue.put(None)
+    num_written = await writer
+    logging.info(f"Inserted sentiment analysis results of {num_written} articles")
+    builder.log_stats()
+    logging.info(f"OpenAI requests succeeded: {limiter.successes}, overloaded: {limiter.overloads}, concurrency limit: {limiter.current_limit()} (peak {int(limiter.peak_limit)})")
+
+    if cache is not None:
+        cache.log_stats()
+        cache.evict()
+
 # starts running OpenAI prompts
-def start_async(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index : int):
+@profiling.profile_stage("start_async")
+def start_async(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index : int, consolidated : bool = False, cache_collection = None,
+                source : queue.Queue = None, on_insert = None):
     start = time.perf_counter()
-    asyncio.run(async_analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index))
+    asyncio.run(async_analyze(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index, consolidated, cache_collection, source, on_insert))
     end = time.perf_counter()
     logging.info(f"Total time taken for sentiment analysis: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "start_async")
+
+batch_directory : str = "batches" # folder holding the request files of batch runs
+batch_completion_window : str = "24h" # time OpenAI has to finish a batch
+batch_poll_seconds : float = 60.0 # seconds between checks of a batch's status
+batch_end_statuses : set[str] = {"completed", "failed", "expired", "cancelled"}
+
+# writes a chat completion request for every prompt of the articles from start_index onwards to a JSONL batch file
+# each request's custom_id is "<article index>-<prompt kind>", returns the number of articles written
+def write_batch_file(article_collection, start_index : int, path : str, consolidated : bool = False) -> int:
+    directory = os.path.dirname(path)
+    if directory != "":
+        os.makedirs(directory, exist_ok = True)
+    kinds = prompt_kinds(consolidated)
+    builder = PromptBuilder(prompt_layouts)
+    documents = article_collection.find({}, {"title" : 1, "body" : 1}).skip(start_index)
+    num_articles = 0
+    with open(path, mode = "w", encoding = "utf-8") as file:
+        for index, doc in enumerate(documents, start = start_index):
+            for kind, prompt in zip(kinds, build_prompts(builder, doc["title"], doc["body"], consolidated)):
+                request = {
+                    "custom_id" : f"{index}-{kind}",
+                    "method" : "POST",
+                    "url" : "/v1/chat/completions",
+                    "body" : {
+                        "model" : model_name,
+                        "messages" : [
+                            {"role": "system", "content": prompt[0]},
+                            {"role": "user", "content": prompt[1]},
+                        ],
+                        "response_format" : {"type": "json_object"}
+                    }
+                }
+                file.write(json.dumps(request, ensure_ascii = False) + "\n")
+            num_articles += 1
+    documents.close()
+    builder.log_stats()
+    return num_articles
+
+# uploads a batch file and starts a batch for it, returning the batch id
+def submit_batch(client : OpenAI, path : str) -> str:
+    with open(path, mode = "rb") as file:
+        input_file = client.files.create(file = file, purpose = "batch")
+    batch = client.batches.create(input_file_id = input_file.id, endpoint = "/v1/chat/completions", completion_window = batch_completion_window)
+    logging.info(f"Submitted batch {batch.id} from {path}")
+    return batch.id
+
+# checks the batch every poll_seconds until it has ended, returning the ended batch
+def wait_for_batch(client : OpenAI, batch_id : str, poll_seconds : float = batch_poll_seconds):
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if batch.status in batch_end_statuses:
+            logging.info(f"Batch {batch_id} ended with status {batch.status}")
+            return batch
+        counts = batch.request_counts
+        if counts is not None:
+            logging.info(f"Batch {batch_id} is {batch.status}: {counts.completed} of {counts.total} requests completed, {counts.failed} failed")
+        time.sleep(poll_seconds)
+
+# reads the output file of an ended batch and inserts the results of each article to MongoDB, matched by custom_id
+# articles with a failed request are logged and skipped, returns the number of articles inserted
+def ingest_batch_output(client : OpenAI, batch, sentiment_collection, entity_collection, confidence_collection, consolidated : bool = False) -> int:
+    if batch.error_file_id is not None:
+        num_errors = sum(1 for line in client.files.content(batch.error_file_id).text.splitlines() if line.strip() != "")
+        logging.error(f"Batch {batch.id} has {num_errors} failed requests")
+    if batch.output_file_id is None:
+        logging.error(f"Batch {batch.id} has no output file")
+        return 0
+
+    # groups the response content of each request by article index and prompt kind
+    responses = {}
+    for line in client.files.content(batch.output_file_id).text.splitlines():
+        if line.strip() == "":
+            continue
+        output = json.loads(line)
+        index, kind = output["custom_id"].rsplit("-", 1)
+        response = output.get("response") or {}
+        if output.get("error") is not None or response.get("status_code") != 200:
+            logging.error(f"Batch request {output['custom_id']} failed: {output.get('error')}")
+            continue
+        responses.setdefault(int(index), {})[kind] = response["body"]["choices"][0]["message"]["content"]
+
+    kinds = prompt_kinds(consolidated)
+    batch_results = []
+    num_written = 0
+    for index in sorted(responses):
+        result = parse_results(index, [responses[index].get(kind) for kind in kinds], consolidated)
+        if result is None:
+            logging.error(f"Skipping sentiment analysis of article {index}")
+            continue
+        batch_results.append((index, result))
+        if len(batch_results) >= insert_batch_size:
+            insert_results(batch_results, sentiment_collection, entity_collection, confidence_collection)
+            num_written += len(batch_results)
+            batch_results = []
+    if len(batch_results) != 0:
+        insert_results(batch_results, sentiment_collection, entity_collection, confidence_collection)
+        num_written += len(batch_results)
+    logging.info(f"Inserted sentiment analysis results of {num_written} articles from batch {batch.id}")
+    return num_written
+
+# runs the OpenAI prompts for the articles from start_index onwards as one batch job instead of live requests
+# cheaper and free of rate limits for large backfills, but the results can take up to batch_completion_window to arrive
+def start_batch(article_collection, sentiment_collection, entity_collection, confidence_collection, start_index : int, consolidated : bool = False, poll_seconds : float = batch_poll_seconds) -> None:
+    start = time.perf_counter()
+    path = os.path.join(batch_directory, f"batch_{start_index}_{int(time.time())}.jsonl")
+    num_articles = write_batch_file(article_collection, start_index, path, consolidated)
+    if num_articles == 0:
+        logging.info("No articles to analyze")
+        return
+    client = OpenAI()
+    batch = wait_for_batch(client, submit_batch(client, path), poll_seconds)
+    ingest_batch_output(client, batch, sentiment_collection, entity_collection, confidence_collection, consolidated)
+    end = time.perf_counter()
+    logging.info(f"Total time taken for batch sentiment analysis: {end - start}")
+    metrics.stage_seconds.observe(end - start, stage = "start_batch")
 
 # not called, func for getting OpenAI response one at a time (much slower)
 def get_response(client : OpenAI, system_prompt, content) -> str:
@@ -205,7 +639,7 @@ def get_response(client : OpenAI, system_prompt, content) -> str:
     while num_tries < 3:
         try:
             main_response = client.chat.completions.create(
-                    model = "gpt-4.1-nano",
+                    model = model_name,
                     messages = [
                         {"role": "system", "content": system_prompt},
                         {"role": "user", "content": content},
@@ -273,7 +707,6 @@ def analyze(article_collection, sentiment_collection, entity_collection, confide
     documents.close()     
 
 if __name__ == "__main__":
-    import os
     from pymongo import MongoClient # for uploading data to MongoDB
 
     connection_string : str = os.getenv("MONGODB_CONNECTION_STRING")
@@ -0,0 +1,113 @@
+"""This program contains the registry of news sources, read once from data/sources.csv. Each source holds its feed url,
+priority, the extractor for its body text, and the parser for its timestamps, chosen when the registry is loaded, so
+scrapers look up their source by name instead of matching on it for every article. Timestamps use the RFC 2822 and ISO
+8601 parsers where the source's format allows it, and are converted to one shared UTC+8 time zone object.
+"""
+
+import csv # for parsing the source list
+import os
+import logging
+from datetime import datetime
+from email.utils import parsedate_to_datetime # for RFC 2822 timestamps
+import pytz # for timezones
+from parsing import extraction # for the extractor of each source
+
+logging.basicConfig(
+    filename = "main.log",
+    encoding = "utf-8",
+    level = logging.INFO,
+    format = "%(asctime)s - %(levelname)s - %(message)s"
+)
+
+sources_file_path : str = os.path.join("data", "sources.csv")
+tw_timezone = pytz.timezone("Etc/GMT-8") # time zone every timestamp is converted to
+
+# builds the XPath of an extractor from its kind in the source list
+extractor_kinds : dict = {
+    "name" : extraction.by_name,
+    "id" : extraction.by_id,
+    "class" : extraction.by_class
+}
+
+# parses an RFC 2822 timestamp, like "Mon, 13 Oct 2025 10:00:00 +0800" or "Mon, 13 Oct 2025 02:00:00 GMT"
+def parse_rfc2822(timestamp : str) -> datetime:
+    return parsedate_to_datetime(timestamp)
+
+# parses an ISO 8601 timestamp, like "2025-10-13T10:00:00+08:00" or "2025-10-13T10:00:00"
+def parse_iso8601(timestamp : str) -> datetime:
+    return datetime.fromisoformat(timestamp)
+
+# parsers by their name in the source list. Any other name is used as a strptime format
+timestamp_parsers : dict = {
+    "rfc2822" : parse_rfc2822,
+    "iso8601" : parse_iso8601
+}
+
+# gets the parser for a timestamp format from the source list
+def get_timestamp_parser(timestamp_format : str):
+    parser = timestamp_parsers.get(timestamp_format)
+    if parser is None:
+        return lambda timestamp: datetime.strptime(timestamp, timestamp_format)
+    return parser
+
+# gets the extractor for an extractor from the source list ("kind:value"), or None if the source has none
+def get_extractor(extractor_spec : str) -> extraction.Extractor:
+    if extractor_spec == "":
+        return None
+    kind, value = extractor_spec.split(":", 1)
+    return extraction.Extractor(extractor_kinds[kind](value))
+
+# standardizes a datetime object to UTC+8 timezone, treating timestamps without a time zone as already in UTC+8
+def to_tw_time(datetime_object : datetime) -> datetime:
+    if datetime_object.tzinfo is None:
+        return tw_timezone.localize(datetime_object)
+    if datetime_object.tzinfo is tw_timezone:
+        return datetime_object
+    return datetime_object.astimezone(tw_timezone)
+
+class Source:
+    """A news source with its feed, priority, body text extractor, and timestamp parser."""
+
+    def __init__(self, name : str, feed_url : str, priority : str, extractor : extraction.Extractor, timestamp_parser):
+        self.name = name
+        self.feed_url = feed_url
+        self.priority = priority
+        self.extractor = extractor
+        self.timestamp_parser = timestamp_parser
+
+    # converts a timestamp string to a datetime object in UTC+8 timezone, or returns None if it cannot be parsed
+    def parse_timestamp(self, timestamp : str) -> datetime:
+        try:
+            datetime_object = self.timestamp_parser(timestamp)
+        except Exception as e:
+            logging.error(f"Error converting {self.name} article to datetime object: {e}")
+            return None
+        return to_tw_time(datetime_object)
+
+# reads the source list, in the order the feeds are fetched
+def load_sources() -> list[Source]:
+    source_list = []
+    # sources with the same extractor or timestamp format share one
+    extractors = {}
+    parsers = {}
+    with open(sources_file_path, mode = "r", encoding = "utf-8", newline = "") as file:
+        reader = csv.DictReader(file)
+        for row in reader:
+            if row["Extractor"] not in extractors:
+                extractors[row["Extractor"]] = get_extractor(row["Extractor"])
+            if row["Timestamp"] not in parsers:
+                parsers[row["Timestamp"]] = get_timestamp_parser(row["Timestamp"])
+            source_list.append(Source(row["Source"], row["Feed URL"], row["Priority"], extractors[row["Extractor"]], parsers[row["Timestamp"]]))
+    return source_list
+
+source_list : list[Source] = load_sources() # every feed, in the order they are fetched
+# source by name. A source with more than one feed uses the same extractor and timestamp parser for each
+source_registry : dict[str, Source] = {source.name : source for source in reversed(source_list)}
+
+# gets the feeds with a certain priority, in the order they are fetched
+def feeds_by_priority(priority : str) -> list[Source]:
+    return [source for source in source_list if source.priority == priority]
+
+# gets a source by its name, or None if it is not in the registry
+def get_source(name : str) -> Source:
+    return source_registry.get(name)